@@ -15,4 +15,5 @@
 
 """JSON tools for data preprocessing."""
 from .json_logger import JsonLogger
+from .json_stream import iter_json_runs
 from .json_utils import concatenate_json_files, pull_neptune_data
@@ -0,0 +1,173 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Incremental reading of large marl-eval JSON files."""
+
+import json
+import re
+from typing import Any, Dict, Iterator, TextIO, Tuple
+
+_WHITESPACE = " \t\n\r"
+# Characters that matter when scanning over a JSON value.
+_STRUCTURE_CHARS = re.compile(r'["{}\[\]]')
+_STRING_CHARS = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r"[,}\]\s]")
+
+
+class _JsonReader:
+    """Minimal pull parser over a text file.
+
+    Only the outer levels of a JSON document are parsed by hand. Inner values
+    are located by scanning for their closing bracket and decoded with `json`,
+    so that at most one such value is held in memory at any time.
+    """
+
+    def __init__(self, file: TextIO, chunk_size: int) -> None:
+        """Initialises the reader with an empty buffer."""
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+
+    def _fill(self) -> bool:
+        """Appends the next chunk of the file to the unconsumed part of the buffer.
+
+        The consumed part of the buffer is only dropped here. The chunk read is
+        at least as long as the unconsumed part, so a value spanning many
+        chunks is copied a logarithmic number of times instead of once per
+        chunk.
+        """
+        chunk = self._file.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return chunk != ""
+
+    def _peek(self) -> str:
+        """Returns the next non whitespace character without consuming it."""
+        while True:
+            while self._pos < len(self._buffer):
+                if self._buffer[self._pos] not in _WHITESPACE:
+                    return self._buffer[self._pos]
+                self._pos += 1
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON file.")
+
+    def _expect(self, characters: str) -> str:
+        """Consumes the next non whitespace character, which must be expected."""
+        char = self._peek()
+        if char not in characters:
+            raise ValueError(
+                f"Expected one of '{characters}' but found '{char}' in JSON file."
+            )
+        self._pos += 1
+        return char
+
+    def _consume(self, length: int) -> str:
+        """Consumes and returns the next `length` characters of the buffer."""
+        value = self._buffer[self._pos : self._pos + length]
+        self._pos += length
+        return value
+
+    def read_value(self) -> str:
+        """Consumes the next JSON value and returns its raw text.
+
+        The value is scanned from the consume offset, and offsets within the
+        value are relative to it, since `_fill` moves the value to the start of
+        the buffer.
+        """
+        char = self._peek()
+        if char not in '"{[':
+            match = _SCALAR_END.search(self._buffer, self._pos)
+            while match is None:
+                if not self._fill():
+                    # A scalar may end the document.
+                    return self._consume(len(self._buffer) - self._pos)
+                match = _SCALAR_END.search(self._buffer, self._pos)
+            return self._consume(match.start() - self._pos)
+
+        offset, depth, in_string = 0, 0, False
+        while True:
+            pattern = _STRING_CHARS if in_string else _STRUCTURE_CHARS
+            match = pattern.search(self._buffer, self._pos + offset)
+            if match is None:
+                # The scanned characters are not scanned again.
+                offset = max(offset, len(self._buffer) - self._pos)
+                if not self._fill():
+                    raise ValueError("Unexpected end of JSON file.")
+                continue
+            char, offset = match.group(), match.end() - self._pos
+            if in_string:
+                if char == "\\":
+                    # Skip the escaped character.
+                    offset += 1
+                    continue
+                in_string = False
+            elif char == '"':
+                in_string = True
+                continue
+            elif char in "{[":
+                depth += 1
+                continue
+            else:
+                depth -= 1
+            if depth == 0:
+                return self._consume(offset)
+
+    def iter_object_keys(self) -> Iterator[str]:
+        """Iterates over the keys of the next JSON object.
+
+        The value belonging to each key must be consumed by the caller before
+        the next key is requested.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = json.loads(self.read_value())
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def iter_object_items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterates over the decoded items of the next JSON object."""
+        for key in self.iter_object_keys():
+            yield key, json.loads(self.read_value())
+
+
+def iter_json_runs(
+    file_path: str, chunk_size: int = 1 << 20
+) -> Iterator[Tuple[str, str, str, str, Dict[str, Any]]]:
+    """Incrementally read a marl-eval JSON file one run at a time.
+
+    The file is parsed at the environment, task, algorithm and run level, so
+    that only the data of a single run is decoded and held in memory at once.
+
+    Args:
+        file_path: path to a JSON file in the marl-eval format.
+        chunk_size: number of characters read from the file at a time.
+
+    Yields:
+        Tuples of (environment, task, algorithm, run, steps) where `steps` is
+        the decoded step -> metric dictionary of the run.
+    """
+    with open(file_path) as f:
+        reader = _JsonReader(f, chunk_size)
+        for env in reader.iter_object_keys():
+            for task in reader.iter_object_keys():
+                for algorithm in reader.iter_object_keys():
+                    for run, steps in reader.iter_object_items():
+                        yield env, task, algorithm, run, steps
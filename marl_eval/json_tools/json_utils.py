@@ -22,10 +22,14 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, List, Tuple
 
-import neptune
 from colorama import Fore, Style
 from tqdm import tqdm
 
+from marl_eval.utils.experiment_tensor import (
+    dict_to_experiment_tensors,
+    save_experiment_tensors,
+)
+
 
 def _read_json_files(directory: str) -> list:
     """Reads all JSON files in a directory and returns a list of JSON objects."""
@@ -68,17 +72,8 @@ def _check_seed(concatenated_data: Dict, algo_data: Dict, seed_number: str) -> s
         return seed_number
 
 
-def concatenate_json_files(
-    input_directory: str, output_json_path: str = "concatenated_json_files/"
-) -> Dict:
-    """Concatenate all json files in a directory and save the result in a json file."""
-    # Read all json files in a input_directory
-    json_data = _read_json_files(input_directory)
-
-    # Create target folder
-    if not os.path.exists(output_json_path):
-        os.makedirs(output_json_path)
-
+def _merge_json_data(json_data: List[Dict]) -> Dict:
+    """Merge the data of several json files, renaming clashing seeds."""
     # Using defaultdict for automatic handling of missing keys
     concatenated_data: Dict = defaultdict(
         lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
@@ -99,15 +94,45 @@ def concatenate_json_files(
                             seed_n
                         ] = algo_data
 
+    return concatenated_data
+
+
+def concatenate_json_files(
+    input_directory: str,
+    output_json_path: str = "concatenated_json_files/",
+    binary: bool = False,
+) -> Dict:
+    """Concatenate all json files in a directory and save the result in a json file.
+
+    If `binary` is True the result is instead saved in the memory-mappable binary
+    experiment format in a `metrics` directory, which can be opened with
+    `marl_eval.utils.experiment_tensor.load_experiment_tensors`.
+    """
+    # Read all json files in a input_directory
+    json_data = _read_json_files(input_directory)
+
+    # Create target folder
+    if not os.path.exists(output_json_path):
+        os.makedirs(output_json_path)
+
+    concatenated_data = _merge_json_data(json_data)
+
     # Save concatenated data in a json file
     if output_json_path[-1] != "/":
         output_json_path += "/"
-    with open(f"{output_json_path}metrics.json", "w") as f:
-        json.dump(concatenated_data, f, indent=4)
+    if binary:
+        output_file = f"{output_json_path}metrics"
+        save_experiment_tensors(
+            dict_to_experiment_tensors(concatenated_data), output_file
+        )
+    else:
+        output_file = f"{output_json_path}metrics.json"
+        with open(output_file, "w") as f:
+            json.dump(concatenated_data, f, indent=4)
 
     print(
         f"{Fore.CYAN}{Style.BRIGHT}Concatenated data saved in "
-        + f"{output_json_path}metrics.json successfully!{Style.RESET_ALL}"
+        + f"{output_file} successfully!{Style.RESET_ALL}"
     )
     return concatenated_data
 
@@ -134,6 +159,10 @@ def pull_neptune_data(
     Raises:
         ValueError: If the provided project name or tags are invalid.
     """
+    # Imported here since neptune takes seconds to import, which users that only
+    # log or process data should not pay for.
+    import neptune
+
     # Create the log directory if it doesn't exist
     os.makedirs(store_directory, exist_ok=True)
 
@@ -185,6 +214,9 @@ def pull_neptune_data(
 def _download_and_extract_data(
     project_name: str, run_id: str, store_directory: str, neptune_data_key: str
 ) -> None:
+    # Imported here for the same reason as in pull_neptune_data.
+    import neptune
+
     try:
         with neptune.init_run(
             project=project_name, with_id=run_id, mode="read-only"
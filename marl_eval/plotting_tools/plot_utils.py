@@ -13,14 +13,105 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple, cast
 
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 from matplotlib.axes import Axes
 from matplotlib.figure import Figure
-from rliable.plot_utils import _annotate_and_decorate_axis
+from rliable.plot_utils import _annotate_and_decorate_axis, _decorate_axis
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices of the points of curves kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept, and the inner points are split
+    into `max_points - 2` buckets of consecutive points. In every bucket, the
+    point forming the largest triangle with the previously kept point and the
+    average of the next bucket is kept, which preserves the peaks and troughs
+    of the curve. Several curves sharing their x-axis values, such as a mean
+    and its CI bounds, are decimated jointly by keeping the point with the
+    largest triangle over all curves.
+
+    Args:
+      x: 1D array of x-axis values.
+      y: (points,) or (curves x points) array of y-axis values.
+      max_points: Maximum number of points to keep, at least 3.
+
+    Returns:
+      Sorted 1D array of at most `max_points` kept indices.
+    """
+    y = np.atleast_2d(y)
+    num_points = y.shape[-1]
+    if num_points <= max_points:
+        return np.arange(num_points)
+    if max_points < 3:
+        raise ValueError(f"max_points must be at least 3, got {max_points}.")
+
+    edges = np.linspace(1, num_points - 1, max_points - 1).astype(int)
+    # Average point of every bucket, with the last point as the final bucket.
+    bucket_sizes = np.append(np.diff(edges), 1)
+    bucket_x = np.append(np.add.reduceat(x[1:-1], edges[:-1] - 1), x[-1])
+    bucket_y = np.concatenate(
+        [np.add.reduceat(y[:, 1:-1], edges[:-1] - 1, axis=-1), y[:, -1:]], axis=-1
+    )
+    bucket_x, bucket_y = bucket_x / bucket_sizes, bucket_y / bucket_sizes
+
+    indices = np.empty(max_points, dtype=int)
+    indices[0], indices[-1] = 0, num_points - 1
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        previous = indices[bucket]
+        next_x, next_y = bucket_x[bucket + 1], bucket_y[:, bucket + 1 : bucket + 2]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[:, start:end] - y[:, previous : previous + 1])
+            - (x[previous] - x[start:end]) * (next_y - y[:, previous : previous + 1])
+        )
+        indices[bucket + 1] = start + np.argmax(np.max(areas, axis=0))
+    return indices
+
+
+def decimate_curves(
+    x: np.ndarray,
+    point_estimates: Dict[str, np.ndarray],
+    interval_estimates: Dict[str, np.ndarray],
+    max_points: Optional[int],
+) -> Tuple[np.ndarray, Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """Downsamples curves sharing their x-axis values before plotting.
+
+    The points are selected once for all curves with
+    Largest-Triangle-Three-Buckets over the point estimates and the lower and
+    upper CI bounds of every algorithm, so that both the curves and the
+    extremes of their CI bands are kept.
+
+    Args:
+      x: 1D array of x-axis values.
+      point_estimates: Dictionary mapping every algorithm to a 1D array of
+        point estimates at `x`.
+      interval_estimates: Dictionary mapping every algorithm to a (2 x points)
+        array of lower and upper CI bounds.
+      max_points: Maximum number of points kept, shared by all curves. If
+        None, the curves are returned unchanged.
+
+    Returns:
+      The decimated `x`, `point_estimates` and `interval_estimates`.
+    """
+    if max_points is None:
+        return x, point_estimates, interval_estimates
+
+    curves = np.concatenate(
+        [
+            np.vstack([point_estimates[algo], interval_estimates[algo]])
+            for algo in point_estimates
+        ]
+    )
+    indices = _lttb_indices(x, curves, max_points)
+    return (
+        x[indices],
+        {algo: values[indices] for algo, values in point_estimates.items()},
+        {algo: values[:, indices] for algo, values in interval_estimates.items()},
+    )
 
 
 def plot_single_task_curve(
@@ -36,13 +127,16 @@ def plot_single_task_curve(
     ticklabelsize: str = "xx-large",
     legend_map: Optional[Dict] = None,
     run_times: Optional[Dict] = None,
+    max_points: Optional[int] = None,
     **kwargs: Any,
 ) -> Figure:
     """Plots an aggregate metric with CIs as a function of environment frames.
 
     Args:
       aggregated_data: Dictionary containing the mean and 95% CI at each
-        evaluation step for all algorithms on a particular task.
+        evaluation step for all algorithms on a particular task. If an algorithm
+        holds "lower" and "upper" bounds, they are used instead of the
+        symmetric "ci".
       algorithms: List of methods used for plotting. If None, defaults to all the
         keys in `point_estimates`.
       colors: Dictionary that maps each algorithm to a color. If None, then this
@@ -60,6 +154,10 @@ def plot_single_task_curve(
         If None, then this mapping is created based on `algorithms`.
       run_times: Dictionary that maps each algorithm to the number of seconds it
         took to run. If None, then environment steps will be displayed.
+      max_points: Maximum number of points plotted per algorithm. Longer curves
+        and their CIs are downsampled with Largest-Triangle-Three-Buckets over
+        the mean and the CI bounds, which keeps rendering fast and saved vector
+        figures small. If None, every evaluation step is plotted.
       **kwargs: Arbitrary keyword arguments.
 
     Returns:
@@ -88,11 +186,26 @@ def plot_single_task_curve(
             x_axis_values = np.linspace(0, run_times[algorithm] / 60, x_axis_len)
 
         metric_values = np.array(aggregated_data[algorithm]["mean"])
-        confidence_interval = np.array(aggregated_data[algorithm]["ci"])
-        lower, upper = (
-            metric_values - confidence_interval,
-            metric_values + confidence_interval,
-        )
+        if "lower" in aggregated_data[algorithm]:
+            # Asymmetric (e.g. bootstrap) confidence intervals.
+            lower = np.array(aggregated_data[algorithm]["lower"])
+            upper = np.array(aggregated_data[algorithm]["upper"])
+        else:
+            confidence_interval = np.array(aggregated_data[algorithm]["ci"])
+            lower, upper = (
+                metric_values - confidence_interval,
+                metric_values + confidence_interval,
+            )
+
+        if max_points is not None:
+            indices = _lttb_indices(
+                x_axis_values, np.stack([metric_values, lower, upper]), max_points
+            )
+            x_axis_values, metric_values = (
+                x_axis_values[indices],
+                metric_values[indices],
+            )
+            lower, upper = lower[indices], upper[indices]
 
         if legend_map is not None:
             algorithm_name = legend_map[algorithm]
@@ -119,3 +232,164 @@ def plot_single_task_curve(
         ticklabelsize=ticklabelsize,
         **kwargs,
     )
+
+
+def plot_probability_of_improvement_matrix(
+    probabilities: np.ndarray,
+    probability_cis: np.ndarray,
+    algorithms: List[str],
+    figsize: Optional[tuple] = None,
+    cmap: str = "RdBu",
+    ax: Optional[Axes] = None,
+    labelsize: str = "x-large",
+    ticklabelsize: str = "large",
+) -> Figure:
+    """Plots the probabilities of improvement of all algorithm pairs as a heatmap.
+
+    Args:
+      probabilities: (algorithms x algorithms) array whose [x, y] entry is the
+        probability that algorithm x improves over algorithm y.
+      probability_cis: (2 x algorithms x algorithms) array with the lower and
+        upper bounds of the confidence intervals of `probabilities`.
+      algorithms: Names of the algorithms in the order of the matrix rows.
+      figsize: Size of the figure passed to `matplotlib.subplots`. Only used when
+        `ax` is None. If None, the size grows with the number of algorithms.
+      cmap: Colormap of the heatmap, centred on a probability of 0.5.
+      ax: `matplotlib.axes` object.
+      labelsize: Font size of the axis labels.
+      ticklabelsize: Font size of the ticks and annotations.
+
+    Returns:
+      Figure holding the heatmap.
+    """
+    num_algorithms = len(algorithms)
+    if ax is None:
+        if figsize is None:
+            figsize = (1.2 * num_algorithms + 3, 1.0 * num_algorithms + 2)
+        _, ax = plt.subplots(figsize=figsize)
+
+    annotations = np.array(
+        [
+            [
+                f"{probabilities[x, y]:.2f}\n[{probability_cis[0, x, y]:.2f}, "
+                + f"{probability_cis[1, x, y]:.2f}]"
+                for y in range(num_algorithms)
+            ]
+            for x in range(num_algorithms)
+        ]
+    )
+    sns.heatmap(
+        probabilities,
+        mask=np.eye(num_algorithms, dtype=bool),
+        annot=annotations,
+        fmt="",
+        cmap=cmap,
+        vmin=0,
+        vmax=1,
+        center=0.5,
+        square=True,
+        xticklabels=algorithms,
+        yticklabels=algorithms,
+        annot_kws={"fontsize": ticklabelsize},
+        cbar_kws={"label": "P(X > Y)"},
+        ax=ax,
+    )
+    ax.set_xlabel("Algorithm Y", size=labelsize)
+    ax.set_ylabel("Algorithm X", size=labelsize)
+    ax.tick_params(labelsize=ticklabelsize)
+    return cast(Figure, ax.get_figure())
+
+
+def plot_interval_estimates_grid(
+    point_estimates: Dict[str, np.ndarray],
+    interval_estimates: Dict[str, np.ndarray],
+    metric_names: List[str],
+    aggregate_names: List[str],
+    algorithms: Optional[List[str]] = None,
+    colors: Optional[Dict] = None,
+    color_palette: Any = "colorblind",
+    max_ticks: int = 4,
+    subfigure_width: float = 3.4,
+    row_height: float = 0.37,
+    interval_height: float = 0.6,
+) -> Figure:
+    """Plots aggregate metrics with CIs in a grid of metrics x aggregates.
+
+    Every row holds the aggregates of one metric, drawn in the style of
+    `rliable.plot_utils.plot_interval_estimates`.
+
+    Args:
+      point_estimates: Dictionary mapping every algorithm to a
+        (metrics x aggregates) array of point estimates.
+      interval_estimates: Dictionary mapping every algorithm to a
+        (2 x metrics x aggregates) array of lower and upper CI bounds.
+      metric_names: Labels of the metrics, one per row.
+      aggregate_names: Titles of the aggregates, one per column.
+      algorithms: List of methods used for plotting. If None, defaults to all the
+        keys in `point_estimates`.
+      colors: Dictionary that maps each algorithm to a color. If None, then this
+        mapping is created based on `color_palette`.
+      color_palette: `seaborn.color_palette` object for mapping each method to a
+        color.
+      max_ticks: Maximum number of ticks on every x-axis.
+      subfigure_width: Width of every subplot.
+      row_height: Height of every algorithm in a subplot.
+      interval_height: Height of the CI bars.
+
+    Returns:
+      Figure holding the grid.
+    """
+    if algorithms is None:
+        algorithms = list(point_estimates.keys())
+    if colors is None:
+        color_palette = sns.color_palette(color_palette, n_colors=len(algorithms))
+        colors = dict(zip(algorithms, color_palette))
+
+    num_rows, num_cols = len(metric_names), len(aggregate_names)
+    fig, axes = plt.subplots(
+        nrows=num_rows,
+        ncols=num_cols,
+        figsize=(
+            subfigure_width * num_cols,
+            (row_height * len(algorithms) + 1) * num_rows,
+        ),
+        squeeze=False,
+    )
+    for row, metric_name in enumerate(metric_names):
+        for col, aggregate_name in enumerate(aggregate_names):
+            ax = axes[row, col]
+            for alg_idx, algorithm in enumerate(algorithms):
+                lower, upper = interval_estimates[algorithm][:, row, col]
+                ax.barh(
+                    y=alg_idx,
+                    width=upper - lower,
+                    height=interval_height,
+                    left=lower,
+                    color=colors[algorithm],
+                    alpha=0.75,
+                    label=algorithm,
+                )
+                ax.vlines(
+                    x=point_estimates[algorithm][row, col],
+                    ymin=alg_idx - (7.5 * interval_height / 16),
+                    ymax=alg_idx + (6 * interval_height / 16),
+                    label=algorithm,
+                    color="k",
+                    alpha=0.5,
+                )
+
+            ax.set_yticks(list(range(len(algorithms))))
+            ax.xaxis.set_major_locator(plt.MaxNLocator(max_ticks))
+            if col != 0:
+                ax.set_yticks([])
+            else:
+                ax.set_yticklabels(algorithms, fontsize="x-large")
+            if row == 0:
+                ax.set_title(aggregate_name, fontsize="xx-large")
+            ax.set_xlabel(metric_name, fontsize="x-large")
+            _decorate_axis(ax, ticklabelsize="x-large", wrect=5)
+            ax.spines["left"].set_visible(False)
+            ax.grid(True, axis="x", alpha=0.25)
+
+    fig.tight_layout()
+    return fig
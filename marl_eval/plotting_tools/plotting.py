@@ -13,24 +13,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Any, Dict, List, Optional, Tuple
+import functools
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-import colorcet as cc
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import seaborn as sns
-from matplotlib.figure import Figure
-from rliable import library as rly
-from rliable import metrics, plot_utils
 
-from marl_eval.plotting_tools.plot_utils import plot_single_task_curve
+from marl_eval.utils import metrics_utils
+from marl_eval.utils.bootstrap_utils import BootstrapContext
 from marl_eval.utils.data_processing_utils import (
     get_and_aggregate_data_single_task,
     lower_case_inputs,
 )
 
-"""Tools for plotting MARL experiments based on rliable."""
+"""Tools for plotting MARL experiments based on rliable.
+
+Matplotlib, seaborn, colorcet, pandas and rliable are imported by the plotting
+functions on their first call, so that importing this module stays cheap.
+"""
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from matplotlib.figure import Figure
 
 
 def performance_profiles(
@@ -38,7 +41,9 @@ def performance_profiles(
     metric_name: str,
     metrics_to_normalize: List[str],
     legend_map: Optional[Dict[str, str]] = None,
-) -> Figure:
+    bootstrap_context: Optional[BootstrapContext] = None,
+    taus: Optional[np.ndarray] = None,
+) -> "Figure":
     """Produces performance profile plots.
 
     Args:
@@ -47,10 +52,20 @@ def performance_profiles(
         metric_name: Name of metric to produce plots for.
         metrics_to_normalize: List of metrics that are normalised.
         legend_map: Dictionary that maps each algorithm to a custom legend label.
+        bootstrap_context: Resamples and options of the bootstrap, see
+            `BootstrapContext`. If None, the resamples are drawn from fresh
+            entropy and not shared.
+        taus: Increasing thresholds at which the profiles are evaluated. If None,
+            100 thresholds evenly spaced between 0 and 1 are used. Finer grids
+            of thousands of points give smooth curves at little extra cost.
 
     Returns:
         fig: Matplotlib figure for storing.
     """
+    import colorcet as cc
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from rliable import plot_utils
 
     metric_name, metrics_to_normalize = lower_case_inputs(
         metric_name, metrics_to_normalize
@@ -80,15 +95,21 @@ def performance_profiles(
     else:
         xlabel = " ".join(metric_name.split("_")).capitalize()
 
-    score_distributions, score_distributions_cis = rly.create_performance_profile(
-        data_dictionary, np.linspace(0, 1, 100)
+    if taus is None:
+        taus = np.linspace(0, 1, 100)
+    if bootstrap_context is None:
+        bootstrap_context = BootstrapContext(share_resamples=False)
+    score_distributions, score_distributions_cis = bootstrap_context.interval_estimates(
+        data_dictionary,
+        functools.partial(metrics_utils.score_distribution, taus=taus),
+        reps=2000,
     )
 
     # Plot score distributions
     fig, ax = plt.subplots(ncols=1, figsize=(7, 5))
     plot_utils.plot_performance_profiles(
         score_distributions,
-        np.linspace(0, 1, 100),
+        taus,
         performance_profile_cis=score_distributions_cis,
         colors=dict(zip(algorithms, sns.color_palette(cc.glasbey_category10))),
         xlabel=f"{xlabel} " + r"$(\tau)$",
@@ -98,6 +119,33 @@ def performance_profiles(
     return fig
 
 
+def _save_tabular_results(
+    tabular_results_df: "pd.DataFrame",
+    file_path: str,
+    save_tabular_as_latex: Optional[bool],
+) -> None:
+    """Stores tabular results in a .csv file and optionally in latex format.
+
+    Args:
+        tabular_results_df: Tabular results to store.
+        file_path: Path of the stored files, without their extension.
+        save_tabular_as_latex: Also append the latex table to a .txt file.
+    """
+    tabular_results_df.to_csv(file_path + ".csv", index=False, header=True)
+    print(
+        "The tabular results are stored in "
+        + file_path
+        + ".csv"
+        + " and they are the following\n",
+        tabular_results_df,
+    )
+
+    if save_tabular_as_latex:
+        with open(file_path + "_latex.txt", "a") as f:
+            print(tabular_results_df.style.to_latex(), file=f)
+            print("The latex tabular results are stored in " + file_path + "_latex.txt")
+
+
 def aggregate_scores(
     dictionary: Dict[str, Dict[str, Any]],
     metric_name: str,
@@ -106,7 +154,8 @@ def aggregate_scores(
     tabular_results_file_path: str = "./aggregated_score",
     save_tabular_as_latex: Optional[bool] = False,
     legend_map: Optional[Dict[str, str]] = None,
-) -> Tuple[Figure, Dict[str, Dict[str, int]], Dict[str, Dict[str, float]]]:
+    bootstrap_context: Optional[BootstrapContext] = None,
+) -> Tuple["Figure", Dict[str, Dict[str, float]], Dict[str, Dict[str, np.ndarray]]]:
     """Produces aggregated score plots.
 
     Args:
@@ -118,12 +167,18 @@ def aggregate_scores(
         tabular_results_file_path: location to store the tabular results.
         save_tabular_as_latex: store tabular results in latex format in a .txt file.
         legend_map: Dictionary that maps each algorithm to a custom legend label.
+        bootstrap_context: Resamples and options of the bootstrap, see
+            `BootstrapContext`. If None, the resamples are drawn from fresh
+            entropy and not shared.
 
     Returns:
         fig: Matplotlib figure for storing.
         aggregate_scores_dict: Aggregated score values
         aggregate_score_cis_dict: Aggregated score confidence intervals
     """
+    import colorcet as cc
+    import pandas as pd
+    from rliable import plot_utils
 
     metric_name, metrics_to_normalize = lower_case_inputs(
         metric_name, metrics_to_normalize
@@ -149,16 +204,12 @@ def aggregate_scores(
         }
         algorithms = list(data_dictionary.keys())
 
-    aggregate_func = lambda x: np.array(  # noqa: E731
-        [
-            metrics.aggregate_median(x),
-            metrics.aggregate_iqm(x),
-            metrics.aggregate_mean(x),
-            metrics.aggregate_optimality_gap(x),
-        ]
-    )
-    aggregate_scores, aggregate_score_cis = rly.get_interval_estimates(
-        data_dictionary, aggregate_func, reps=50000
+    if bootstrap_context is None:
+        bootstrap_context = BootstrapContext(share_resamples=False)
+    aggregate_scores, aggregate_score_cis = bootstrap_context.interval_estimates(
+        data_dictionary,
+        metrics_utils.aggregate_all,
+        reps=50000,
     )
 
     metric_names = ["Median", "IQM", "Mean", "Optimality Gap"]
@@ -190,7 +241,9 @@ def aggregate_scores(
         aggregate_score_cis_dict[algorithm] = algorithm_cis_dict
 
     # Get tabular (csv) results
-    tabular_results = aggregate_scores_dict.copy()
+    tabular_results = {
+        algorithm: scores.copy() for algorithm, scores in aggregate_scores_dict.items()
+    }
     algorithms = list(aggregate_scores_dict.keys())
 
     for algorithm in aggregate_scores_dict.keys():
@@ -211,31 +264,152 @@ def aggregate_scores(
             tabular_results[algorithm][metric] = result
 
     tabular_results_df = pd.DataFrame(tabular_results, columns=algorithms)
-    tabular_results_df.to_csv(
-        tabular_results_file_path + "_" + metric_name + ".csv", index=False, header=True
-    )
-    print(
-        "The tabular results are stored in "
-        + tabular_results_file_path
-        + "_"
-        + metric_name
-        + ".csv"
-        + " and they are the following\n",
+    _save_tabular_results(
         tabular_results_df,
+        tabular_results_file_path + "_" + metric_name,
+        save_tabular_as_latex,
     )
 
-    if save_tabular_as_latex:
-        with open(
-            tabular_results_file_path + "_" + metric_name + "_latex.txt", "a"
-        ) as f:
-            print(tabular_results_df.style.to_latex(), file=f)
-            print(
-                "The latex tabular results are stored in "
-                + tabular_results_file_path
-                + "_"
-                + metric_name
-                + "_latex.txt"
-            )
+    return fig, aggregate_scores_dict, aggregate_score_cis_dict
+
+
+def aggregate_scores_multi_metric(
+    dictionary: Dict[str, Dict[str, Any]],
+    metric_names: List[str],
+    metrics_to_normalize: List[str],
+    rounding_decimals: Optional[int] = 2,
+    tabular_results_file_path: str = "./aggregated_score",
+    save_tabular_as_latex: Optional[bool] = False,
+    legend_map: Optional[Dict[str, str]] = None,
+    bootstrap_context: Optional[BootstrapContext] = None,
+) -> Tuple[
+    "Figure",
+    Dict[str, Dict[str, Dict[str, float]]],
+    Dict[str, Dict[str, Dict[str, np.ndarray]]],
+]:
+    """Produces aggregated score plots and tables of several metrics at once.
+
+    The scores of all metrics are stacked and bootstrapped together, so every
+    metric is aggregated on the same resamples of runs in a single bootstrap.
+    The results are stored in one combined table and plotted in a grid with
+    one row per metric.
+
+    Args:
+        dictionary: Dictionary containing 2D arrays of normalised absolute metric scores
+            for metric algorithm pairs.
+        metric_names: Names of the metrics to produce plots for. Their score
+            matrices must have the same runs and tasks.
+        metrics_to_normalize: List of metrics that are normalised.
+        rounding_decimals:number up to which the results values are rounded.
+        tabular_results_file_path: location to store the tabular results.
+        save_tabular_as_latex: store tabular results in latex format in a .txt file.
+        legend_map: Dictionary that maps each algorithm to a custom legend label.
+        bootstrap_context: Resamples and options of the bootstrap, see
+            `BootstrapContext`. If None, the resamples are drawn from fresh
+            entropy and not shared.
+
+    Returns:
+        fig: Matplotlib figure for storing.
+        aggregate_scores_dict: Aggregated score values of every metric.
+        aggregate_score_cis_dict: Aggregated score confidence intervals of every
+            metric.
+    """
+    import colorcet as cc
+    import pandas as pd
+
+    from marl_eval.plotting_tools.plot_utils import plot_interval_estimates_grid
+
+    metric_names, metrics_to_normalize = lower_case_inputs(
+        metric_names, metrics_to_normalize
+    )
+    metric_names = list(metric_names)
+
+    # Upper case all algorithm names once and map them to their legend labels.
+    metric_keys = [
+        f"mean_norm_{metric_name}"
+        if metric_name in metrics_to_normalize
+        else f"mean_{metric_name}"
+        for metric_name in metric_names
+    ]
+    algorithm_names = {algo: algo.upper() for algo in dictionary[metric_keys[0]].keys()}
+    if legend_map is not None:
+        legend_map = {algo.upper(): value for algo, value in legend_map.items()}
+        algorithm_names = {
+            algo: legend_map[name] for algo, name in algorithm_names.items()
+        }
+    algorithms = list(algorithm_names.values())
+
+    # (runs, tasks, metrics) scores of every algorithm.
+    data_dictionary = {
+        name: np.stack(
+            [dictionary[metric_key][algo] for metric_key in metric_keys], axis=-1
+        )
+        for algo, name in algorithm_names.items()
+    }
+
+    if bootstrap_context is None:
+        bootstrap_context = BootstrapContext(share_resamples=False)
+    aggregate_scores, aggregate_score_cis = bootstrap_context.interval_estimates(
+        data_dictionary,
+        metrics_utils.aggregate_all_over_metrics,
+        reps=50000,
+    )
+
+    aggregate_names = ["Median", "IQM", "Mean", "Optimality Gap"]
+    xlabels = [
+        "Normalized " + " ".join(metric_name.split("_"))
+        if metric_name in metrics_to_normalize
+        else " ".join(metric_name.split("_")).capitalize()
+        for metric_name in metric_names
+    ]
+    fig = plot_interval_estimates_grid(
+        aggregate_scores,
+        aggregate_score_cis,
+        metric_names=xlabels,
+        aggregate_names=aggregate_names,
+        algorithms=algorithms,
+        color_palette=cc.glasbey_category10,
+    )
+
+    # Reformat aggregate scores and aggregate score confidence intervals as
+    # dictionaries of metric, algorithm and aggregate for easier use.
+    aggregate_scores_dict: Dict[str, Dict[str, Dict[str, float]]] = {}
+    aggregate_score_cis_dict: Dict[str, Dict[str, Dict[str, np.ndarray]]] = {}
+    tabular_results = []
+    for metric_idx, metric_name in enumerate(metric_names):
+        aggregate_scores_dict[metric_name] = {}
+        aggregate_score_cis_dict[metric_name] = {}
+        for aggregate_idx, aggregate_name in enumerate(aggregate_names):
+            row = {"Metric": metric_name, "Aggregate": aggregate_name}
+            for algorithm in algorithms:
+                value = aggregate_scores[algorithm][metric_idx, aggregate_idx]
+                ci = aggregate_score_cis[algorithm][:, metric_idx, aggregate_idx]
+                aggregate_scores_dict[metric_name].setdefault(algorithm, {})[
+                    aggregate_name
+                ] = value
+                aggregate_score_cis_dict[metric_name].setdefault(algorithm, {})[
+                    aggregate_name
+                ] = ci
+
+                # get the bootstrap confidence interval
+                row[algorithm] = (
+                    str(round(value, rounding_decimals))
+                    + " ["
+                    + str(round(ci[0], rounding_decimals))
+                    + ", "
+                    + str(round(ci[1], rounding_decimals))
+                    + "]"
+                )
+            tabular_results.append(row)
+
+    tabular_results_df = pd.DataFrame(
+        tabular_results, columns=["Metric", "Aggregate"] + algorithms
+    )
+    _save_tabular_results(
+        tabular_results_df,
+        tabular_results_file_path + "_combined",
+        save_tabular_as_latex,
+    )
 
     return fig, aggregate_scores_dict, aggregate_score_cis_dict
 
@@ -246,7 +420,8 @@ def probability_of_improvement(
     metrics_to_normalize: List[str],
     algorithms_to_compare: List[List],
     legend_map: Optional[Dict[str, str]] = None,
-) -> Figure:
+    bootstrap_context: Optional[BootstrapContext] = None,
+) -> "Figure":
     """Produces probability of improvement plots.
 
     Args:
@@ -256,10 +431,15 @@ def probability_of_improvement(
         metrics_to_normalize: List of metrics that are normalised.
         algorithms_to_compare: 2D list containing pairs of algorithms to be compared.
         legend_map: Dictionary that maps each algorithm to a custom legend label.
+        bootstrap_context: Resamples and options of the bootstrap, see
+            `BootstrapContext`. If None, the resamples are drawn from fresh
+            entropy and not shared.
 
     Returns:
         fig: Matplotlib figure for storing.
     """
+    import colorcet as cc
+    from rliable import plot_utils
 
     metric_name, metrics_to_normalize = lower_case_inputs(
         metric_name, metrics_to_normalize
@@ -296,8 +476,12 @@ def probability_of_improvement(
             data_dictionary[pair[0]],
             data_dictionary[pair[1]],
         )
-    average_probabilities, average_prob_cis = rly.get_interval_estimates(
-        algorithm_pairs, metrics.probability_of_improvement, reps=2000
+    if bootstrap_context is None:
+        bootstrap_context = BootstrapContext(share_resamples=False)
+    average_probabilities, average_prob_cis = bootstrap_context.interval_estimates(
+        algorithm_pairs,
+        metrics_utils.probability_of_improvement,
+        reps=2000,
     )
     fig = plot_utils.plot_probability_of_improvement(
         average_probabilities, average_prob_cis, color_palette=cc.glasbey_category10
@@ -305,13 +489,100 @@ def probability_of_improvement(
     return fig
 
 
+def probability_of_improvement_matrix(
+    dictionary: Dict[str, Dict[str, Any]],
+    metric_name: str,
+    metrics_to_normalize: List[str],
+    legend_map: Optional[Dict[str, str]] = None,
+    bootstrap_context: Optional[BootstrapContext] = None,
+) -> Tuple["Figure", Dict[str, Dict[str, float]], Dict[str, Dict[str, np.ndarray]]]:
+    """Produces a heatmap of the probability of improvement of all algorithm pairs.
+
+    Every algorithm is resampled once per bootstrap replication and the
+    probabilities of improvement of all pairs are computed together from
+    sorted scores, which is much cheaper than comparing every pair separately.
+
+    Args:
+        dictionary: Dictionary containing 2D arrays of normalised absolute metric scores
+            for metric algorithm pairs.
+        metric_name: Name of metric to produce plots for.
+        metrics_to_normalize: List of metrics that are normalised.
+        legend_map: Dictionary that maps each algorithm to a custom legend label.
+        bootstrap_context: Resamples and options of the bootstrap, see
+            `BootstrapContext`. If None, the resamples are drawn from fresh
+            entropy and not shared.
+
+    Returns:
+        fig: Matplotlib figure for storing.
+        probabilities: Nested dictionary where probabilities[x][y] is the
+            probability that algorithm x improves over algorithm y.
+        probability_cis: Nested dictionary with the confidence interval of every
+            entry of `probabilities`.
+    """
+    from marl_eval.plotting_tools.plot_utils import (
+        plot_probability_of_improvement_matrix,
+    )
+
+    metric_name, metrics_to_normalize = lower_case_inputs(
+        metric_name, metrics_to_normalize
+    )
+
+    if metric_name in metrics_to_normalize:
+        data_dictionary = dictionary[f"mean_norm_{metric_name}"]
+    else:
+        data_dictionary = dictionary[f"mean_{metric_name}"]
+
+    # Upper case all algorithm names
+    upper_algo_dict = {algo.upper(): value for algo, value in data_dictionary.items()}
+    data_dictionary = upper_algo_dict
+
+    if legend_map is not None:
+        legend_map = {algo.upper(): value for algo, value in legend_map.items()}
+        # Replace keys in data dict with corresponding key in legend map
+        data_dictionary = {
+            legend_map[algo]: value for algo, value in data_dictionary.items()
+        }
+    algorithms = list(data_dictionary.keys())
+
+    if bootstrap_context is None:
+        bootstrap_context = BootstrapContext(share_resamples=False)
+    point_estimates, interval_estimates = bootstrap_context.interval_estimates(
+        {"all_pairs": tuple(data_dictionary.values())},
+        metrics_utils.probability_of_improvement_matrix,
+        reps=2000,
+    )
+
+    probability_matrix = point_estimates["all_pairs"]
+    probability_matrix_cis = interval_estimates["all_pairs"]
+    fig = plot_probability_of_improvement_matrix(
+        probability_matrix, probability_matrix_cis, algorithms
+    )
+
+    probabilities = {
+        algo_x: {
+            algo_y: probability_matrix[x, y] for y, algo_y in enumerate(algorithms)
+        }
+        for x, algo_x in enumerate(algorithms)
+    }
+    probability_cis = {
+        algo_x: {
+            algo_y: probability_matrix_cis[:, x, y]
+            for y, algo_y in enumerate(algorithms)
+        }
+        for x, algo_x in enumerate(algorithms)
+    }
+    return fig, probabilities, probability_cis
+
+
 def sample_efficiency_curves(
     dictionary: Dict[str, Dict[str, Any]],
     metric_name: str,
     metrics_to_normalize: List[str],
     legend_map: Optional[Dict[str, str]] = None,
     xlabel: str = "Timesteps",
-) -> Tuple[Figure, Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    bootstrap_context: Optional[BootstrapContext] = None,
+    max_points: Optional[int] = None,
+) -> Tuple["Figure", Dict[str, np.ndarray], Dict[str, np.ndarray]]:
     """Produces sample efficiency curve plots.
 
     Args:
@@ -321,12 +592,22 @@ def sample_efficiency_curves(
         metrics_to_normalize: List of metrics that are normalised.
         legend_map: Dictionary that maps each algorithm to a custom legend label.
         xlabel: Label for x-axis.
+        bootstrap_context: Resamples and options of the bootstrap, see
+            `BootstrapContext`. If None, the resamples are drawn from fresh
+            entropy and not shared.
+        max_points: Maximum number of frames plotted, shared by all
+            algorithms. Longer curves are downsampled with `decimate_curves`
+            before plotting, while the returned scores keep every frame.
 
     Returns:
         fig: Matplotlib figure for storing.
         iqm_scores: IQM score values used in plots.
         iqm_cis: IQM score score confidence intervals used in plots.
     """
+    import colorcet as cc
+    from rliable import plot_utils
+
+    from marl_eval.plotting_tools.plot_utils import decimate_curves
 
     metric_name, metrics_to_normalize = lower_case_inputs(
         metric_name, metrics_to_normalize
@@ -369,16 +650,21 @@ def sample_efficiency_curves(
         algorithm: score[:, :, frames] for algorithm, score in data_dictionary.items()
     }
 
-    iqm = lambda scores: np.array(  # noqa: E731
-        [metrics.aggregate_iqm(scores[..., frame]) for frame in range(scores.shape[-1])]
+    if bootstrap_context is None:
+        bootstrap_context = BootstrapContext(share_resamples=False)
+    iqm_scores, iqm_cis = bootstrap_context.interval_estimates(
+        scores_dict,
+        metrics_utils.aggregate_iqm_over_frames,
+        reps=5000,
     )
 
-    iqm_scores, iqm_cis = rly.get_interval_estimates(scores_dict, iqm, reps=5000)
-
+    plot_x_axis_values, plot_scores, plot_cis = decimate_curves(
+        x_axis_values, iqm_scores, iqm_cis, max_points
+    )
     fig = plot_utils.plot_sample_efficiency_curve(
-        x_axis_values,
-        iqm_scores,
-        iqm_cis,
+        plot_x_axis_values,
+        plot_scores,
+        plot_cis,
         algorithms=algorithms,
         xlabel=xlabel,
         ylabel=ylabel,
@@ -401,7 +687,11 @@ def plot_single_task(
     xlabel: str = "Timesteps",
     legend_map: Optional[Dict[str, str]] = None,
     run_times: Optional[Dict[str, float]] = None,
-) -> Figure:
+    aggregated_data: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+    ci_method: str = "normal",
+    bootstrap_context: Optional[BootstrapContext] = None,
+    max_points: Optional[int] = None,
+) -> "Figure":
     """Produces aggregated plot for a single task in an environment.
 
     Args:
@@ -415,18 +705,37 @@ def plot_single_task(
             If None, then this mapping is created based on `algorithms`.
         run_times: Dictionary that maps each algorithm to the number of seconds it
             took to run. If None, then environment steps will be displayed.
+        aggregated_data: Output of `get_and_aggregate_data_all_tasks` for the
+            environment. If given, the task is read from it instead of being
+            aggregated again, which saves time when plotting many tasks.
+        ci_method: Method used for the 95% CIs: "normal", "t" or "bootstrap".
+            Ignored if `aggregated_data` is given.
+        bootstrap_context: Resamples and options of the bootstrap CIs, see
+            `marl_eval.utils.bootstrap_utils.BootstrapContext`. Ignored if
+            `aggregated_data` is given.
+        max_points: Maximum number of points plotted per algorithm. Longer
+            curves are downsampled before plotting.
     """
+    import colorcet as cc
+
+    from marl_eval.plotting_tools.plot_utils import plot_single_task_curve
+
     metric_name, task_name, environment_name, metrics_to_normalize = lower_case_inputs(
         metric_name, task_name, environment_name, metrics_to_normalize
     )
 
-    task_mean_ci_data = get_and_aggregate_data_single_task(
-        processed_data=processed_data,
-        environment_name=environment_name,
-        metric_name=metric_name,
-        task_name=task_name,
-        metrics_to_normalize=metrics_to_normalize,
-    )
+    if aggregated_data is not None:
+        task_mean_ci_data = dict(aggregated_data[metric_name][task_name])
+    else:
+        task_mean_ci_data = get_and_aggregate_data_single_task(
+            processed_data=processed_data,
+            environment_name=environment_name,
+            metric_name=metric_name,
+            task_name=task_name,
+            metrics_to_normalize=metrics_to_normalize,
+            ci_method=ci_method,
+            bootstrap_context=bootstrap_context,
+        )
 
     if metric_name in metrics_to_normalize:
         ylabel = "Normalized " + " ".join(metric_name.split("_"))
@@ -459,6 +768,7 @@ def plot_single_task(
         color_palette=cc.glasbey_category10,
         legend_map=legend_map,
         run_times=run_times,
+        max_points=max_points,
         marker="",
     )
 
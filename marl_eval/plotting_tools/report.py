@@ -0,0 +1,324 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batch rendering of all the figures of an experiment report.
+
+The figures of a report form a small task graph: the rliable matrices and the
+per task curves of every environment are computed first, and every figure of
+the environment is then rendered from them. All nodes run in a process pool
+with the headless Agg backend, so that a full report uses every core.
+"""
+
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from colorama import Fore, Style
+
+from marl_eval.plotting_tools.plotting import (
+    aggregate_scores,
+    performance_profiles,
+    plot_single_task,
+    probability_of_improvement,
+    sample_efficiency_curves,
+)
+from marl_eval.utils.bootstrap_utils import BootstrapContext
+from marl_eval.utils.data_processing_utils import (
+    create_matrices_for_rliable,
+    get_and_aggregate_data_all_tasks,
+    lower_case_inputs,
+)
+
+PLOT_TYPES = (
+    "single_task",
+    "performance_profile",
+    "aggregate_scores",
+    "probability_of_improvement",
+    "sample_efficiency_curve",
+)
+
+
+def _init_worker() -> None:
+    """Renders the figures of a worker process without a display."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _run_inline(func: Callable, *args: Any) -> Future:
+    """Runs a function in the current process and wraps its result in a future."""
+    future: Future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _environment_matrices(
+    env_data: Dict[str, Any], environment_name: str, metrics_to_normalize: List[str]
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Creates the rliable matrices of an environment."""
+    return create_matrices_for_rliable(env_data, environment_name, metrics_to_normalize)
+
+
+def _environment_curves(
+    env_data: Dict[str, Any],
+    environment_name: str,
+    metric_names: List[str],
+    metrics_to_normalize: List[str],
+    ci_method: str,
+    bootstrap_context: BootstrapContext,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Aggregates the per task curves of an environment."""
+    return get_and_aggregate_data_all_tasks(
+        env_data,
+        metric_names=metric_names,
+        metrics_to_normalize=metrics_to_normalize,
+        environment_name=environment_name,
+        ci_method=ci_method,
+        bootstrap_context=bootstrap_context,
+    )
+
+
+def _render_figure(plot_type: str, file_path: str, plot_kwargs: Dict[str, Any]) -> str:
+    """Computes the statistics of a figure, renders it and saves it."""
+    import matplotlib.pyplot as plt
+
+    if plot_type == "single_task":
+        fig = plot_single_task(**plot_kwargs)
+    elif plot_type == "performance_profile":
+        fig = performance_profiles(**plot_kwargs)
+    elif plot_type == "aggregate_scores":
+        fig, _, _ = aggregate_scores(**plot_kwargs)
+    elif plot_type == "probability_of_improvement":
+        fig = probability_of_improvement(**plot_kwargs)
+    else:
+        fig, _, _ = sample_efficiency_curves(**plot_kwargs)
+
+    fig.figure.savefig(file_path, bbox_inches="tight")
+    plt.close(fig.figure)
+    return file_path
+
+
+def _single_task_jobs(
+    curves: Dict[str, Dict[str, Dict[str, Any]]],
+    environment_name: str,
+    out_dir: str,
+    max_points: Optional[int],
+    plot_kwargs: Dict[str, Any],
+) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """Single task figures of every metric and task of an environment."""
+    jobs = []
+    for metric_name, metric_curves in curves.items():
+        for task_name, task_curves in metric_curves.items():
+            file_name = f"{environment_name}_{task_name}_agg_{metric_name}.png"
+            # Only the curves of the task are sent to the worker, as they are
+            # all that the figure reads.
+            task_kwargs = {
+                "processed_data": {},
+                "environment_name": environment_name,
+                "task_name": task_name,
+                "metric_name": metric_name,
+                "aggregated_data": {metric_name: {task_name: task_curves}},
+                "max_points": max_points,
+                **plot_kwargs,
+            }
+            jobs.append(("single_task", os.path.join(out_dir, file_name), task_kwargs))
+    return jobs
+
+
+def _environment_jobs(
+    matrices: Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]],
+    environment_name: str,
+    metric_names: List[str],
+    plot_types: List[str],
+    algorithms_to_compare: Optional[List[List[str]]],
+    out_dir: str,
+    max_points: Optional[int],
+    plot_kwargs: Dict[str, Any],
+) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """Figures of every metric and plot type built from the rliable matrices."""
+    comparison_matrix, sample_efficiency_matrix = matrices
+    if algorithms_to_compare is None:
+        algorithms = comparison_matrix[next(iter(comparison_matrix))].keys()
+        algorithms_to_compare = [
+            list(pair) for pair in itertools.combinations(algorithms, 2)
+        ]
+
+    jobs = []
+    for metric_name in metric_names:
+        for plot_type in plot_types:
+            figure_kwargs = {
+                "dictionary": comparison_matrix,
+                "metric_name": metric_name,
+                **plot_kwargs,
+            }
+            if plot_type == "aggregate_scores":
+                figure_kwargs["tabular_results_file_path"] = os.path.join(
+                    out_dir, f"{environment_name}_aggregated_score"
+                )
+            elif plot_type == "probability_of_improvement":
+                figure_kwargs["algorithms_to_compare"] = algorithms_to_compare
+            elif plot_type == "sample_efficiency_curve":
+                figure_kwargs["dictionary"] = sample_efficiency_matrix
+                figure_kwargs["max_points"] = max_points
+            file_name = f"{environment_name}_{metric_name}_{plot_type}.png"
+            jobs.append((plot_type, os.path.join(out_dir, file_name), figure_kwargs))
+    return jobs
+
+
+def render_report(spec: Dict[str, Any], out_dir: str, workers: int = 1) -> List[str]:
+    """Renders and saves every figure of an experiment report.
+
+    Every environment gets one figure per metric and plot type, and the
+    "single_task" plot type gives one figure per task and metric. The
+    statistics and rendering of the figures are distributed over a process
+    pool whose workers use the Agg backend. The bootstrap of every figure
+    runs in a single process, since the figures are already computed in
+    parallel.
+
+    Args:
+        spec: Dictionary describing the report, with keys
+            - "processed_data": output of `data_process_pipeline`.
+            - "metric_names": names of the metrics to plot.
+            - "metrics_to_normalize": names of the normalised metrics.
+            - "environment_names" (optional): environments to plot. Defaults to
+              all environments of "processed_data".
+            - "plots" (optional): plot types to render, among `PLOT_TYPES`.
+              Defaults to all of them.
+            - "legend_map" (optional): maps each algorithm to a legend label.
+            - "algorithms_to_compare" (optional): pairs of algorithms of the
+              probability of improvement plots. Defaults to all pairs.
+            - "seed" (optional): seed of the bootstraps.
+            - "ci_method" (optional): CI method of the single task plots,
+              "normal" by default.
+            - "max_points" (optional): maximum number of points plotted per
+              curve, see `plot_single_task_curve`.
+        out_dir: Directory where the figures and tabular results are saved.
+        workers: Number of worker processes. With 1, everything runs in the
+            current process, which switches to the Agg backend meanwhile.
+
+    Returns:
+        The sorted paths of the saved figures.
+    """
+    processed_data = spec["processed_data"]
+    metric_names = lower_case_inputs(spec["metric_names"])
+    metrics_to_normalize = lower_case_inputs(spec["metrics_to_normalize"])
+    environment_names = spec.get("environment_names")
+    if environment_names is None:
+        environment_names = [env for env in processed_data if env != "extra"]
+    else:
+        environment_names = lower_case_inputs(environment_names)
+    plot_types = spec.get("plots", PLOT_TYPES)
+    legend_map = spec.get("legend_map")
+    # The figures draw the same resamples from the seed, whichever process
+    # renders them.
+    bootstrap_context = BootstrapContext(seed=spec.get("seed"))
+
+    unknown_plot_types = set(plot_types) - set(PLOT_TYPES)
+    if unknown_plot_types:
+        print(
+            f"{Fore.RED}{Style.BRIGHT}Unknown plot types {sorted(unknown_plot_types)}, "
+            + f"expected a subset of {list(PLOT_TYPES)}.{Style.RESET_ALL}"
+        )
+        raise ValueError(f"Unknown plot types {sorted(unknown_plot_types)}.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    matrix_plot_types = [plot for plot in plot_types if plot != "single_task"]
+    plot_kwargs = {
+        "metrics_to_normalize": metrics_to_normalize,
+        "legend_map": legend_map,
+    }
+
+    env_datas = {
+        environment_name: {
+            environment_name: processed_data[environment_name],
+            "extra": processed_data["extra"],
+        }
+        for environment_name in environment_names
+    }
+    with ExitStack() as stack:
+        if workers > 1:
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            )
+            submit: Callable[..., Future] = executor.submit
+        else:
+            # Figures rendered in the current process use Agg as well, and the
+            # backend of the caller is restored afterwards.
+            import matplotlib.pyplot as plt
+
+            stack.callback(plt.switch_backend, plt.get_backend())
+            plt.switch_backend("Agg")
+            submit = _run_inline
+
+        # Nodes that figures depend on, i.e. the matrices and curves of every
+        # environment.
+        dependencies: Dict[Future, Tuple[str, str]] = {}
+        for environment_name, env_data in env_datas.items():
+            if matrix_plot_types:
+                future = submit(
+                    _environment_matrices,
+                    env_data,
+                    environment_name,
+                    metrics_to_normalize,
+                )
+                dependencies[future] = (environment_name, "matrices")
+            if "single_task" in plot_types:
+                future = submit(
+                    _environment_curves,
+                    env_data,
+                    environment_name,
+                    metric_names,
+                    metrics_to_normalize,
+                    spec.get("ci_method", "normal"),
+                    bootstrap_context,
+                )
+                dependencies[future] = (environment_name, "curves")
+
+        # Submit the figures of every node as soon as it is done.
+        pending: Set[Future] = set(dependencies)
+        figures: List[Future] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                environment_name, node = dependencies[future]
+                if node == "curves":
+                    jobs = _single_task_jobs(
+                        future.result(),
+                        environment_name,
+                        out_dir,
+                        spec.get("max_points"),
+                        plot_kwargs,
+                    )
+                else:
+                    jobs = _environment_jobs(
+                        future.result(),
+                        environment_name,
+                        metric_names,
+                        matrix_plot_types,
+                        spec.get("algorithms_to_compare"),
+                        out_dir,
+                        spec.get("max_points"),
+                        {**plot_kwargs, "bootstrap_context": bootstrap_context},
+                    )
+                figures.extend(submit(_render_figure, *job) for job in jobs)
+
+        file_paths = sorted(future.result() for future in figures)
+
+    return file_paths
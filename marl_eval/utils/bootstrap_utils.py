@@ -0,0 +1,592 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Vectorized stratified bootstrap for interval estimates of aggregate metrics."""
+
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from colorama import Fore, Style
+
+from marl_eval.utils import metrics_utils
+
+# Number of bootstrap replications drawn from a single random stream. Keeping it
+# fixed makes the replications independent of how they are processed.
+_BLOCK_SIZE = 500
+# Number of arrays as large as the resampled scores that an aggregate without a
+# working set estimate in `metrics_utils` is assumed to hold at once.
+_AGGREGATE_MEMORY_FACTOR = 2
+# Number of replications the adaptive bootstrap starts with.
+_ADAPTIVE_INITIAL_REPS = 2000
+
+Scores = Union[np.ndarray, Tuple[np.ndarray, ...]]
+
+
+class BootstrapContext:
+    """Seeded bootstrap resamples and options shared between interval estimates.
+
+    The run indices of the bootstrap replications are drawn once for every
+    (runs, tasks) shape and reused by every `get_interval_estimates` call given
+    this context, e.g. by all the plots of a report. Besides saving the draws,
+    this makes the confidence intervals of different metrics and figures
+    consistent with each other, since they are computed from the same
+    resamples. The context also holds the options of the bootstrap, which the
+    plotting functions apply through `interval_estimates`.
+
+    Every score array of a tuple, e.g. the two algorithms compared by the
+    probability of improvement, is resampled from its own stream of indices,
+    so that tuples are still bootstrapped independently. Indices are drawn in
+    blocks of `_BLOCK_SIZE` replications, each with its own seed, and blocks
+    are only drawn when first needed, so the indices do not depend on the order
+    of the calls or on the number of replications they request.
+    """
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        workers: int = 1,
+        executor: Optional[Executor] = None,
+        tolerance: Optional[float] = None,
+        backend: str = "numpy",
+        share_resamples: bool = True,
+    ) -> None:
+        """Initialises an empty context.
+
+        Args:
+            seed: seed of the resamples. If None, fresh entropy is used.
+            memory_budget: approximate number of bytes the bootstrap may use at
+                once, per worker. If given, the memory used is printed.
+            workers: number of processes over which the bootstrap is
+                distributed.
+            executor: executor used for the bootstrap instead of a new process
+                pool. Takes precedence over `workers`.
+            tolerance: target Monte Carlo standard error of the confidence
+                interval bounds. If given, the number of replications adapts to
+                reach it and the replications used are printed.
+            backend: "numpy" or "jax", see `get_interval_estimates` for when
+                JAX is faster.
+            share_resamples: whether the run indices are cached and shared by
+                every interval estimate of the context. If False, they are
+                drawn anew from `seed` by every call, so that the bootstrap
+                stays within `memory_budget`.
+        """
+        self.seed = seed
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self.memory_budget = memory_budget
+        self.workers = workers
+        self.executor = executor
+        self.tolerance = tolerance
+        self.backend = backend
+        self.share_resamples = share_resamples
+        self._blocks: Dict[Tuple[int, int, int], List[np.ndarray]] = {}
+
+    def run_indices(
+        self, num_runs: int, num_tasks: int, stream: int, reps: int
+    ) -> List[np.ndarray]:
+        """Returns the run indices of the first `reps` bootstrap replications.
+
+        Args:
+            num_runs: number of runs of the resampled scores.
+            num_tasks: number of tasks of the resampled scores.
+            stream: position of the scores in a tuple of score arrays.
+            reps: number of bootstrap replications.
+
+        Returns:
+            One (block_reps, runs, tasks) array of run indices per block.
+        """
+        blocks = self._blocks.setdefault((num_runs, num_tasks, stream), [])
+        dtype = np.min_scalar_type(num_runs - 1)
+        for block in range(len(blocks), -(-reps // _BLOCK_SIZE)):
+            rng = np.random.default_rng(
+                np.random.SeedSequence(
+                    self.entropy, spawn_key=(num_runs, num_tasks, stream, block)
+                )
+            )
+            blocks.append(
+                rng.integers(num_runs, size=(_BLOCK_SIZE, num_runs, num_tasks)).astype(
+                    dtype
+                )
+            )
+        num_blocks, last_block_reps = divmod(reps, _BLOCK_SIZE)
+        run_indices = blocks[:num_blocks]
+        if last_block_reps:
+            run_indices.append(blocks[num_blocks][:last_block_reps])
+        return run_indices
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes held by the cached run indices."""
+        return sum(block.nbytes for blocks in self._blocks.values() for block in blocks)
+
+    def interval_estimates(
+        self,
+        score_dict: Mapping[str, Scores],
+        aggregate_func: Callable[..., np.ndarray],
+        reps: int,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Computes interval estimates with the resamples and options of the context.
+
+        Args:
+            score_dict: Dictionary mapping a name to its scores, see
+                `get_interval_estimates`.
+            aggregate_func: batched aggregate function.
+            reps: number of bootstrap replications. If a tolerance is set,
+                the adaptive bootstrap uses up to four times `reps`, see
+                `get_interval_estimates`.
+
+        Returns:
+            The point and interval estimates of `get_interval_estimates`.
+        """
+        point_estimates, interval_estimates, report = get_interval_estimates(
+            score_dict,
+            aggregate_func,
+            reps=reps,
+            seed=self.seed,
+            memory_budget=self.memory_budget,
+            return_report=True,
+            workers=self.workers,
+            executor=self.executor,
+            context=self if self.share_resamples else None,
+            tolerance=self.tolerance,
+            backend=self.backend,
+        )
+        if self.memory_budget is not None or self.tolerance is not None:
+            print_bootstrap_report(report)
+        return point_estimates, interval_estimates
+
+
+def _as_tuple(scores: Scores) -> Tuple[np.ndarray, ...]:
+    """Wraps a single score array in a tuple."""
+    if isinstance(scores, tuple):
+        return tuple(np.asarray(score) for score in scores)
+    return (np.asarray(scores),)
+
+
+def _resample(scores: np.ndarray, run_indices: np.ndarray) -> np.ndarray:
+    """Gathers resampled runs of every task.
+
+    Args:
+        scores: (runs, tasks, ...) array of scores.
+        run_indices: (reps, runs, tasks) array of run indices.
+
+    Returns:
+        A (reps, runs, tasks, ...) array of resampled scores.
+    """
+    return scores[run_indices, np.arange(scores.shape[1])]
+
+
+def _aggregate_chunk(
+    scores: Sequence[np.ndarray],
+    rngs: Sequence[Union[np.random.Generator, np.ndarray]],
+    aggregate_func: Callable[..., np.ndarray],
+    chunk_reps: int,
+    chunk_start: int,
+    backend: str = "numpy",
+) -> np.ndarray:
+    """Draws run indices for a chunk of replications and aggregates them.
+
+    Runs are resampled with replacement, independently for every task and every
+    score array (stratified independent bootstrap). Every score array has its
+    own random stream, so drawing a block in several chunks gives the same
+    indices as drawing it at once. Instead of a random generator, a score array
+    may come with the precomputed run indices of the whole block, which are
+    then sliced from `chunk_start`.
+
+    With the jax backend, the indices are drawn in the same way and the
+    resampling and aggregation are compiled together by JAX.
+    """
+    run_indices = []
+    for score, rng in zip(scores, rngs):
+        if isinstance(rng, np.ndarray):
+            run_indices.append(rng[chunk_start : chunk_start + chunk_reps])
+        else:
+            run_indices.append(
+                rng.integers(score.shape[0], size=(chunk_reps, *score.shape[:2]))
+            )
+    if backend == "jax":
+        from marl_eval.utils import jax_metrics_utils
+
+        return jax_metrics_utils.aggregate_chunk(aggregate_func, scores, run_indices)
+    return aggregate_func(
+        *(_resample(score, indices) for score, indices in zip(scores, run_indices))
+    )
+
+
+def _memory_per_rep(
+    scores: Tuple[np.ndarray, ...], aggregate_func: Callable[..., np.ndarray]
+) -> int:
+    """Estimated number of bytes used by a single bootstrap replication.
+
+    A replication holds (runs, tasks) int64 run indices and resampled scores
+    of the size of every score array, plus the working set of the aggregate
+    given by `metrics_utils.working_set_nbytes`. The estimate only depends on
+    the shapes of the scores, so it is the same for every call and does not
+    rely on any process-wide state.
+    """
+    working_set = metrics_utils.working_set_nbytes(
+        aggregate_func, *(score.shape for score in scores)
+    )
+    if working_set is None:
+        working_set = _AGGREGATE_MEMORY_FACTOR * sum(score.nbytes for score in scores)
+    memory_per_rep = working_set + sum(
+        score.shape[0] * score.shape[1] * np.dtype(np.int64).itemsize + score.nbytes
+        for score in scores
+    )
+    return max(1, memory_per_rep)
+
+
+def _block_replications(
+    scores: Tuple[np.ndarray, ...],
+    aggregate_func: Callable[..., np.ndarray],
+    block_reps: int,
+    block_seed: Union[np.random.SeedSequence, Sequence[np.ndarray]],
+    memory_budget: Optional[int] = None,
+    backend: str = "numpy",
+) -> Tuple[np.ndarray, int, int]:
+    """Computes an aggregate metric over one block of bootstrap replications.
+
+    The block is processed in chunks of replications whose run indices are
+    drawn as a single (reps, runs, tasks) integer array, and `aggregate_func` is
+    evaluated on all resampled score arrays of a chunk in a single vectorized
+    call. Since every replication only depends on its own indices, the results
+    do not depend on the chunk size.
+
+    If a memory budget is given, the chunk size is chosen so that the memory
+    used by a chunk, estimated from the shapes of the scores with
+    `_memory_per_rep`, stays within the budget. Nothing is measured on the
+    heap, so bootstraps running concurrently in threads do not interfere.
+
+    Returns:
+        replications: (block_reps, ...) array with the aggregate of every
+            replication.
+        chunk_reps: number of replications processed at once.
+        peak_memory: estimated peak memory in bytes used by a chunk, or 0 if no
+            memory budget was given.
+    """
+    rngs: Sequence[Union[np.random.Generator, np.ndarray]]
+    if isinstance(block_seed, np.random.SeedSequence):
+        rngs = [np.random.default_rng(seed) for seed in block_seed.spawn(len(scores))]
+    else:
+        rngs = block_seed
+    chunk_reps, peak_memory = _BLOCK_SIZE, 0
+    if memory_budget is not None:
+        memory_per_rep = _memory_per_rep(scores, aggregate_func)
+        chunk_reps = int(np.clip(memory_budget // memory_per_rep, 1, _BLOCK_SIZE))
+        peak_memory = chunk_reps * memory_per_rep
+
+    replications = []
+    for chunk_start in range(0, block_reps, chunk_reps):
+        replications.append(
+            _aggregate_chunk(
+                scores,
+                rngs,
+                aggregate_func,
+                min(chunk_reps, block_reps - chunk_start),
+                chunk_start,
+                backend,
+            )
+        )
+    return np.concatenate(replications), chunk_reps, peak_memory
+
+
+def _select_backend(backend: str, aggregate_func: Callable[..., np.ndarray]) -> str:
+    """Returns the backend to use, falling back to NumPy if JAX is unusable."""
+    if backend not in ["numpy", "jax"]:
+        raise ValueError(f"Unknown backend {backend}, expected 'numpy' or 'jax'.")
+    if backend == "numpy":
+        return backend
+
+    try:
+        from marl_eval.utils import jax_metrics_utils
+    except ImportError:
+        print(
+            f"{Fore.YELLOW}{Style.BRIGHT}JAX is not installed, the bootstrap "
+            + f"falls back to the numpy backend.{Style.RESET_ALL}"
+        )
+        return "numpy"
+    if not jax_metrics_utils.is_supported(aggregate_func):
+        print(
+            f"{Fore.YELLOW}{Style.BRIGHT}{aggregate_func} has no JAX version, the "
+            + f"bootstrap falls back to the numpy backend.{Style.RESET_ALL}"
+        )
+        return "numpy"
+    return backend
+
+
+def _interval_estimate(
+    block_replications: List[np.ndarray], alpha: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Percentile interval and its Monte Carlo standard error.
+
+    The standard error of the interval bounds is estimated with batch means:
+    the bounds are computed on every full block of replications on its own,
+    and the spread of these estimates is scaled down to the total number of
+    replications.
+
+    Returns:
+        interval_estimate: (2, ...) array with the lower and upper bounds.
+        standard_error: (2, ...) array with the standard error of every bound,
+            or NaN if fewer than two full blocks are available.
+    """
+    percentiles = [alpha / 2, 100 - alpha / 2]
+    replications = np.concatenate(block_replications)
+    interval_estimate = np.percentile(replications, percentiles, axis=0)
+    full_blocks = [block for block in block_replications if len(block) == _BLOCK_SIZE]
+    if len(full_blocks) < 2:
+        return interval_estimate, np.full(interval_estimate.shape, np.nan)
+    block_estimates = np.percentile(np.stack(full_blocks), percentiles, axis=1)
+    standard_error = np.std(block_estimates, axis=1, ddof=1) * np.sqrt(
+        _BLOCK_SIZE / len(replications)
+    )
+    return interval_estimate, standard_error
+
+
+def get_interval_estimates(
+    score_dict: Mapping[str, Scores],
+    aggregate_func: Callable[..., np.ndarray],
+    reps: int = 50000,
+    confidence_interval_size: float = 0.95,
+    seed: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    return_report: bool = False,
+    workers: int = 1,
+    executor: Optional[Executor] = None,
+    context: Optional[BootstrapContext] = None,
+    tolerance: Optional[float] = None,
+    max_reps: Optional[int] = None,
+    backend: str = "numpy",
+) -> Tuple[Dict[str, Any], ...]:
+    """Computes point and percentile bootstrap interval estimates.
+
+    This is a vectorized replacement of `rliable.library.get_interval_estimates`
+    for batched aggregate functions such as those in
+    `marl_eval.utils.metrics_utils`.
+
+    The replications of every entry of `score_dict` are split into blocks of
+    `_BLOCK_SIZE`, each with its own random streams spawned from `seed` with
+    `np.random.SeedSequence`. Blocks are independent, so they can be processed
+    by several workers while the results stay the same for a given seed.
+
+    If a `tolerance` is given, the bootstrap is adaptive: every entry starts
+    with `_ADAPTIVE_INITIAL_REPS` replications, which are doubled until the
+    Monte Carlo standard error of all its interval bounds is within the
+    tolerance or `max_reps` is reached. Since blocks are only appended, the
+    results of an adaptive run match a fixed run with the same seed and the
+    same final number of replications.
+
+    Args:
+        score_dict: Dictionary mapping a name, usually an algorithm, to a
+            (runs, tasks, ...) array of scores or to a tuple of such arrays.
+        aggregate_func: batched aggregate which maps (reps, runs, tasks, ...)
+            arrays, one per score array, to a (reps, ...) array. It must be
+            picklable, e.g. a module level function, to be used with processes.
+        reps: number of bootstrap replications. If a tolerance is set, the
+            adaptive bootstrap starts with `_ADAPTIVE_INITIAL_REPS`
+            replications instead, and `reps` only sets the default of
+            `max_reps`.
+        confidence_interval_size: coverage of the confidence intervals.
+        seed: seed of the random streams. The results are reproducible for a
+            given seed, whatever the memory budget and number of workers. If
+            None, fresh entropy is used.
+        memory_budget: approximate number of bytes that the resampled scores
+            and the aggregation of a chunk of replications may use, per worker.
+            The working set of the aggregates of `metrics_utils` is estimated
+            for every aggregate, and other aggregates are assumed to hold two
+            copies of the resampled scores. The replications kept for the
+            intervals come on top. If None, chunks of a fixed number of
+            replications are used.
+        return_report: whether to also return a report of the computation.
+        workers: number of worker processes over which blocks of replications
+            are distributed. With 1, everything runs in the current process.
+            With the jax backend, the workers are started with "spawn".
+        executor: executor used to process the blocks instead of creating a new
+            process pool. Takes precedence over `workers`. With the jax
+            backend, a process pool must not use "fork", which can deadlock
+            once JAX has started its threads.
+        context: bootstrap context providing the run indices of the
+            replications, shared with other interval estimates. Takes
+            precedence over `seed`.
+        tolerance: target Monte Carlo standard error of the interval bounds, in
+            the units of the aggregate metric. If None, exactly `reps`
+            replications are used.
+        max_reps: maximum number of replications of the adaptive bootstrap.
+            Defaults to four times `reps`.
+        backend: "numpy" or "jax". With "jax", the resampling and aggregation
+            of every chunk are compiled with JAX, for the aggregates of
+            `marl_eval.utils.metrics_utils`. The bootstrap falls back to NumPy
+            if JAX is not installed or the aggregate has no JAX version. The
+            run indices are the same for both backends. With JAX, the memory
+            estimate does not account for the buffers allocated by XLA.
+            JAX pays off for aggregates made of gathers and reductions, such as
+            `aggregate_mean` and the probability of improvement, on large
+            score arrays or on an accelerator. On CPU, it is slower than NumPy
+            for the aggregates that sort, such as `aggregate_iqm`,
+            `aggregate_median` and `aggregate_all`.
+
+    Returns:
+        point_estimates: Dictionary mapping every name to the aggregate of its
+            scores.
+        interval_estimates: Dictionary mapping every name to a (2, ...) array
+            holding the lower and upper bounds of the confidence interval.
+        report: Only returned if `return_report` is True. Dictionary holding
+            the number of replications used for every name `reps`, the
+            Monte Carlo `standard_error` of the bounds of every name, the
+            number of replications processed at once for every name
+            `chunk_reps` and the estimated `peak_memory` in bytes used by a
+            chunk, which is only estimated if a memory budget is given.
+    """
+    backend = _select_backend(backend, aggregate_func)
+    alpha = 100 * (1 - confidence_interval_size)
+    scores_dict = {key: _as_tuple(scores) for key, scores in score_dict.items()}
+    seed_sequences = dict(
+        zip(scores_dict, np.random.SeedSequence(seed).spawn(len(scores_dict)))
+    )
+    if tolerance is None:
+        max_reps = reps
+        target_reps = {key: reps for key in scores_dict}
+    else:
+        max_reps = 4 * reps if max_reps is None else max_reps
+        target_reps = {
+            key: min(_ADAPTIVE_INITIAL_REPS, max_reps) for key in scores_dict
+        }
+
+    replications: Dict[str, List[np.ndarray]] = {key: [] for key in scores_dict}
+    report: Dict[str, Any] = {
+        "reps": {},
+        "standard_error": {},
+        "chunk_reps": {},
+        "peak_memory": 0,
+    }
+    interval_estimates = {}
+    with ExitStack() as stack:
+        if executor is None and workers > 1:
+            # JAX runs threads that a forked worker would inherit in an
+            # inconsistent state, so the workers of the jax backend are spawned.
+            mp_context = (
+                multiprocessing.get_context("spawn") if backend == "jax" else None
+            )
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=workers, mp_context=mp_context)
+            )
+
+        pending = list(scores_dict)
+        while pending:
+            # One job per new block of replications of every pending entry.
+            keys, jobs = [], []
+            for key in pending:
+                scores, done_reps = scores_dict[key], report["reps"].get(key, 0)
+                first_block = done_reps // _BLOCK_SIZE
+                num_blocks = -(-target_reps[key] // _BLOCK_SIZE) - first_block
+                block_sizes = [
+                    min(_BLOCK_SIZE, target_reps[key] - done_reps - b * _BLOCK_SIZE)
+                    for b in range(num_blocks)
+                ]
+                block_seeds: Sequence[Any] = seed_sequences[key].spawn(num_blocks)
+                if context is not None:
+                    block_seeds = list(
+                        zip(
+                            *(
+                                context.run_indices(
+                                    score.shape[0],
+                                    score.shape[1],
+                                    stream,
+                                    target_reps[key],
+                                )[first_block:]
+                                for stream, score in enumerate(scores)
+                            )
+                        )
+                    )
+                for block_reps, block_seed in zip(block_sizes, block_seeds):
+                    keys.append(key)
+                    jobs.append(
+                        (
+                            scores,
+                            aggregate_func,
+                            block_reps,
+                            block_seed,
+                            memory_budget,
+                            backend,
+                        )
+                    )
+                report["reps"][key] = target_reps[key]
+
+            if executor is not None:
+                results = list(executor.map(_block_replications, *zip(*jobs)))
+            else:
+                results = [_block_replications(*job) for job in jobs]
+
+            for key, (block_replications, chunk_reps, peak_memory) in zip(
+                keys, results
+            ):
+                replications[key].append(block_replications)
+                report["chunk_reps"][key] = min(
+                    report["chunk_reps"].get(key, chunk_reps), chunk_reps
+                )
+                report["peak_memory"] = max(report["peak_memory"], peak_memory)
+
+            for key in pending:
+                (
+                    interval_estimates[key],
+                    report["standard_error"][key],
+                ) = _interval_estimate(replications[key], alpha)
+
+            if tolerance is None:
+                break
+            pending = [
+                key
+                for key in pending
+                if target_reps[key] < max_reps
+                and not np.all(report["standard_error"][key] <= tolerance)
+            ]
+            for key in pending:
+                target_reps[key] = min(2 * target_reps[key], max_reps)
+
+    point_estimates = {}
+    for key, scores in scores_dict.items():
+        point_estimate = aggregate_func(*(score[np.newaxis] for score in scores))
+        point_estimates[key] = point_estimate[0]
+    interval_estimates = {key: interval_estimates[key] for key in scores_dict}
+
+    if return_report:
+        return point_estimates, interval_estimates, report
+    return point_estimates, interval_estimates
+
+
+def print_bootstrap_report(report: Dict[str, Any]) -> None:
+    """Prints the replications, Monte Carlo error and memory of a bootstrap."""
+    reps = list(report["reps"].values())
+    standard_errors = np.concatenate(
+        [np.ravel(error) for error in report["standard_error"].values()] + [[]]
+    )
+    standard_errors = standard_errors[~np.isnan(standard_errors)]
+    message = f"Bootstrap with {min(reps, default=0)}"
+    if max(reps, default=0) > min(reps, default=0):
+        message += f" to {max(reps)}"
+    message += " replications"
+    if len(standard_errors) > 0:
+        message += (
+            ", with a Monte Carlo standard error of the interval bounds of at most "
+            + f"{np.max(standard_errors):.2g}"
+        )
+    if report["peak_memory"] > 0:
+        message += (
+            f", used an estimated {report['peak_memory'] / 2**20:.1f} MiB, processing "
+            + f"{min(report['chunk_reps'].values(), default=0)} replications at once"
+        )
+    print(message + ".")
@@ -0,0 +1,398 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""On-disk cache for processed experiment data and rliable matrices."""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from marl_eval._metadata import __version__
+from marl_eval.json_tools.json_utils import _merge_json_data
+from marl_eval.utils.data_processing_utils import (
+    create_matrices_for_rliable,
+    data_process_pipeline,
+    lower_case_inputs,
+)
+from marl_eval.utils.experiment_tensor import (
+    BINARY_FORMAT_VERSION,
+    ExperimentTensor,
+    dict_to_experiment_tensors,
+    experiment_tensors_to_dict,
+)
+
+# Name of the array holding the json index of a cache entry.
+_INDEX_KEY = "__index__"
+# File in the cache directory memoising the content hash of input files.
+_FILE_HASHES = "file_hashes.json"
+
+
+def _default_cache_dir() -> str:
+    """Returns the cache directory used when none is given."""
+    return os.environ.get(
+        "MARL_EVAL_CACHE_DIR", os.path.join("~", ".cache", "marl_eval")
+    )
+
+
+class ProcessedDataCache:
+    """Content-addressed on-disk cache for processed data and rliable matrices.
+
+    Entries are keyed by a hash of the content of the input JSON file(s), the
+    metrics to normalise and the marl-eval version, so that a cache entry is
+    never reused for different data or after the processing code changed.
+    Every entry is a single uncompressed `.npz` file holding the arrays of an
+    `ExperimentTensor` or of the rliable matrices together with a small json
+    index of the labels. Once the total size of the cache exceeds
+    `max_size_bytes` the least recently used entries are removed.
+
+    The content hash of an input file is memoised on its path, size and
+    modification time, so that a warm load does not read the JSON file.
+
+    Args:
+        cache_dir: directory in which entries are stored. Defaults to the
+            `MARL_EVAL_CACHE_DIR` environment variable or `~/.cache/marl_eval`.
+        max_size_bytes: maximum total size of the cached entries.
+    """
+
+    def __init__(
+        self, cache_dir: Optional[str] = None, max_size_bytes: int = 4 * 2**30
+    ) -> None:
+        """Creates the cache directory if it does not exist yet."""
+        self.cache_dir = os.path.abspath(
+            os.path.expanduser(cache_dir or _default_cache_dir())
+        )
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load_experiment_tensors(
+        self,
+        file_paths: Union[str, List[str]],
+        metrics_to_normalize: List[str],
+    ) -> Tuple[Dict[str, ExperimentTensor], Dict[str, Any]]:
+        """Loads processed data as one ExperimentTensor per environment.
+
+        On a cache miss the JSON file(s) are read and processed with
+        `data_process_pipeline` and the result is stored in the cache.
+
+        Args:
+            file_paths: path to a JSON file in the marl-eval format, or a list
+                of paths whose data are merged as by `concatenate_json_files`.
+            metrics_to_normalize: A list of metric names for metrics that should
+                be min/max normalised.
+
+        Returns:
+            tensors: processed data of every environment.
+            extra: the `extra` information of the processed data.
+        """
+        entry_path = self._entry_path(file_paths, metrics_to_normalize, "processed")
+        cached = self._read_entry(entry_path)
+        if cached is not None:
+            arrays, index = cached
+            return _arrays_to_tensors(arrays, index), index["extra"]
+
+        processed_data = data_process_pipeline(
+            raw_data=_read_json(file_paths),
+            metrics_to_normalize=metrics_to_normalize,
+            inplace=True,
+        )
+        if "extra" not in processed_data:
+            raise ValueError(
+                "The data could not be processed, please check the format of "
+                + "the json file(s). Nothing has been cached."
+            )
+        extra = processed_data.pop("extra")
+        tensors = dict_to_experiment_tensors(processed_data)
+
+        self._write_entry(entry_path, *_tensors_to_arrays(tensors, extra))
+        return tensors, extra
+
+    def load_processed_data(
+        self,
+        file_paths: Union[str, List[str]],
+        metrics_to_normalize: List[str],
+    ) -> Dict[str, Dict[str, Any]]:
+        """Loads processed data in the format returned by `data_process_pipeline`.
+
+        See `load_experiment_tensors` for the arguments.
+        """
+        tensors, extra = self.load_experiment_tensors(file_paths, metrics_to_normalize)
+        return experiment_tensors_to_dict(tensors, extra)
+
+    def load_matrices_for_rliable(
+        self,
+        file_paths: Union[str, List[str]],
+        environment_name: str,
+        metrics_to_normalize: List[str],
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Loads the matrices returned by `create_matrices_for_rliable`.
+
+        On a cache miss the processed data are loaded through the cache and the
+        matrices of the environment are computed and stored.
+
+        Args:
+            file_paths: path(s) to the JSON file(s), see `load_experiment_tensors`.
+            environment_name: Name of environment for which arrays should be
+                computed.
+            metrics_to_normalize: A list of metric names for metrics that should
+                be min/max normalised.
+
+        Returns:
+            metric_dictionary_return: dictionary to be used by rliable tools
+            final_metric_tensor_dictionary: dictionary to be used by rliable tools
+        """
+        (environment_name,) = lower_case_inputs(environment_name)
+        entry_path = self._entry_path(
+            file_paths, metrics_to_normalize, "matrices", environment_name
+        )
+        cached = self._read_entry(entry_path)
+        if cached is not None:
+            return _arrays_to_matrices(*cached)
+
+        processed_data = self.load_processed_data(file_paths, metrics_to_normalize)
+        matrices = create_matrices_for_rliable(
+            processed_data, environment_name, metrics_to_normalize
+        )
+
+        self._write_entry(entry_path, *_matrices_to_arrays(*matrices))
+        return matrices
+
+    @property
+    def size_bytes(self) -> int:
+        """Total size of the cached entries."""
+        return sum(os.path.getsize(path) for path in self._entry_paths())
+
+    def evict(self, max_size_bytes: Optional[int] = None) -> None:
+        """Removes the least recently used entries until the cache is small enough.
+
+        Args:
+            max_size_bytes: size to shrink the cache to. Defaults to the
+                `max_size_bytes` of the cache.
+        """
+        if max_size_bytes is None:
+            max_size_bytes = self.max_size_bytes
+        entries = []
+        for path in self._entry_paths():
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Removed concurrently by another process.
+                pass
+            total_size -= size
+
+    def clear(self) -> None:
+        """Removes all entries and memoised file hashes."""
+        self.evict(max_size_bytes=0)
+        try:
+            os.remove(os.path.join(self.cache_dir, _FILE_HASHES))
+        except FileNotFoundError:
+            pass
+
+    def _entry_paths(self) -> List[str]:
+        """Paths of all entries in the cache directory."""
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".npz")
+        ]
+
+    def _entry_path(
+        self,
+        file_paths: Union[str, List[str]],
+        metrics_to_normalize: List[str],
+        *keys: str,
+    ) -> str:
+        """Content-addressed path of the entry for the given inputs."""
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        description = {
+            "files": [self._file_hash(path) for path in file_paths],
+            "metrics_to_normalize": sorted(lower_case_inputs(metrics_to_normalize)),
+            "version": __version__,
+            # Entries written with an older tensor layout are not reused.
+            "format_version": BINARY_FORMAT_VERSION,
+            "keys": list(keys),
+        }
+        key = hashlib.sha256(
+            json.dumps(description, sort_keys=True).encode()
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _file_hash(self, file_path: str) -> str:
+        """Sha256 of the content of a file, memoised on its size and mtime."""
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        hashes_path = os.path.join(self.cache_dir, _FILE_HASHES)
+        try:
+            with open(hashes_path) as f:
+                file_hashes = json.load(f)
+        except (FileNotFoundError, ValueError):
+            file_hashes = {}
+
+        memo = file_hashes.get(file_path)
+        if memo is not None and memo[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return memo[2]
+
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as binary_file:
+            for chunk in iter(lambda: binary_file.read(1 << 20), b""):
+                sha.update(chunk)
+        file_hashes[file_path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+        _atomic_write(hashes_path, lambda f: f.write(json.dumps(file_hashes).encode()))
+        return sha.hexdigest()
+
+    def _read_entry(
+        self, entry_path: str
+    ) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+        """Reads a cache entry, returning None on a cache miss."""
+        try:
+            with np.load(entry_path) as npz:
+                arrays = {key: npz[key] for key in npz.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        # Mark the entry as recently used.
+        os.utime(entry_path)
+        index = json.loads(str(arrays.pop(_INDEX_KEY)))
+        return arrays, index
+
+    def _write_entry(
+        self, entry_path: str, arrays: Dict[str, np.ndarray], index: Dict[str, Any]
+    ) -> None:
+        """Stores a cache entry and evicts old entries if needed."""
+        arrays = {**arrays, _INDEX_KEY: np.array(json.dumps(index))}
+        _atomic_write(entry_path, lambda f: np.savez(f, **arrays))
+        self.evict()
+
+
+def _atomic_write(path: str, write_fn: Any) -> None:
+    """Writes a file through a temporary file so readers never see partial data."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_json(file_paths: Union[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """Reads one or more JSON files in the marl-eval format."""
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    json_data = []
+    for file_path in file_paths:
+        with open(file_path) as f:
+            json_data.append(json.load(f))
+    if len(json_data) == 1:
+        return json_data[0]
+    # Round trip through json to turn the merged defaultdicts into plain dicts.
+    return json.loads(json.dumps(_merge_json_data(json_data)))
+
+
+def _tensors_to_arrays(
+    tensors: Dict[str, ExperimentTensor], extra: Dict[str, Any]
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Flattens per environment tensors into named arrays and a json index."""
+    arrays: Dict[str, np.ndarray] = {}
+    environments = []
+    for e, (env, tensor) in enumerate(tensors.items()):
+        arrays[f"step_positions_{e}"] = tensor.step_positions
+        for m, metric in enumerate(tensor.metric_names):
+            arrays[f"values_{e}_{m}"] = tensor.metrics[metric]
+            arrays[f"lengths_{e}_{m}"] = tensor.lengths[metric]
+        environments.append(
+            {
+                "name": env,
+                "tasks": tensor.tasks,
+                "algorithms": tensor.algorithms,
+                "runs": tensor.runs,
+                "steps": tensor.steps,
+                "metrics": tensor.metric_names,
+            }
+        )
+    return arrays, {"environments": environments, "extra": extra}
+
+
+def _arrays_to_tensors(
+    arrays: Dict[str, np.ndarray], index: Dict[str, Any]
+) -> Dict[str, ExperimentTensor]:
+    """Inverse of `_tensors_to_arrays`."""
+    tensors = {}
+    for e, env in enumerate(index["environments"]):
+        metrics = {
+            metric: arrays[f"values_{e}_{m}"] for m, metric in enumerate(env["metrics"])
+        }
+        lengths = {
+            metric: arrays[f"lengths_{e}_{m}"]
+            for m, metric in enumerate(env["metrics"])
+        }
+        tensors[env["name"]] = ExperimentTensor(
+            env["tasks"],
+            env["algorithms"],
+            env["runs"],
+            env["steps"],
+            metrics,
+            lengths,
+            arrays[f"step_positions_{e}"],
+        )
+    return tensors
+
+
+def _matrices_to_arrays(
+    metric_dictionary: Dict[str, Dict[str, Any]],
+    metric_tensor_dictionary: Dict[str, Dict[str, Any]],
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Flattens the rliable matrices into named arrays and a json index."""
+    arrays: Dict[str, np.ndarray] = {}
+    metrics = {
+        metric: list(algorithms.keys())
+        for metric, algorithms in metric_dictionary.items()
+    }
+    for m, (metric, algorithms) in enumerate(metrics.items()):
+        for a, algorithm in enumerate(algorithms):
+            arrays[f"absolute_{m}_{a}"] = metric_dictionary[metric][algorithm]
+            arrays[f"sample_efficiency_{m}_{a}"] = metric_tensor_dictionary[metric][
+                algorithm
+            ]
+    return arrays, {"metrics": metrics, "extra": metric_tensor_dictionary["extra"]}
+
+
+def _arrays_to_matrices(
+    arrays: Dict[str, np.ndarray], index: Dict[str, Any]
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Inverse of `_matrices_to_arrays`."""
+    metric_dictionary: Dict[str, Dict[str, Any]] = {}
+    metric_tensor_dictionary: Dict[str, Dict[str, Any]] = {}
+    for m, (metric, algorithms) in enumerate(index["metrics"].items()):
+        metric_dictionary[metric] = {}
+        metric_tensor_dictionary[metric] = {}
+        for a, algorithm in enumerate(algorithms):
+            metric_dictionary[metric][algorithm] = arrays[f"absolute_{m}_{a}"]
+            metric_tensor_dictionary[metric][algorithm] = arrays[
+                f"sample_efficiency_{m}_{a}"
+            ]
+    metric_tensor_dictionary["extra"] = index["extra"]
+    return metric_dictionary, metric_tensor_dictionary
@@ -14,11 +14,18 @@
 # limitations under the License.
 
 import copy
-from typing import Any, Dict, List, Tuple, Union
+import functools
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 from colorama import Fore, Style
 
+from marl_eval.json_tools.json_stream import iter_json_runs
+from marl_eval.utils import metrics_utils
+from marl_eval.utils.bootstrap_utils import BootstrapContext
+
 """Tools for processing MARL experiment data."""
 
 
@@ -72,9 +79,24 @@ def check_comma_in_algo_names(
 
 
 def lower_case_dictionary_keys(
-    dictionary: Dict[str, Dict[str, Any]]
+    dictionary: Dict[str, Dict[str, Any]], inplace: bool = False
 ) -> Dict[str, Dict[str, Any]]:
-    """Recursively make all keys in a nested dictionary lower case."""
+    """Recursively make all keys in a nested dictionary lower case.
+
+    Args:
+        dictionary: nested dictionary whose keys should be lower cased.
+        inplace: whether to rename the keys of the given dictionaries in place
+            instead of building a new nested dictionary. Key order is kept.
+    """
+
+    if inplace:
+        items = list(dictionary.items())
+        dictionary.clear()
+        for key, value in items:
+            if isinstance(value, dict):
+                lower_case_dictionary_keys(value, inplace=True)
+            dictionary[key.lower()] = value
+        return dictionary
 
     new_dict = {}
     for key, value in dictionary.items():
@@ -85,71 +107,561 @@ def lower_case_dictionary_keys(
     return new_dict
 
 
+def _metric_key(metric_name: str, metrics_to_normalize: List[str]) -> str:
+    """Key of the processed (and possibly normalised) mean of a metric."""
+    if metric_name in metrics_to_normalize:
+        return f"mean_norm_{metric_name}"
+    return f"mean_{metric_name}"
+
+
+def _confidence_intervals(
+    metric_values: np.ndarray,
+    ci_method: str,
+    bootstrap_context: Optional[BootstrapContext] = None,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Compute 95% CIs of the mean over runs of (algorithm, task, run, ...) values.
+
+    Args:
+        metric_values: (algorithm, task, run, ...) array of values.
+        ci_method: "normal", "t" or "bootstrap".
+        bootstrap_context: Resamples and options of the bootstrap. If None, the
+            bootstrap is not seeded.
+
+    Returns:
+        cis: Half widths of the CIs, with the run axis averaged out.
+        bounds: (2, algorithm, task, ...) array of the lower and upper bounds of
+            the bootstrap CIs, or None for the symmetric CIs.
+    """
+    num_runs = metric_values.shape[2]
+    if ci_method in ["normal", "t"]:
+        # Imported here to keep scipy out of the import of the data processing.
+        from scipy import stats
+
+        if num_runs == 1:
+            # The sample standard deviation of a single run is undefined.
+            print(
+                f"{Fore.YELLOW}{Style.BRIGHT}A single run has no spread, the "
+                + f"{ci_method} CIs have zero width.{Style.RESET_ALL}"
+            )
+            return np.zeros(np.delete(metric_values.shape, 2)), None
+        if ci_method == "normal":
+            critical_value = stats.norm.ppf(0.975)
+        else:
+            critical_value = stats.t.ppf(0.975, num_runs - 1)
+        standard_error = np.std(metric_values, axis=2, ddof=1) / np.sqrt(num_runs)
+        return critical_value * standard_error, None
+
+    if ci_method == "bootstrap":
+        if bootstrap_context is None:
+            bootstrap_context = BootstrapContext(share_resamples=False)
+        # Every algorithm and task is a task of the stratified bootstrap, so
+        # its runs are resampled on their own, with whole curves at once.
+        num_algorithms, num_tasks = metric_values.shape[:2]
+        scores = np.moveaxis(
+            metric_values.reshape(num_algorithms * num_tasks, num_runs, -1), 0, 1
+        )
+        _, interval_estimates = bootstrap_context.interval_estimates(
+            {"scores": scores}, metrics_utils.aggregate_run_means, reps=2000
+        )
+        bounds = interval_estimates["scores"].reshape(
+            2, *metric_values.shape[:2], *metric_values.shape[3:]
+        )
+        return (bounds[1] - bounds[0]) / 2, bounds
+
+    raise ValueError(
+        f"Unknown CI method {ci_method}, expected 'normal', 't' or 'bootstrap'."
+    )
+
+
+def _aggregate_tasks(
+    data_env: Dict[str, Dict[str, Any]],
+    extra: Dict[str, Any],
+    metric_keys: Dict[str, str],
+    ci_method: str = "normal",
+    bootstrap_context: Optional[BootstrapContext] = None,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Compute the mean and 95% CI over runs of every task, algorithm and metric.
+
+    Every task and algorithm is aggregated over its own runs, so run labels
+    and numbers of runs may differ between tasks and algorithms. The values of
+    all metrics are gathered in a single traversal of the environment data,
+    after which the means and CIs of all tasks, algorithms and steps with the
+    same number of runs and steps are reduced over the run axis in a single
+    vectorized call.
+
+    Args:
+        data_env: Processed data of the environment.
+        extra: Extra information of the environment, added to every task.
+        metric_keys: Mapping from the metric names used in the output to the
+            keys of the metrics in the processed data.
+        ci_method: Method used for the CIs, see
+            `get_and_aggregate_data_single_task`.
+        bootstrap_context: Resamples and options of the bootstrap CIs.
+
+    Returns:
+        Dictionary mapping every metric name and task to the output of
+        `get_and_aggregate_data_single_task` for that metric and task, with
+        the means and CIs held as arrays.
+    """
+    # Every task and algorithm is aggregated over its own runs, whatever their
+    # labels, and all pairs with the same number of runs and the same steps are
+    # reduced together.
+    groups: Dict[Tuple[int, Tuple[str, ...]], List[Tuple[str, str, List[str]]]] = {}
+    for task, task_data in data_env.items():
+        for algorithm, algorithm_data in task_data.items():
+            runs = list(algorithm_data.keys())
+            # Remove absolute metric from steps.
+            steps = tuple(
+                step
+                for step in algorithm_data[runs[0]]
+                if "absolute" not in step.lower()
+            )
+            groups.setdefault((len(runs), steps), []).append((task, algorithm, runs))
+
+    aggregated_data: Dict[str, Dict[str, Dict[str, Any]]] = {
+        metric_name: {
+            task: dict.fromkeys(task_data) for task, task_data in data_env.items()
+        }
+        for metric_name in metric_keys
+    }
+    for (_, steps), cells in groups.items():
+        # (1, cell, run, step, metric) values of all metrics.
+        metric_values = _gather_cell_values(
+            data_env, cells, list(steps), list(metric_keys.values())
+        )[np.newaxis]
+        means = np.mean(metric_values, axis=2)
+        cis, bounds = _confidence_intervals(metric_values, ci_method, bootstrap_context)
+        for c, (task, algorithm, _) in enumerate(cells):
+            for m, metric_name in enumerate(metric_keys):
+                algorithm_data = {"mean": means[0, c, :, m], "ci": cis[0, c, :, m]}
+                if bounds is not None:
+                    algorithm_data["lower"] = bounds[0, 0, c, :, m]
+                    algorithm_data["upper"] = bounds[1, 0, c, :, m]
+                aggregated_data[metric_name][task][algorithm] = algorithm_data
+
+    for metric_data in aggregated_data.values():
+        for task_data in metric_data.values():
+            task_data["extra"] = dict(extra)
+    return aggregated_data
+
+
 def get_and_aggregate_data_single_task(
     processed_data: Dict[str, Any],
     metric_name: str,
     metrics_to_normalize: List[str],
     task_name: str,
     environment_name: str,
+    ci_method: str = "normal",
+    bootstrap_context: Optional[BootstrapContext] = None,
 ) -> Dict[str, Any]:
     """Compute the mean and 95% CI over all independent \
         experiment runs at each evaluation step for a given \
         environment and task.
 
+    The CIs of all steps are computed at once with one of the following
+    methods:
+        - "normal": normal approximation, 1.96 standard errors of the mean.
+        - "t": Student's t interval, better suited to few runs.
+        - "bootstrap": percentile interval of a bootstrap of the runs, whose
+            lower and upper bounds are also returned under "lower" and "upper"
+            since they need not be symmetric.
+    The standard errors use the sample standard deviation and the actual
+    number of runs. With a single run, the "normal" and "t" CIs have zero
+    width and a warning is printed.
+
+    To aggregate every task of an environment, use
+    `get_and_aggregate_data_all_tasks` instead of calling this function once
+    per task.
+
     Args:
         processed_data: Dictionary containing processed data.
         metric_name: Name of metric to aggregate.
         metrics_to_normalize: List of metrics to normalize.
         task_name: Name of task to aggregate.
         environment_name: Name of environment to aggregate.
+        ci_method: Method used for the CIs: "normal", "t" or "bootstrap".
+        bootstrap_context: Resamples and options of the bootstrap CIs.
     """
 
     metrics_to_normalize, metric_name, task_name, environment_name = lower_case_inputs(
         metrics_to_normalize, metric_name, task_name, environment_name
     )
 
-    if metric_name in metrics_to_normalize:
-        metric_to_find = f"mean_norm_{metric_name}"
+    task_data = _aggregate_tasks(
+        {task_name: processed_data[environment_name][task_name]},
+        _environment_extra_info(processed_data["extra"], environment_name),
+        {metric_name: _metric_key(metric_name, metrics_to_normalize)},
+        ci_method,
+        bootstrap_context,
+    )[metric_name][task_name]
+
+    mean_and_ci: Dict[str, Any] = {
+        algorithm: {key: list(values) for key, values in algorithm_data.items()}
+        for algorithm, algorithm_data in task_data.items()
+        if algorithm != "extra"
+    }
+    mean_and_ci["extra"] = task_data["extra"]
+
+    return mean_and_ci
+
+
+def get_and_aggregate_data_all_tasks(
+    processed_data: Dict[str, Any],
+    metric_names: List[str],
+    metrics_to_normalize: List[str],
+    environment_name: str,
+    ci_method: str = "normal",
+    bootstrap_context: Optional[BootstrapContext] = None,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Compute the mean and 95% CI over all independent experiment runs at each \
+        evaluation step for every task of an environment and several metrics.
+
+    The environment is traversed once for all tasks and metrics, instead of
+    once per call of `get_and_aggregate_data_single_task`.
+
+    Args:
+        processed_data: Dictionary containing processed data.
+        metric_names: Names of the metrics to aggregate.
+        metrics_to_normalize: List of metrics to normalize.
+        environment_name: Name of environment to aggregate.
+        ci_method: Method used for the CIs: "normal", "t" or "bootstrap". See
+            `get_and_aggregate_data_single_task`.
+        bootstrap_context: Resamples and options of the bootstrap CIs.
+
+    Returns:
+        Dictionary mapping every metric name and task name to a dictionary
+        holding, for every algorithm, the arrays of the "mean" and "ci" at each
+        evaluation step (and the "lower" and "upper" bounds of bootstrap CIs),
+        as well as the "extra" information of the environment.
+    """
+    metric_names, metrics_to_normalize, environment_name = lower_case_inputs(
+        metric_names, metrics_to_normalize, environment_name
+    )
+
+    return _aggregate_tasks(
+        processed_data[environment_name],
+        _environment_extra_info(processed_data["extra"], environment_name),
+        {
+            metric_name: _metric_key(metric_name, metrics_to_normalize)
+            for metric_name in metric_names
+        },
+        ci_method,
+        bootstrap_context,
+    )
+
+
+def _flatten_metric_values(
+    metric_values: List[Any],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Concatenate the values of a metric over many steps into a single array.
+
+    Args:
+        metric_values: list containing, for every step, either a list of
+            per episode values or a single scalar value.
+
+    Returns:
+        values: flat float64 array holding all the values.
+        offsets: position in `values` at which the data of each step starts.
+        counts: number of values of each step.
+        is_scalar: whether the data of each step is a scalar instead of a list.
+    """
+    is_scalar = np.fromiter(
+        (not isinstance(value, list) for value in metric_values),
+        dtype=bool,
+        count=len(metric_values),
+    )
+    counts = np.fromiter(
+        (len(value) if isinstance(value, list) else 1 for value in metric_values),
+        dtype=np.int64,
+        count=len(metric_values),
+    )
+    offsets = np.zeros(len(metric_values), dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)[:-1]
+    values = np.fromiter(
+        itertools.chain.from_iterable(
+            value if isinstance(value, list) else (value,) for value in metric_values
+        ),
+        dtype=np.float64,
+        count=int(counts.sum()),
+    )
+    return values, offsets, counts, is_scalar
+
+
+def _grouped_mean(
+    values: np.ndarray, offsets: np.ndarray, counts: np.ndarray
+) -> np.ndarray:
+    """Compute the mean of consecutive slices of a flat array.
+
+    Slices of equal length are gathered into the rows of one 2D array and
+    reduced together. Each row is summed in the same way that `np.mean` sums a
+    1D array, which keeps the result identical to calling `np.mean` per slice.
+    """
+    means = np.empty(len(offsets), dtype=np.float64)
+    for length in np.unique(counts):
+        selected = counts == length
+        rows = values[offsets[selected, np.newaxis] + np.arange(length)]
+        means[selected] = np.add.reduce(rows, axis=1) / length
+    return means
+
+
+def _split_flat_values(
+    values: np.ndarray, offsets: np.ndarray, counts: np.ndarray, is_scalar: np.ndarray
+) -> List[Any]:
+    """Split a flat array back into per step lists or scalars.
+
+    This is the inverse of `_flatten_metric_values`.
+    """
+    values_list = values.tolist()
+    return [
+        values_list[offset] if scalar else values_list[offset : offset + count]
+        for offset, count, scalar in zip(
+            offsets.tolist(), counts.tolist(), is_scalar.tolist()
+        )
+    ]
+
+
+def _get_metric_min_max(
+    raw_steps: List[Dict[str, Any]],
+    metrics_to_normalize: List[str],
+    metric_min_max_info: Optional[Dict[str, Tuple[Any, Any]]] = None,
+) -> Dict[str, Tuple[Any, Any]]:
+    """Find the global min and max of each metric to normalise over many steps.
+
+    Args:
+        raw_steps: list of raw metric dictionaries, one per step.
+        metrics_to_normalize: list of metric names that should be normalised.
+        metric_min_max_info: optional (global min, global max) of every metric
+            found so far, which is widened by the values of `raw_steps`.
+
+    Returns:
+        Dictionary mapping every metric to normalise to its (min, max).
+    """
+    metric_min_max_info = dict(metric_min_max_info or {})
+    for metric in metrics_to_normalize:
+        values, _, _, _ = _flatten_metric_values(
+            [step_metrics[metric] for step_metrics in raw_steps]
+        )
+        metric_min, metric_max = np.min(values), np.max(values)
+        if metric in metric_min_max_info:
+            global_min, global_max = metric_min_max_info[metric]
+            metric_min = min(metric_min, global_min)
+            metric_max = max(metric_max, global_max)
+        metric_min_max_info[metric] = (metric_min, metric_max)
+    return metric_min_max_info
+
+
+def _process_steps(
+    raw_steps: List[Dict[str, Any]],
+    processed_steps: List[Dict[str, Any]],
+    metrics_to_normalize: List[str],
+    summary_only: bool = False,
+    metric_min_max_info: Optional[Dict[str, Tuple[Any, Any]]] = None,
+) -> None:
+    """Compute the means and min/max normalisation of all given steps at once.
+
+    All values of a metric are concatenated into one array such that the global
+    min/max is a single reduction and the normalisation a single broadcast. The
+    global min/max is taken over every step passed in, so all steps should
+    belong to the same task.
+
+    Args:
+        raw_steps: list of raw metric dictionaries, one per step.
+        processed_steps: list of dictionaries, aligned with `raw_steps`, to which
+            the `mean_*`, `norm_*` and `mean_norm_*` values are written. These
+            may be the same dictionaries as `raw_steps`.
+        metrics_to_normalize: list of metric names that should be normalised.
+        summary_only: whether to only write the `mean_*` and `mean_norm_*`
+            values and drop all per episode lists from `processed_steps`.
+        metric_min_max_info: optional precomputed (global min, global max) of
+            every metric to normalise. If None, these are computed from the
+            given steps.
+    """
+    metric_names: Dict[str, None] = {}
+    for step_metrics in raw_steps:
+        metric_names.update(dict.fromkeys(step_metrics))
+
+    means: Dict[str, Iterator] = {}
+    norms: Dict[str, Iterator] = {}
+    norm_means: Dict[str, Iterator] = {}
+    for metric in metric_names:
+        if "step_count" in metric:
+            continue
+        if metric in metrics_to_normalize:
+            # Every step must contain the metrics that should be normalised.
+            metric_values = [step_metrics[metric] for step_metrics in raw_steps]
+        else:
+            metric_values = [
+                step_metrics[metric]
+                for step_metrics in raw_steps
+                if metric in step_metrics
+            ]
+        values, offsets, counts, is_scalar = _flatten_metric_values(metric_values)
+        means[metric] = iter(_grouped_mean(values, offsets, counts))
+
+        if metric in metrics_to_normalize:
+            if metric_min_max_info is not None:
+                metric_global_min, metric_global_max = metric_min_max_info[metric]
+            else:
+                # Find the global minimum and global maximum per task.
+                metric_global_min = np.min(values)
+                metric_global_max = np.max(values)
+            normed_values = (values - metric_global_min) / (
+                metric_global_max - metric_global_min + 1e-6
+            )
+            norm_means[metric] = iter(_grouped_mean(normed_values, offsets, counts))
+            if not summary_only:
+                norms[metric] = iter(
+                    _split_flat_values(normed_values, offsets, counts, is_scalar)
+                )
+
+    # Write the results back following the key order of each step. The keys are
+    # copied first since the raw and processed dictionaries may be the same.
+    for step_metrics, processed_metrics in zip(raw_steps, processed_steps):
+        for metric in list(step_metrics.keys()):
+            if "step_count" in metric:
+                continue
+            is_episode_list = isinstance(step_metrics[metric], list)
+            processed_metrics[f"mean_{metric}"] = next(means[metric])
+            if metric in metrics_to_normalize:
+                if not summary_only:
+                    processed_metrics[f"norm_{metric}"] = next(norms[metric])
+                processed_metrics[f"mean_norm_{metric}"] = next(norm_means[metric])
+            if summary_only and is_episode_list:
+                processed_metrics.pop(metric, None)
+
+
+def _process_task(
+    algorithms: Dict[str, Dict[str, Any]],
+    metrics_to_normalize: List[str],
+    inplace: bool = False,
+    summary_only: bool = False,
+    metric_min_max_info: Optional[Dict[str, Tuple[Any, Any]]] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], List[Any]]:
+    """Process the data of all algorithms and runs of a single task.
+
+    Tasks are independent of each other since the global min/max used for
+    normalisation is computed per task.
+
+    Args:
+        algorithms: lower cased algorithm -> run -> step -> metric dictionary.
+        metrics_to_normalize: list of metric names that should be normalised.
+        inplace: whether to annotate `algorithms` in place.
+        summary_only: whether to only keep the `mean_*` and `mean_norm_*` values.
+        metric_min_max_info: optional precomputed (global min, global max) of
+            every metric to normalise.
+
+    Returns:
+        processed_task: processed algorithm -> run -> step -> metric dictionary.
+        eval_intervals: step count differences between consecutive steps
+            of every run.
+    """
+    if inplace:
+        processed_task = algorithms
+    elif summary_only:
+        # Only copy the scalar entries since the lists will not be kept.
+        processed_task = {
+            algorithm: {
+                run: {
+                    step: {
+                        metric: value
+                        for metric, value in metrics.items()
+                        if not isinstance(value, list)
+                    }
+                    for step, metrics in steps.items()
+                }
+                for run, steps in runs.items()
+            }
+            for algorithm, runs in algorithms.items()
+        }
     else:
-        metric_to_find = f"mean_{metric_name}"
+        processed_task = copy.deepcopy(algorithms)
+
+    raw_steps = []
+    processed_steps = []
+    eval_intervals = []
+    for algorithm, runs in algorithms.items():
+        for run, steps in runs.items():
+            step_count = 0
+            for step, metrics in steps.items():
+                raw_steps.append(metrics)
+                processed_steps.append(processed_task[algorithm][run][step])
+                for metric in metrics.keys():
+                    if "step_count" in metric:
+                        eval_intervals.append(metrics[metric] - step_count)
+                        step_count = metrics[metric]
+
+    _process_steps(
+        raw_steps,
+        processed_steps,
+        metrics_to_normalize,
+        summary_only,
+        metric_min_max_info,
+    )
 
-    # Get the data for the given metric and environment
-    task_data = processed_data[environment_name][task_name]
+    return processed_task, eval_intervals
 
-    # Get the algorithm names, number of runs and total steps
-    algorithms = list(task_data.keys())
-    runs = list(task_data[algorithms[0]].keys())
-    steps = list(task_data[algorithms[0]][runs[0]].keys())
 
-    # Remove absolute metric from steps.
-    steps = [step for step in steps if "absolute" not in step.lower()]
+def _get_extra_info(
+    processed_data: Dict[str, Dict[str, Any]], eval_interval: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Collect the extra information about an experiment from processed data.
 
-    # Create a dictionary to store the mean and 95% CI for each algorithm
-    mean_and_ci: Dict = {algorithm: {"mean": [], "ci": []} for algorithm in algorithms}
+    Args:
+        processed_data: processed environment -> task -> algorithm -> run ->
+            step -> metric dictionary without an `extra` entry.
+        eval_interval: mean evaluation interval of every environment.
 
-    for step in steps:
-        # Loop over each algorithm
-        for algorithm in algorithms:
-            # Get the data for the given algorithm
-            algorithm_data = task_data[algorithm]
-            # Compute the mean and 95% CI for the given algorithm over all seeds
-            # at a given step
-            run_total = []
-            for run in runs:
-                run_total.append(algorithm_data[run][step][metric_to_find])
-
-            mean_and_ci[algorithm]["mean"].append(np.mean(run_total))
-            # Using central limit theorem to compute 95% CI
-            mean_and_ci[algorithm]["ci"].append(1.96 * np.std(run_total) / np.sqrt(10))
-
-    mean_and_ci["extra"] = processed_data["extra"]
+    Returns:
+        Dictionary holding the environment, algorithm and metric names as well
+        as the number of runs, steps and the evaluation interval.
+    """
+    environment_list: Dict[str, Any] = {}
+    algorithm_list = []
+    metric_list: Dict[str, Any] = {}
+    number_of_runs = 0
+    number_of_steps = 0
+
+    for env, tasks in processed_data.items():
+        environment_list[env] = list(tasks.keys())
+        metric_list[env] = []
+        for algorithms in tasks.values():
+            for algorithm, runs in algorithms.items():
+                if algorithm not in algorithm_list:
+                    algorithm_list.append(algorithm)
+                if number_of_runs == 0:
+                    number_of_runs = len(runs.keys())
+                for steps in runs.values():
+                    if number_of_steps == 0:
+                        number_of_steps = len(steps.keys()) - 1
+                    if metric_list[env] == []:
+                        # Union of the metric names of all steps of the first run,
+                        # since the absolute metrics step may hold fewer metrics
+                        # than the training steps.
+                        metric_list[env] = list(
+                            dict.fromkeys(
+                                metric
+                                for metrics in steps.values()
+                                for metric in metrics
+                                if metric != "step_count"
+                            )
+                        )
 
-    return mean_and_ci
+    return {
+        "environment_list": environment_list,
+        "number_of_steps": number_of_steps,
+        "number_of_runs": number_of_runs,
+        "algorithm_list": algorithm_list,
+        "metric_list": metric_list,
+        "evaluation_interval": eval_interval,
+    }
 
 
-def data_process_pipeline(  # noqa: C901
+def data_process_pipeline(
     raw_data: Dict[str, Dict[str, Any]],
     metrics_to_normalize: List[str],
+    inplace: bool = False,
+    summary_only: bool = False,
+    workers: int = 1,
 ) -> Dict[str, Dict[str, Any]]:
     """Function for processing raw input experiment data.
 
@@ -159,6 +671,17 @@ def data_process_pipeline(  # noqa: C901
         metrics_to_normalize: A list of metric names for metrics that should
             be min/max normalised. These metric names should match the names as
             given in the raw dataset.
+        inplace: Whether to lower case and annotate `raw_data` in place instead
+            of working on copies of it. This avoids holding several copies of
+            large datasets in memory, but `raw_data` should not be used after
+            the call.
+        summary_only: Whether to only keep the `mean_*` and `mean_norm_*` values
+            in the processed data. The raw and normalised per episode lists are
+            never materialised in the output, which greatly reduces its size.
+            Scalar entries such as `step_count` are kept.
+        workers: Number of processes used to process the (environment, task)
+            blocks of the data in parallel. The output is identical to the
+            serial output.
 
     Returns:
         processed_data: Dictionary containing processed experiment data where relevant
@@ -169,128 +692,47 @@ def data_process_pipeline(  # noqa: C901
     metrics_to_normalize = lower_case_inputs(metrics_to_normalize)
 
     try:
-
-        def _compare_values(
-            metric_min_max_info: Dict[str, Any], metric_values: list, metric: str
-        ) -> None:
-            """Compare list of metric values for a metric to the current global \
-                min and max values for that metric.
-
-            This is done in order to use the global min and max values downstream
-            for normalising metrics.
-
-            Args:
-                metric_min_max_info: a dictionary containing global min and max
-                    values for all metrics.
-                metric_values: a list containing metric data.
-                metric: the name of the current metric for which global min and
-                    max data is being found.
-            """
-
-            min_per_step = np.min(metric_values)
-            max_per_step = np.max(metric_values)
-            if metric in list(metric_min_max_info.keys()):
-                if metric_min_max_info[metric]["global_min"] > min_per_step:
-                    metric_min_max_info[metric]["global_min"] = min_per_step
-                elif metric_min_max_info[metric]["global_max"] < max_per_step:
-                    metric_min_max_info[metric]["global_max"] = max_per_step
-            else:
-                metric_min_max_info[metric] = {
-                    "global_min": min_per_step,
-                    "global_max": max_per_step,
-                }
-
         # Make all keys lower case
-        raw_data = lower_case_dictionary_keys(raw_data)
-        processed_data = copy.deepcopy(raw_data)
-
-        metric_min_max_info: Dict[str, Any] = {}
-        # Extra logs
-        environment_list: Dict[str, Any] = {}
-        algorithm_list = []
-        metric_list: Dict[str, Any] = {}
-        number_of_runs = 0
-        number_of_steps = 0
+        raw_data = lower_case_dictionary_keys(raw_data, inplace=inplace)
+        processed_data: Dict[str, Dict[str, Any]] = raw_data if inplace else {}
+
+        blocks = [(env, task) for env, tasks in raw_data.items() for task in tasks]
+        if workers > 1:
+            # Workers receive their own copy of the data which they may modify.
+            process_task = functools.partial(
+                _process_task,
+                metrics_to_normalize=metrics_to_normalize,
+                inplace=True,
+                summary_only=summary_only,
+            )
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(
+                        process_task, [raw_data[env][task] for env, task in blocks]
+                    )
+                )
+        else:
+            results = [
+                _process_task(
+                    raw_data[env][task], metrics_to_normalize, inplace, summary_only
+                )
+                for env, task in blocks
+            ]
+
         # Get the mean evaluation interval used in the experiment
-        eval_interval: Dict[Any, Any] = {}
-
-        for env, tasks in raw_data.items():
-            environment_list[env] = []
-            metric_list[env] = []
-            eval_interval_per_env: list = []
-            for task, algorithms in tasks.items():
-                environment_list[env].append(task)
-                for algorithm, runs in algorithms.items():
-                    if algorithm not in algorithm_list:
-                        algorithm_list.append(algorithm)
-                    if number_of_runs == 0:
-                        number_of_runs = len(runs.keys())
-                    for run, steps in runs.items():
-                        if number_of_steps == 0:
-                            number_of_steps = len(steps.keys()) - 1
-                        for step, metrics in steps.items():
-                            for metric in metrics_to_normalize:
-                                # Find the global minimum and global maximum per task
-                                _compare_values(
-                                    metric_min_max_info, metrics[metric], metric
-                                )
-                for algorithm, runs in algorithms.items():
-                    for run, steps in runs.items():
-                        step_count = 0
-                        for step, metrics in steps.items():
-                            for metric in metrics.keys():
-                                if "step_count" not in metric:
-                                    # Mean
-                                    mean = np.mean(metrics[metric])
-                                    processed_data[env][task][algorithm][run][step][
-                                        f"mean_{metric}"
-                                    ] = mean
-                                    if metric in metrics_to_normalize:
-                                        # Normalization
-                                        metric_array = np.array(metrics[metric])
-                                        metric_global_min = metric_min_max_info[metric][
-                                            "global_min"
-                                        ]
-                                        metric_global_max = metric_min_max_info[metric][
-                                            "global_max"
-                                        ]
-                                        normed_metric_array = (
-                                            metric_array - metric_global_min
-                                        ) / (
-                                            metric_global_max - metric_global_min + 1e-6
-                                        )
-                                        processed_data[env][task][algorithm][run][step][
-                                            f"norm_{metric}"
-                                        ] = normed_metric_array.tolist()
-                                        processed_data[env][task][algorithm][run][step][
-                                            f"mean_norm_{metric}"
-                                        ] = np.mean(normed_metric_array)
-                                else:
-                                    eval_interval_per_env.append(
-                                        metrics[metric] - step_count
-                                    )
-                                    step_count = metrics[metric]
-                            if metric_list[env] == []:
-                                metric_list[env] = list(
-                                    processed_data[env][task][algorithm][run][
-                                        step
-                                    ].keys()
-                                )
-                                if "step_count" in metric_list[env]:
-                                    metric_list[env].remove("step_count")
-
-                metric_min_max_info = {}
-            eval_interval[env] = round(np.mean(eval_interval_per_env))
-
-        processed_data["extra"] = {  # type: ignore
-            "environment_list": environment_list,
-            "number_of_steps": number_of_steps,
-            "number_of_runs": number_of_runs,
-            "algorithm_list": algorithm_list,
-            "metric_list": metric_list,
-            "evaluation_interval": eval_interval,
+        eval_interval_per_env: Dict[str, list] = {}
+        for (env, task), (processed_task, eval_intervals) in zip(blocks, results):
+            processed_data.setdefault(env, {})[task] = processed_task
+            eval_interval_per_env.setdefault(env, []).extend(eval_intervals)
+        eval_interval = {
+            env: round(np.mean(eval_intervals))
+            for env, eval_intervals in eval_interval_per_env.items()
         }
 
+        extra = _get_extra_info(processed_data, eval_interval)
+        processed_data["extra"] = extra
+        algorithm_list = extra["algorithm_list"]
+
         # Check that algorithm names do not contain commas
         algo_names_valid, invalid_algo_names = check_comma_in_algo_names(algorithm_list)
         if not algo_names_valid:
@@ -310,7 +752,269 @@ def data_process_pipeline(  # noqa: C901
         return raw_data
 
 
-def create_matrices_for_rliable(  # noqa: C901
+def stream_data_process_pipeline(
+    file_path: str,
+    metrics_to_normalize: List[str],
+    summary_only: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """Process raw experiment data from a JSON file one run at a time.
+
+    The file is read twice without ever being fully loaded. The first pass finds
+    the global min and max of every metric to normalise per task and the second
+    pass processes each run as soon as it has been read, while aggregating the
+    `extra` information. The output matches that of `data_process_pipeline` on
+    the loaded file. Combined with `summary_only`, peak memory is bounded by a
+    single run plus the processed summary rather than by the size of the file.
+
+    Args:
+        file_path: Path to a JSON file containing raw experiment data.
+        metrics_to_normalize: A list of metric names for metrics that should
+            be min/max normalised.
+        summary_only: Whether to only keep the `mean_*` and `mean_norm_*` values
+            in the processed data. See `data_process_pipeline`.
+
+    Returns:
+        processed_data: Dictionary containing processed experiment data.
+    """
+
+    metrics_to_normalize = lower_case_inputs(metrics_to_normalize)
+
+    try:
+        # First pass to find the global minimum and maximum per task.
+        task_min_max_info: Dict[Tuple[str, str], Dict[str, Tuple[Any, Any]]] = {}
+        for env, task, _, _, steps in iter_json_runs(file_path):
+            steps = lower_case_dictionary_keys(steps, inplace=True)
+            block = (env.lower(), task.lower())
+            task_min_max_info[block] = _get_metric_min_max(
+                list(steps.values()),
+                metrics_to_normalize,
+                task_min_max_info.get(block),
+            )
+
+        # Second pass to process each run.
+        processed_data: Dict[str, Dict[str, Any]] = {}
+        # Running sums of the evaluation intervals per environment.
+        eval_interval_totals: Dict[str, List[int]] = {}
+
+        for env, task, algorithm, run, steps in iter_json_runs(file_path):
+            env, task, algorithm, run = lower_case_inputs(env, task, algorithm, run)
+            steps = lower_case_dictionary_keys(steps, inplace=True)
+            processed_run, eval_intervals = _process_task(
+                {algorithm: {run: steps}},
+                metrics_to_normalize,
+                inplace=True,
+                summary_only=summary_only,
+                metric_min_max_info=task_min_max_info[(env, task)],
+            )
+            processed_data.setdefault(env, {}).setdefault(task, {}).setdefault(
+                algorithm, {}
+            ).update(processed_run[algorithm])
+
+            totals = eval_interval_totals.setdefault(env, [0, 0])
+            totals[0] += sum(eval_intervals)
+            totals[1] += len(eval_intervals)
+
+        extra = _get_extra_info(
+            processed_data,
+            {
+                env: round(total / count)
+                for env, (total, count) in eval_interval_totals.items()
+            },
+        )
+        processed_data["extra"] = extra
+        algorithm_list = extra["algorithm_list"]
+
+        # Check that algorithm names do not contain commas
+        algo_names_valid, invalid_algo_names = check_comma_in_algo_names(algorithm_list)
+        if not algo_names_valid:
+            raise ValueError(
+                "Algorithm names must not contain commas."
+                + f" Please update the following invalid names: {invalid_algo_names}\n"
+            )
+
+        return processed_data
+
+    except Exception as e:
+        print(
+            f"\n{Fore.RED}Unexpected error: {e}. There is an issue related to the "
+            + "format of the json file!"
+        )
+        print(
+            "We recommend using the DiagnoseData class from "
+            + "`marl_eval/utils/diagnose_data_errors.py` for further "
+            + f"investigation.\n{Style.RESET_ALL}"
+        )
+        raise
+
+
+def _gather_metric_values(
+    data_env: Dict[str, Dict[str, Any]],
+    tasks: List[str],
+    algorithms: List[str],
+    runs: List[str],
+    steps: List[str],
+    metrics: List[str],
+) -> np.ndarray:
+    """Collect metric values of an environment into a dense array.
+
+    Returns:
+        A float64 array of shape (algorithm, task, run, step, metric).
+    """
+    cells = [(task, algorithm, runs) for algorithm in algorithms for task in tasks]
+    return _gather_cell_values(data_env, cells, steps, metrics).reshape(
+        len(algorithms), len(tasks), len(runs), len(steps), len(metrics)
+    )
+
+
+def _gather_cell_values(
+    data_env: Dict[str, Dict[str, Any]],
+    cells: List[Tuple[str, str, List[str]]],
+    steps: List[str],
+    metrics: List[str],
+) -> np.ndarray:
+    """Collect the metric values of (task, algorithm, runs) cells into an array.
+
+    The values are read in a single traversal of the nested dictionary. Episode
+    lists are reduced to their mean, matching `np.mean`. Every cell must hold
+    the same number of runs.
+
+    Returns:
+        A float64 array of shape (cell, run, step, metric).
+    """
+    values: List[Any] = []
+    for task, algorithm, runs in cells:
+        for run in runs:
+            run_data = data_env[task][algorithm][run]
+            for step in steps:
+                step_data = run_data[step]
+                values.extend([step_data[metric] for metric in metrics])
+
+    if any(isinstance(value, list) for value in values):
+        flat_values, offsets, counts, _ = _flatten_metric_values(values)
+        array = _grouped_mean(flat_values, offsets, counts)
+    else:
+        array = np.asarray(values, dtype=np.float64)
+    return array.reshape(len(cells), -1, len(steps), len(metrics))
+
+
+def _environment_extra_info(extra: Dict[str, Any], env_name: str) -> Dict[str, Any]:
+    """Copy the extra information and keep the evaluation interval of one env.
+
+    Data processed by older versions may already hold a single interval.
+    """
+    extra = dict(extra)
+    if isinstance(extra.get("evaluation_interval"), dict):
+        extra["evaluation_interval"] = extra["evaluation_interval"][env_name]
+    return extra
+
+
+def _select_metrics_for_plotting(
+    absolute_metrics: List[str], metrics_to_normalize: List[str]
+) -> List[str]:
+    """Select absolute metrics for plotting.
+
+    Here only normalised versions of metrics that should be normalised
+    should be chosen.
+    """
+    metrics_to_plot = []
+
+    for metric in absolute_metrics:
+        metric_split = metric.split("_")
+        metric_in_absolute = len(
+            set(metric_split).intersection(set(metrics_to_normalize))
+        )
+        if metric.split("_")[0].lower() == "mean":
+            if metric_in_absolute > 0 and metric_split[1].lower() == "norm":
+                metrics_to_plot.append(metric)
+
+            elif metric_in_absolute == 0:
+                metrics_to_plot.append(metric)
+
+    return metrics_to_plot
+
+
+def _create_environment_matrices(
+    data_env: Dict[str, Dict[str, Any]],
+    extra: Dict[str, Any],
+    metrics_to_normalize: List[str],
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Creates the rliable matrices of a single environment.
+
+    See `create_matrices_for_rliable` for the format of the returned arrays.
+
+    Args:
+        data_env: Processed data of the environment.
+        extra: Extra information of the environment, which is added to the
+            second dictionary.
+        metrics_to_normalize: List of lower case metric names of metrics that
+            should be normalised.
+    """
+    # Making a strong assumption here that all experiments in this
+    # environment will have the same number of steps, same number of tasks
+    # and same number of.
+    tasks = list(data_env.keys())
+    algorithms = list(data_env[tasks[0]].keys())
+    runs = list(data_env[tasks[0]][algorithms[0]].keys())
+    steps = list(data_env[tasks[0]][algorithms[0]][runs[0]].keys())
+
+    # Check which step is the absolute metric
+    absolute_metric_key = check_absolute_metric(steps)
+    if absolute_metric_key is None:
+        raise Exception(
+            "The final logging step for\
+        a given run should contain the absolute_metrics values\
+        in a step called absolute_metrics."
+        )
+
+    absolute_metrics = list(
+        data_env[tasks[0]][algorithms[0]][runs[0]][absolute_metric_key].keys()
+    )
+    mean_absolute_metrics = _select_metrics_for_plotting(
+        absolute_metrics, metrics_to_normalize
+    )
+
+    # Gather the values of all metrics in a single
+    # (algorithm, task, run, step, metric) array.
+    metric_values = _gather_metric_values(
+        data_env, tasks, algorithms, runs, steps, mean_absolute_metrics
+    )
+    absolute_idx = steps.index(absolute_metric_key)
+    other_step_idx = [i for i in range(len(steps)) if i != absolute_idx]
+
+    # (runs x tasks) matrices of the absolute metrics
+    metric_dictionary: Dict[str, Any] = {}
+    # (runs x tasks x steps) tensors of all other logging steps
+    metric_tensor_dictionary: Dict[str, Any] = {}
+    for m, metric in enumerate(mean_absolute_metrics):
+        metric_dictionary[metric] = {}
+        metric_tensor_dictionary[metric] = {}
+        for a, algorithm in enumerate(algorithms):
+            algorithm_values = metric_values[a, ..., m]
+            metric_dictionary[metric][algorithm] = np.ascontiguousarray(
+                algorithm_values[:, :, absolute_idx].T
+            )
+            metric_tensor_dictionary[metric][algorithm] = np.ascontiguousarray(
+                algorithm_values[:, :, other_step_idx].transpose(1, 0, 2)
+            )
+
+    metric_tensor_dictionary["extra"] = extra
+    return metric_dictionary, metric_tensor_dictionary
+
+
+def _print_matrices_error(error: Exception) -> None:
+    """Print the error raised while creating the rliable matrices."""
+    print(
+        f"\n{Fore.RED}Unexpected error: {error}. There is an issue related to the "
+        + "format of the json file!"
+    )
+    print(
+        "We recommend using the DiagnoseData class from "
+        + "`marl_eval/utils/diagnose_data_errors.py` for further "
+        + f"investigation.\n{Style.RESET_ALL}"
+    )
+
+
+def create_matrices_for_rliable(
     data_dictionary: Dict[str, Dict[str, Any]],
     environment_name: str,
     metrics_to_normalize: List[str],
@@ -332,6 +1036,7 @@ def create_matrices_for_rliable(  # noqa: C901
         all tasks for a given logging step of an independent experiment run.
         This dictionary will be used to produce the sample efficiency curves.
 
+        `data_dictionary` is not modified.
 
     Args:
         data_dictionary: Dictionary of data that has been processed using the
@@ -350,160 +1055,69 @@ def create_matrices_for_rliable(  # noqa: C901
     )
 
     try:
-        # Compute first arrays
-
-        # Get the environment name
-        env_name = environment_name
-
-        # Extract relevant information
-        data_env = data_dictionary[env_name]
-
-        # Extract the extra params
-        extra = data_dictionary.pop("extra")
-
-        # Making a strong assumption here that all experiments in this
-        # environment will have the same number of steps, same number of tasks
-        # and same number of.
-        tasks = list(data_env.keys())
-        algorithms = list(data_env[tasks[0]].keys())
-        runs = list(data_env[tasks[0]][algorithms[0]].keys())
-        steps = list(data_env[tasks[0]][algorithms[0]][runs[0]].keys())
-
-        # Check which step is the absolute metric
-        absolute_metric_key = check_absolute_metric(steps)
-        if absolute_metric_key is None:
-            raise Exception(
-                "The final logging step for\
-            a given run should contain the absolute_metrics values\
-            in a step called absolute_metrics."
-            )
-
-        absolute_metrics = list(
-            data_env[tasks[0]][algorithms[0]][runs[0]][absolute_metric_key].keys()
+        extra = _environment_extra_info(data_dictionary["extra"], environment_name)
+        return _create_environment_matrices(
+            data_dictionary[environment_name], extra, metrics_to_normalize
         )
 
-        def _select_metrics_for_plotting(absolute_metrics: list) -> list:
-            """Select absolute metrics for plotting.
-
-            Here only normalised versions of metrics that should be normalised
-            should be chosen.
-            """
-            metrics_to_plot = []
-
-            for metric in absolute_metrics:
-                metric_split = metric.split("_")
-                metric_in_absolute = len(
-                    set(metric_split).intersection(set(metrics_to_normalize))
-                )
-                if metric.split("_")[0].lower() == "mean":
-                    if metric_in_absolute > 0 and metric_split[1].lower() == "norm":
-                        metrics_to_plot.append(metric)
-
-                    elif metric_in_absolute == 0:
-                        metrics_to_plot.append(metric)
-
-            return metrics_to_plot
+    except Exception as e:
+        _print_matrices_error(e)
+        raise
 
-        mean_absolute_metrics = _select_metrics_for_plotting(absolute_metrics)
 
-        # Create a dictionary of matrices with correct shape
-        metric_dictionary: Dict[str, Any] = {}
+def create_matrices_for_rliable_all_environments(
+    data_dictionary: Dict[str, Dict[str, Any]],
+    metrics_to_normalize: List[str],
+    environment_names: Optional[List[str]] = None,
+    workers: int = 1,
+) -> Dict[str, Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]]:
+    """Creates the rliable matrices of several environments in one call.
 
-        for metric in mean_absolute_metrics:
-            metric_dictionary[metric] = {}
-            for algorithm in algorithms:
-                metric_dictionary[metric][algorithm] = np.zeros(
-                    shape=(len(runs), len(tasks))
-                )
+    Every environment is traversed once and `data_dictionary` is not modified,
+    so the matrices of different environments can be built in parallel.
 
-        # Populate the matrices
-        for metric in mean_absolute_metrics:
-            for algorithm in algorithms:
-                for i, run in enumerate(runs):
-                    for j, task in enumerate(tasks):
-                        # Get the metric data
-                        metric_data = data_env[task][algorithm][run][
-                            absolute_metric_key
-                        ][metric]
-                        # Compute the mean if it's a list, otherwise use as is
-                        data = (
-                            np.mean(metric_data)
-                            if isinstance(metric_data, list)
-                            else metric_data
-                        )
-                        # Store the data in the metric dictionary
-                        metric_dictionary[metric][algorithm][i][j] = data
-
-        metric_dictionary_return = metric_dictionary
-
-        # Compute second arrays
-
-        # Create master dictionary with all arrays
-        master_metric_dictionary: Dict[str, Any] = {}
-
-        for metric in mean_absolute_metrics:
-            master_metric_dictionary[metric] = {}
-            for algorithm in algorithms:
-                master_metric_dictionary[metric][algorithm] = []
-
-        # exclude the absolute metrics
-        steps.remove(absolute_metric_key)
-        for step in steps:
-            metric_dictionary = {}
-            for metric in mean_absolute_metrics:
-                metric_dictionary[metric] = {}
-                for algorithm in algorithms:
-                    metric_dictionary[metric][algorithm] = np.zeros(
-                        shape=(len(runs), len(tasks))
-                    )
+    Args:
+        data_dictionary: Dictionary of data that has been processed using the
+            data_process_pipeline function.
+        metrics_to_normalize: List of metric names of metrics that should be
+            normalised.
+        environment_names: Names of the environments for which arrays should be
+            computed. Defaults to all environments in `data_dictionary`.
+        workers: Number of worker processes used to build the matrices of
+            different environments in parallel. With 1, everything runs in the
+            current process.
 
-            # Now populate the matrices
-            for metric in mean_absolute_metrics:
-                for algorithm in algorithms:
-                    for i, run in enumerate(runs):
-                        for j, task in enumerate(tasks):
-                            # Get the metric data
-                            metric_data = data_env[task][algorithm][run][step][metric]
-                            # Compute the mean if it's a list, otherwise use as is
-                            data = (
-                                np.mean(metric_data)
-                                if isinstance(metric_data, list)
-                                else metric_data
-                            )
-                            # Store the data in the metric dictionary
-                            metric_dictionary[metric][algorithm][i][j] = data
+    Returns:
+        Dictionary mapping every environment name to the two dictionaries
+        returned by `create_matrices_for_rliable` for that environment.
+    """
+    metrics_to_normalize = lower_case_inputs(metrics_to_normalize)
+    if environment_names is None:
+        environment_names = [env for env in data_dictionary if env != "extra"]
+    else:
+        environment_names = lower_case_inputs(environment_names)
 
-            for metric in mean_absolute_metrics:
-                for algorithm in algorithms:
-                    master_metric_dictionary[metric][algorithm].append(
-                        metric_dictionary[metric][algorithm]
+    try:
+        data_envs = [data_dictionary[env] for env in environment_names]
+        extras = [
+            _environment_extra_info(data_dictionary["extra"], env)
+            for env in environment_names
+        ]
+        metrics_list = [metrics_to_normalize] * len(environment_names)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(
+                        _create_environment_matrices, data_envs, extras, metrics_list
                     )
-
-        final_metric_tensor_dictionary: Dict[str, Any] = {}
-        for metric in mean_absolute_metrics:
-            final_metric_tensor_dictionary[metric] = {}
-            for algorithm in algorithms:
-                final_metric_tensor_dictionary[metric][algorithm] = np.stack(
-                    master_metric_dictionary[metric][algorithm], axis=2
                 )
+        else:
+            results = list(
+                map(_create_environment_matrices, data_envs, extras, metrics_list)
+            )
 
-        # Insert the extra info to the final metric tensor dict
-        extra["evaluation_interval"] = extra["evaluation_interval"][env_name]
-        final_metric_tensor_dictionary["extra"] = extra
-
-        # Add extra back to data_dictionary
-        data_dictionary["extra"] = extra
-
-        return metric_dictionary_return, final_metric_tensor_dictionary
+        return dict(zip(environment_names, results))
 
     except Exception as e:
-        print(
-            f"\n{Fore.RED}Unexpected error: {e}. There is an issue related to the "
-            + "format of the json file!"
-        )
-        print(
-            "We recommend using the DiagnoseData class from "
-            + "`marl_eval/utils/diagnose_data_errors.py` for further "
-            + f"investigation.\n{Style.RESET_ALL}"
-        )
+        _print_matrices_error(e)
         raise
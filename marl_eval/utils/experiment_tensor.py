@@ -0,0 +1,511 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Dense columnar storage for MARL experiment data."""
+
+import json
+import os
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
+
+import numpy as np
+
+# Values stored in the lengths arrays for cells that do not hold an episode list.
+MISSING_LENGTH = -1
+SCALAR_LENGTH = -2
+# Value stored in the step positions array for steps that a run does not hold.
+MISSING_STEP = -1
+# Version of the layout written by `save_experiment_tensors`.
+BINARY_FORMAT_VERSION = 1
+
+
+class ExperimentTensor:
+    """Dense columnar store for the data of a single environment.
+
+    Every metric is held as one contiguous array of shape
+    (task, algorithm, run, step, episode). Episode lists of different lengths
+    are padded (with NaN for float metrics and 0 for integer and boolean
+    metrics) and the true length of every (task, algorithm, run, step) cell is
+    kept in a companion `lengths` array. Cells that do not contain the metric
+    are marked with `MISSING_LENGTH` and cells that contain a single scalar
+    instead of a list are marked with `SCALAR_LENGTH`.
+
+    Runs are stored positionally since seeds are usually named differently for
+    every algorithm and task. The original run labels are kept in `runs`, a
+    nested list indexed as `runs[task_idx][algorithm_idx]` which is None for
+    algorithms that a task does not hold. The position of every step within
+    its run, or `MISSING_STEP`, is kept in the (task, algorithm, run, step)
+    `step_positions` array, so that runs keep their own steps and step order,
+    including steps without any metric.
+
+    The conversion to and from the nested dictionary layout is lossless up to
+    the following normalisations:
+      - every metric has a single dtype, so a metric mixing integer and float
+        values comes back with float values and a metric mixing booleans and
+        integers comes back with integer values,
+      - the metrics of every step follow the order in which the metrics are
+        first found in the data.
+
+    Args:
+        tasks: ordered task names.
+        algorithms: ordered algorithm names.
+        runs: run labels for every task and algorithm pair.
+        steps: ordered step names, including the absolute metrics step.
+        metrics: mapping from metric name to its (task, algorithm, run, step,
+            episode) array.
+        lengths: mapping from metric name to its (task, algorithm, run, step)
+            array of episode counts.
+        step_positions: (task, algorithm, run, step) array with the position
+            of every step within its run. If None, every run holds the steps
+            in which it has a metric, in the order of `steps`.
+    """
+
+    def __init__(
+        self,
+        tasks: List[str],
+        algorithms: List[str],
+        runs: List[List[Optional[List[str]]]],
+        steps: List[str],
+        metrics: Dict[str, np.ndarray],
+        lengths: Dict[str, np.ndarray],
+        step_positions: Optional[np.ndarray] = None,
+    ) -> None:
+        """Initialises the tensor and builds the label index maps."""
+        self.tasks = list(tasks)
+        self.algorithms = list(algorithms)
+        self.runs = runs
+        self.steps = list(steps)
+        self.metrics = metrics
+        self.lengths = lengths
+        if step_positions is None:
+            step_positions = np.full(self.shape, MISSING_STEP, dtype=np.int64)
+            for metric_lengths in lengths.values():
+                is_present = metric_lengths != MISSING_LENGTH
+                step_positions[is_present] = np.nonzero(is_present)[-1]
+        self.step_positions = step_positions
+
+        self.task_index = {task: i for i, task in enumerate(self.tasks)}
+        self.algorithm_index = {algo: i for i, algo in enumerate(self.algorithms)}
+        self.step_index = {step: i for i, step in enumerate(self.steps)}
+
+    @property
+    def metric_names(self) -> List[str]:
+        """Names of all stored metrics."""
+        return list(self.metrics.keys())
+
+    @property
+    def shape(self) -> Tuple[int, int, int, int]:
+        """Shape of the (task, algorithm, run, step) grid."""
+        num_runs = max(
+            (
+                len(algo_runs or [])
+                for task_runs in self.runs
+                for algo_runs in task_runs
+            ),
+            default=0,
+        )
+        return len(self.tasks), len(self.algorithms), num_runs, len(self.steps)
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes used by the metric and length arrays."""
+        return self.step_positions.nbytes + sum(
+            self.metrics[m].nbytes + self.lengths[m].nbytes for m in self.metrics
+        )
+
+    def __getitem__(self, metric: str) -> np.ndarray:
+        """Returns the (task, algorithm, run, step, episode) array of a metric."""
+        return self.metrics[metric]
+
+    def __contains__(self, metric: str) -> bool:
+        """Checks whether a metric is stored in the tensor."""
+        return metric in self.metrics
+
+    def get(
+        self, metric: str, task: Optional[str] = None, algorithm: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the values and lengths of a metric for a task or algorithm.
+
+        The selection uses basic indexing, so the returned arrays are views. For
+        memory-mapped tensors, only the selected slice is read from disk.
+
+        Args:
+            metric: name of the metric.
+            task: if given, only this task is returned and the task axis is
+                dropped.
+            algorithm: if given, only this algorithm is returned and the
+                algorithm axis is dropped.
+
+        Returns:
+            values: (task, algorithm, run, step, episode) array of the metric,
+                without the selected axes.
+            lengths: (task, algorithm, run, step) array of episode counts,
+                without the selected axes.
+        """
+        index: Tuple[Union[int, slice], ...] = (
+            slice(None) if task is None else self.task_index[task],
+            slice(None) if algorithm is None else self.algorithm_index[algorithm],
+        )
+        return self.metrics[metric][index], self.lengths[metric][index]
+
+    def run_labels(self, task: str, algorithm: str) -> List[str]:
+        """Returns the run labels of a task and algorithm pair."""
+        return self.runs[self.task_index[task]][self.algorithm_index[algorithm]] or []
+
+    def episode_counts(
+        self, metric: str, task: Optional[str] = None, algorithm: Optional[str] = None
+    ) -> np.ndarray:
+        """Number of valid episode values in every cell of a metric.
+
+        Missing cells count as 0 and scalar cells count as 1. The task and
+        algorithm select a slice as in `get`.
+        """
+        _, lengths = self.get(metric, task, algorithm)
+        return np.where(lengths == SCALAR_LENGTH, 1, np.maximum(lengths, 0))
+
+    def mask(
+        self, metric: str, task: Optional[str] = None, algorithm: Optional[str] = None
+    ) -> np.ndarray:
+        """Boolean (task, algorithm, run, step, episode) mask of valid values.
+
+        The task and algorithm select a slice as in `get`.
+        """
+        episodes = np.arange(self.metrics[metric].shape[-1])
+        return episodes < self.episode_counts(metric, task, algorithm)[..., np.newaxis]
+
+    def mean(
+        self, metric: str, task: Optional[str] = None, algorithm: Optional[str] = None
+    ) -> np.ndarray:
+        """Mean over the episode axis of a metric.
+
+        Args:
+            metric: name of the metric.
+            task: if given, only the mean of this task is computed, see `get`.
+            algorithm: if given, only the mean of this algorithm is computed.
+
+        Returns:
+            A float (task, algorithm, run, step) array, without the selected
+            axes, which is NaN wherever the metric is missing.
+        """
+        values, _ = self.get(metric, task, algorithm)
+        counts = self.episode_counts(metric, task, algorithm)
+        totals = np.sum(
+            values,
+            axis=-1,
+            where=self.mask(metric, task, algorithm),
+            dtype=np.float64,
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    @classmethod
+    def from_dict(  # noqa: C901
+        cls,
+        environment_data: Dict[str, Dict[str, Any]],
+        dtype: Optional[np.dtype] = None,
+    ) -> "ExperimentTensor":
+        """Builds a tensor from the nested dictionary of a single environment.
+
+        Args:
+            environment_data: nested task -> algorithm -> run -> step -> metric
+                dictionary, as found under an environment key of raw or
+                processed data.
+            dtype: dtype used for every metric array. If None, boolean metrics
+                are stored as bool, integer metrics as int64 and all other
+                metrics as float64. Passing np.float32 roughly halves the
+                memory footprint, but integer and boolean values then come back
+                as floats.
+
+        Returns:
+            The ExperimentTensor holding the environment data.
+        """
+        tasks = list(environment_data.keys())
+        # Dictionaries keep insertion order and give constant time lookups.
+        algorithm_index: Dict[str, int] = {}
+        step_index: Dict[str, int] = {}
+        max_lengths: Dict[str, int] = {}
+        is_integer: Dict[str, bool] = {}
+        is_bool: Dict[str, bool] = {}
+
+        # First pass to collect labels, episode lengths and value types.
+        for algos in environment_data.values():
+            for algo, runs in algos.items():
+                algorithm_index.setdefault(algo, len(algorithm_index))
+                for run_steps in runs.values():
+                    for step, step_metrics in run_steps.items():
+                        step_index.setdefault(step, len(step_index))
+                        for metric, value in step_metrics.items():
+                            values = value if isinstance(value, list) else [value]
+                            max_lengths[metric] = max(
+                                max_lengths.get(metric, 0), len(values)
+                            )
+                            is_integer[metric] = is_integer.get(metric, True) and all(
+                                isinstance(v, (int, np.integer)) for v in values
+                            )
+                            is_bool[metric] = is_bool.get(metric, True) and all(
+                                isinstance(v, (bool, np.bool_)) for v in values
+                            )
+
+        algorithms = list(algorithm_index.keys())
+        steps = list(step_index.keys())
+        runs_labels: List[List[Optional[List[str]]]] = [
+            [None for _ in algorithms] for _ in tasks
+        ]
+        for t, algos in enumerate(environment_data.values()):
+            for algo, runs in algos.items():
+                runs_labels[t][algorithm_index[algo]] = list(runs.keys())
+        num_runs = max(
+            (len(labels or []) for task_runs in runs_labels for labels in task_runs),
+            default=0,
+        )
+        grid_shape = (len(tasks), len(algorithms), num_runs, len(steps))
+
+        metrics: Dict[str, np.ndarray] = {}
+        lengths: Dict[str, np.ndarray] = {}
+        step_positions = np.full(grid_shape, MISSING_STEP, dtype=np.int64)
+        for metric, max_length in max_lengths.items():
+            if dtype is not None:
+                metric_dtype = np.dtype(dtype)
+            elif is_bool[metric]:
+                metric_dtype = np.dtype(np.bool_)
+            elif is_integer[metric]:
+                metric_dtype = np.dtype(np.int64)
+            else:
+                metric_dtype = np.dtype(np.float64)
+            fill_value = np.nan if metric_dtype.kind == "f" else 0
+            metrics[metric] = np.full(
+                (*grid_shape, max_length), fill_value, dtype=metric_dtype
+            )
+            lengths[metric] = np.full(grid_shape, MISSING_LENGTH, dtype=np.int64)
+
+        # Second pass to fill the dense arrays.
+        for t, algos in enumerate(environment_data.values()):
+            for algo, runs in algos.items():
+                a = algorithm_index[algo]
+                for r, run_steps in enumerate(runs.values()):
+                    for position, (step, step_metrics) in enumerate(run_steps.items()):
+                        s = step_index[step]
+                        step_positions[t, a, r, s] = position
+                        for metric, value in step_metrics.items():
+                            if isinstance(value, list):
+                                metrics[metric][t, a, r, s, : len(value)] = value
+                                lengths[metric][t, a, r, s] = len(value)
+                            else:
+                                metrics[metric][t, a, r, s, 0] = value
+                                lengths[metric][t, a, r, s] = SCALAR_LENGTH
+
+        return cls(
+            tasks, algorithms, runs_labels, steps, metrics, lengths, step_positions
+        )
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Converts the tensor back to the nested dictionary layout.
+
+        Returns:
+            Nested task -> algorithm -> run -> step -> metric dictionary where
+            episode data are lists and scalar cells are Python scalars.
+        """
+        environment_data: Dict[str, Dict[str, Any]] = {}
+        for t, task in enumerate(self.tasks):
+            # Converting whole arrays at once is much faster than per cell. The
+            # arrays are converted one task at a time, so that only the slice
+            # of a task of memory-mapped arrays is held as lists.
+            values, lengths = {}, {}
+            for metric in self.metrics:
+                task_values, task_lengths = self.get(metric, task)
+                values[metric], lengths[metric] = (
+                    task_values.tolist(),
+                    task_lengths.tolist(),
+                )
+            step_positions = self.step_positions[t].tolist()
+
+            environment_data[task] = {}
+            for a, algo in enumerate(self.algorithms):
+                run_labels = self.runs[t][a]
+                if run_labels is None:
+                    continue
+                environment_data[task][algo] = {}
+                for r, run in enumerate(run_labels):
+                    run_steps = sorted(
+                        (position, s)
+                        for s, position in enumerate(step_positions[a][r])
+                        if position != MISSING_STEP
+                    )
+                    run_data: Dict[str, Dict[str, Any]] = {}
+                    for _, s in run_steps:
+                        step_data: Dict[str, Any] = {}
+                        for metric in self.metrics:
+                            length = lengths[metric][a][r][s]
+                            if length == MISSING_LENGTH:
+                                continue
+                            cell = values[metric][a][r][s]
+                            step_data[metric] = (
+                                cell[0] if length == SCALAR_LENGTH else cell[:length]
+                            )
+                        run_data[self.steps[s]] = step_data
+                    environment_data[task][algo][run] = run_data
+        return environment_data
+
+
+def dict_to_experiment_tensors(
+    data: Dict[str, Dict[str, Any]], dtype: Optional[np.dtype] = None
+) -> Dict[str, ExperimentTensor]:
+    """Builds one ExperimentTensor per environment of raw or processed data.
+
+    The `extra` block of processed data is not part of any environment and is
+    therefore skipped.
+    """
+    return {
+        env: ExperimentTensor.from_dict(env_data, dtype=dtype)
+        for env, env_data in data.items()
+        if env != "extra"
+    }
+
+
+def experiment_tensors_to_dict(
+    tensors: Dict[str, ExperimentTensor],
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Converts per environment tensors back to the nested dictionary layout."""
+    data: Dict[str, Dict[str, Any]] = {
+        env: tensor.to_dict() for env, tensor in tensors.items()
+    }
+    if extra is not None:
+        data["extra"] = extra
+    return data
+
+
+def save_experiment_tensors(
+    tensors: Dict[str, ExperimentTensor],
+    directory: str,
+    extra: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Saves per environment tensors in the binary experiment format.
+
+    Every metric and length array is written as a separate `.npy` file in a
+    sub directory per environment, next to an `index.json` file holding the
+    environment, task, algorithm, run, step and metric labels as well as the
+    optional `extra` information of processed data.
+
+    Args:
+        tensors: mapping from environment name to its ExperimentTensor.
+        directory: directory in which the data is stored. It is created if it
+            does not exist yet.
+        extra: `extra` information of processed data.
+    """
+    environments = []
+    for e, (env, tensor) in enumerate(tensors.items()):
+        env_directory = os.path.join(directory, f"env_{e}")
+        os.makedirs(env_directory, exist_ok=True)
+        np.save(
+            os.path.join(env_directory, "step_positions.npy"), tensor.step_positions
+        )
+        for m, metric in enumerate(tensor.metric_names):
+            np.save(
+                os.path.join(env_directory, f"values_{m}.npy"), tensor.metrics[metric]
+            )
+            np.save(
+                os.path.join(env_directory, f"lengths_{m}.npy"), tensor.lengths[metric]
+            )
+        environments.append(
+            {
+                "name": env,
+                "directory": f"env_{e}",
+                "tasks": tensor.tasks,
+                "algorithms": tensor.algorithms,
+                "runs": tensor.runs,
+                "steps": tensor.steps,
+                "metrics": tensor.metric_names,
+            }
+        )
+
+    index = {
+        "format_version": BINARY_FORMAT_VERSION,
+        "environments": environments,
+        "extra": extra,
+    }
+    # The index is written last so that a directory with an index is complete.
+    with open(os.path.join(directory, "index.json"), "w") as f:
+        json.dump(index, f)
+
+
+def load_experiment_tensors(
+    directory: str, mmap_mode: Optional[Literal["r", "r+", "c"]] = "r"
+) -> Tuple[Dict[str, ExperimentTensor], Optional[Dict[str, Any]]]:
+    """Loads tensors saved with `save_experiment_tensors`.
+
+    By default the arrays are memory-mapped, so opening an archive is cheap
+    and only the slices that are accessed, e.g. with `ExperimentTensor.get`
+    or `ExperimentTensor.mean` for a single task or algorithm, are read from
+    disk. `ExperimentTensor.to_dict` reads every array, one task at a time.
+
+    Args:
+        directory: directory in which the data was stored.
+        mmap_mode: memory-map mode passed to `np.load`. Use None to read the
+            arrays into memory.
+
+    Returns:
+        tensors: mapping from environment name to its ExperimentTensor.
+        extra: `extra` information of processed data, or None.
+    """
+    with open(os.path.join(directory, "index.json")) as f:
+        index = json.load(f)
+    if index.get("format_version") != BINARY_FORMAT_VERSION:
+        raise ValueError(
+            "Unsupported binary experiment format version "
+            + f"{index.get('format_version')} in {directory}, expected version "
+            + f"{BINARY_FORMAT_VERSION}. Convert the JSON data again with "
+            + "`convert_json_to_binary`."
+        )
+
+    tensors = {}
+    for env in index["environments"]:
+        env_directory = os.path.join(directory, env["directory"])
+        metrics, lengths = {}, {}
+        for m, metric in enumerate(env["metrics"]):
+            metrics[metric] = np.load(
+                os.path.join(env_directory, f"values_{m}.npy"), mmap_mode=mmap_mode
+            )
+            lengths[metric] = np.load(
+                os.path.join(env_directory, f"lengths_{m}.npy"), mmap_mode=mmap_mode
+            )
+        step_positions = np.load(
+            os.path.join(env_directory, "step_positions.npy"), mmap_mode=mmap_mode
+        )
+        tensors[env["name"]] = ExperimentTensor(
+            env["tasks"],
+            env["algorithms"],
+            env["runs"],
+            env["steps"],
+            metrics,
+            lengths,
+            step_positions,
+        )
+    return tensors, index["extra"]
+
+
+def convert_json_to_binary(
+    json_path: str, directory: str, dtype: Optional[np.dtype] = None
+) -> None:
+    """Converts a JSON file in the marl-eval format to the binary format.
+
+    Args:
+        json_path: path to the JSON file.
+        directory: directory in which the binary data is stored.
+        dtype: dtype of the metric arrays, see `ExperimentTensor.from_dict`.
+    """
+    with open(json_path) as f:
+        data = json.load(f)
+    extra = data.get("extra")
+    save_experiment_tensors(dict_to_experiment_tensors(data, dtype), directory, extra)
@@ -0,0 +1,241 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tools for incrementally processing MARL experiment data."""
+
+import pickle
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from marl_eval.utils.data_processing_utils import (
+    _flatten_metric_values,
+    _get_extra_info,
+    _get_metric_min_max,
+    _process_task,
+    _split_flat_values,
+    check_comma_in_algo_names,
+    lower_case_dictionary_keys,
+    lower_case_inputs,
+)
+
+
+def _rescale_normalised_steps(
+    processed_steps: List[Dict[str, Any]],
+    metric: str,
+    old_min_max: Tuple[Any, Any],
+    new_min_max: Tuple[Any, Any],
+) -> None:
+    """Update normalised values after the global min/max of a task has widened.
+
+    Min/max normalisation is affine, so values normalised with the old bounds
+    are mapped to the new bounds with a single scale and shift instead of being
+    recomputed from the raw data.
+
+    Args:
+        processed_steps: processed metric dictionaries to update in place.
+        metric: name of the normalised metric.
+        old_min_max: (global min, global max) used to normalise the values.
+        new_min_max: new (global min, global max) of the task.
+    """
+    old_min, old_max = old_min_max
+    new_min, new_max = new_min_max
+    scale = (old_max - old_min + 1e-6) / (new_max - new_min + 1e-6)
+    shift = (old_min - new_min) / (new_max - new_min + 1e-6)
+
+    norm_key = f"norm_{metric}"
+    norm_steps = [step for step in processed_steps if norm_key in step]
+    if norm_steps:
+        values, offsets, counts, is_scalar = _flatten_metric_values(
+            [step[norm_key] for step in norm_steps]
+        )
+        rescaled = _split_flat_values(
+            values * scale + shift, offsets, counts, is_scalar
+        )
+        for step, norm_values in zip(norm_steps, rescaled):
+            step[norm_key] = norm_values
+
+    mean_norm_key = f"mean_norm_{metric}"
+    mean_norm_steps = [step for step in processed_steps if mean_norm_key in step]
+    mean_norms = np.fromiter(
+        (step[mean_norm_key] for step in mean_norm_steps),
+        dtype=np.float64,
+        count=len(mean_norm_steps),
+    )
+    for step, mean_norm in zip(mean_norm_steps, mean_norms * scale + shift):
+        step[mean_norm_key] = mean_norm
+
+
+class IncrementalDataProcessor:
+    """Keeps processed experiment data up to date as new runs are added.
+
+    Normalisation depends on the global min/max of every task, which is why
+    `data_process_pipeline` has to reprocess the full dataset whenever a run is
+    added. This class keeps the per task min/max and the processed data, with
+    its per run means, as state. Given a delta of new runs, only the new runs
+    are processed. Cached normalised values are reused as long as the min/max
+    of their task does not move, and are rescaled in a single vectorized step
+    when the new runs widen it.
+
+    Args:
+        metrics_to_normalize: A list of metric names for metrics that should
+            be min/max normalised.
+        summary_only: Whether to only keep the `mean_*` and `mean_norm_*` values
+            in the processed data. See `data_process_pipeline`.
+    """
+
+    def __init__(
+        self, metrics_to_normalize: List[str], summary_only: bool = False
+    ) -> None:
+        """Initialise an empty processor."""
+        self.metrics_to_normalize = lower_case_inputs(metrics_to_normalize)
+        self.summary_only = summary_only
+        self.processed_data: Dict[str, Dict[str, Any]] = {}
+        self.metric_min_max_info: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Running sum and count of the evaluation intervals per environment.
+        self.eval_interval_totals: Dict[str, List[int]] = {}
+
+    def update(self, raw_data: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Add new runs to the processed data.
+
+        Args:
+            raw_data: Dictionary containing only the new runs, in the same
+                format as the raw data read from a JSON file. New algorithms,
+                tasks and environments are supported.
+
+        Returns:
+            processed_data: The processed data of all runs added so far, in the
+                format returned by `data_process_pipeline`. This is the state
+                of the processor itself rather than a copy, so it is updated by
+                later calls and must not be modified. Deep copy it first to
+                change it.
+
+        Raises:
+            ValueError: If the new runs are invalid, in which case the state of
+                the processor is left unchanged.
+        """
+        raw_data = lower_case_dictionary_keys(raw_data)
+        self._validate(raw_data)
+        self.processed_data.pop("extra", None)
+
+        for env, tasks in raw_data.items():
+            for task, algorithms in tasks.items():
+                self._update_task(env, task, algorithms)
+
+        self.processed_data["extra"] = _get_extra_info(
+            self.processed_data,
+            {
+                env: round(total / count)
+                for env, (total, count) in self.eval_interval_totals.items()
+            },
+        )
+        return self.processed_data
+
+    def _validate(self, raw_data: Dict[str, Dict[str, Any]]) -> None:
+        """Check all new runs before any of them is merged in."""
+        algorithms = {
+            algorithm
+            for tasks in raw_data.values()
+            for task_algorithms in tasks.values()
+            for algorithm in task_algorithms
+        }
+        # Check that algorithm names do not contain commas
+        algo_names_valid, invalid_algo_names = check_comma_in_algo_names(
+            sorted(algorithms)
+        )
+        if not algo_names_valid:
+            raise ValueError(
+                "Algorithm names must not contain commas."
+                + f" Please update the following invalid names: {invalid_algo_names}\n"
+            )
+
+        for env, tasks in raw_data.items():
+            for task, task_algorithms in tasks.items():
+                processed_task = self.processed_data.get(env, {}).get(task, {})
+                for algorithm, runs in task_algorithms.items():
+                    existing_runs = set(runs).intersection(
+                        processed_task.get(algorithm, {})
+                    )
+                    if existing_runs:
+                        raise ValueError(
+                            f"Runs {sorted(existing_runs)} of {algorithm} on "
+                            + f"{env}/{task} have already been processed. New "
+                            + "runs must use new names."
+                        )
+                    for run, steps in runs.items():
+                        for step, metrics in steps.items():
+                            missing_metrics = set(self.metrics_to_normalize) - set(
+                                metrics
+                            )
+                            if missing_metrics:
+                                raise ValueError(
+                                    f"Metrics to normalise {sorted(missing_metrics)} "
+                                    + f"are missing from {env}/{task}/{algorithm}/"
+                                    + f"{run}/{step}."
+                                )
+
+    def _update_task(
+        self, env: str, task: str, algorithms: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """Process the new runs of a single task and merge them in."""
+        processed_task = self.processed_data.setdefault(env, {}).setdefault(task, {})
+        raw_steps = [
+            metrics
+            for runs in algorithms.values()
+            for steps in runs.values()
+            for metrics in steps.values()
+        ]
+        old_min_max_info = self.metric_min_max_info.get((env, task))
+        new_min_max_info = _get_metric_min_max(
+            raw_steps, self.metrics_to_normalize, old_min_max_info
+        )
+
+        if old_min_max_info is not None:
+            processed_steps = [
+                metrics
+                for runs in processed_task.values()
+                for steps in runs.values()
+                for metrics in steps.values()
+            ]
+            for metric, new_min_max in new_min_max_info.items():
+                if new_min_max != old_min_max_info[metric]:
+                    _rescale_normalised_steps(
+                        processed_steps, metric, old_min_max_info[metric], new_min_max
+                    )
+
+        new_processed_task, eval_intervals = _process_task(
+            algorithms,
+            self.metrics_to_normalize,
+            summary_only=self.summary_only,
+            metric_min_max_info=new_min_max_info,
+        )
+        for algorithm, runs in new_processed_task.items():
+            processed_task.setdefault(algorithm, {}).update(runs)
+
+        self.metric_min_max_info[(env, task)] = new_min_max_info
+        totals = self.eval_interval_totals.setdefault(env, [0, 0])
+        totals[0] += sum(eval_intervals)
+        totals[1] += len(eval_intervals)
+
+    def save(self, file_path: str) -> None:
+        """Store the state of the processor so that it can be resumed later."""
+        with open(file_path, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, file_path: str) -> "IncrementalDataProcessor":
+        """Restore a processor stored with `save`."""
+        with open(file_path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,235 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""JAX versions of the batched aggregate metrics, used by the jax backend.
+
+The functions mirror those of `marl_eval.utils.metrics_utils` and take arrays
+of shape (..., runs, tasks). The resampling of a chunk of bootstrap
+replications and its aggregation are compiled together with `jax.jit`, so that
+XLA fuses the gather of the resampled scores with the reductions. Computations
+run in single precision unless 64 bit mode is enabled in JAX.
+
+This module requires `jax`, which is not a dependency of marl-eval.
+"""
+
+import functools
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from marl_eval.utils import metrics_utils
+
+
+def aggregate_mean(scores: jax.Array) -> jax.Array:
+    """Mean over tasks of the per task mean scores."""
+    return jnp.mean(jnp.mean(scores, axis=-2), axis=-1)
+
+
+def aggregate_median(scores: jax.Array) -> jax.Array:
+    """Median over tasks of the per task mean scores."""
+    return jnp.median(jnp.mean(scores, axis=-2), axis=-1)
+
+
+def aggregate_iqm(scores: jax.Array) -> jax.Array:
+    """Interquartile mean over all runs and tasks."""
+    flat_scores = jnp.sort(scores.reshape(*scores.shape[:-2], -1), axis=-1)
+    num_scores = flat_scores.shape[-1]
+    lowercut = int(0.25 * num_scores)
+    return jnp.mean(flat_scores[..., lowercut : num_scores - lowercut], axis=-1)
+
+
+def aggregate_iqm_over_frames(scores: jax.Array) -> jax.Array:
+    """Interquartile mean over all runs and tasks of every frame."""
+    return aggregate_iqm(jnp.moveaxis(scores, -1, -3))
+
+
+def aggregate_run_means(scores: jax.Array) -> jax.Array:
+    """Mean over runs of the scores of every task and frame."""
+    return jnp.mean(scores, axis=-3)
+
+
+def aggregate_optimality_gap(scores: jax.Array, gamma: float = 1) -> jax.Array:
+    """Average shortfall of the scores below a target score `gamma`."""
+    return gamma - jnp.mean(jnp.minimum(scores, gamma), axis=(-2, -1))
+
+
+def aggregate_all(scores: jax.Array) -> jax.Array:
+    """Median, IQM, mean and optimality gap stacked on a new last axis."""
+    return jnp.stack(
+        [
+            aggregate_median(scores),
+            aggregate_iqm(scores),
+            aggregate_mean(scores),
+            aggregate_optimality_gap(scores),
+        ],
+        axis=-1,
+    )
+
+
+def aggregate_all_over_metrics(scores: jax.Array) -> jax.Array:
+    """Median, IQM, mean and optimality gap of every metric."""
+    return aggregate_all(jnp.moveaxis(scores, -1, -3))
+
+
+def probability_of_improvement_matrix(*scores: jax.Array) -> jax.Array:
+    """Probability of improvement of every algorithm over every other algorithm.
+
+    Same rank-based computation as the NumPy version, with the positions of
+    the groups of tied scores always computed, since the branch on the
+    presence of ties cannot be traced.
+    """
+    num_algorithms = len(scores)
+    num_runs = np.array([score.shape[-2] for score in scores])
+    labels = jnp.asarray(np.repeat(np.arange(num_algorithms), num_runs))
+
+    pooled = jnp.swapaxes(jnp.concatenate(scores, axis=-2), -1, -2)
+    num_pooled = pooled.shape[-1]
+    order = jnp.argsort(pooled, axis=-1)
+    sorted_scores = jnp.take_along_axis(pooled, order, axis=-1)
+    one_hot = (labels[order][..., jnp.newaxis] == jnp.arange(num_algorithms)).astype(
+        pooled.dtype
+    )
+    counts = jnp.cumsum(one_hot, axis=-2)
+    counts = jnp.concatenate([jnp.zeros_like(counts[..., :1, :]), counts], axis=-2)
+
+    is_tied = sorted_scores[..., 1:] == sorted_scores[..., :-1]
+    is_first = jnp.concatenate([jnp.ones_like(is_tied[..., :1]), ~is_tied], axis=-1)
+    is_last = jnp.concatenate([~is_tied, jnp.ones_like(is_tied[..., :1])], axis=-1)
+    positions = jnp.arange(num_pooled)
+    group_first = jax.lax.cummax(
+        jnp.where(is_first, positions, 0), axis=is_first.ndim - 1
+    )
+    group_last = jax.lax.cummin(
+        jnp.where(is_last, positions, num_pooled - 1),
+        axis=is_last.ndim - 1,
+        reverse=True,
+    )
+    twice_wins = jnp.take_along_axis(
+        counts, group_first[..., jnp.newaxis], axis=-2
+    ) + jnp.take_along_axis(counts, group_last[..., jnp.newaxis] + 1, axis=-2)
+
+    # Sum the wins of the runs of every algorithm with a masked sum, as a
+    # batched matmul here is miscompiled by XLA on CPU for some shapes.
+    sorted_labels = labels[order][..., jnp.newaxis]
+    u_statistics = (
+        jnp.stack(
+            [
+                jnp.sum(jnp.where(sorted_labels == algorithm, twice_wins, 0), axis=-2)
+                for algorithm in range(num_algorithms)
+            ],
+            axis=-2,
+        )
+        / 2
+    )
+    task_probabilities = u_statistics / np.outer(num_runs, num_runs)
+    return jnp.mean(task_probabilities, axis=-3)
+
+
+def probability_of_improvement(scores_x: jax.Array, scores_y: jax.Array) -> jax.Array:
+    """Probability that algorithm X improves over algorithm Y."""
+    return probability_of_improvement_matrix(scores_x, scores_y)[..., 0, 1]
+
+
+def score_distribution(scores: jax.Array, taus: jax.Array) -> jax.Array:
+    """Fraction of runs over all tasks with a score above every threshold.
+
+    The scores of every replication are sorted once and all thresholds are
+    located in them with a vectorized `jnp.searchsorted`.
+    """
+    flat_scores = jnp.sort(scores.reshape(-1, scores.shape[-2] * scores.shape[-1]))
+    num_scores = flat_scores.shape[-1]
+    num_below = jax.vmap(functools.partial(jnp.searchsorted, v=taus, side="right"))(
+        flat_scores
+    )
+    distribution = (num_scores - num_below) / num_scores
+    return distribution.reshape(*scores.shape[:-2], -1)
+
+
+# JAX version of every supported aggregate of `marl_eval.utils.metrics_utils`.
+_JAX_AGGREGATES: Dict[Callable, Callable] = {
+    metrics_utils.aggregate_mean: aggregate_mean,
+    metrics_utils.aggregate_median: aggregate_median,
+    metrics_utils.aggregate_iqm: aggregate_iqm,
+    metrics_utils.aggregate_iqm_over_frames: aggregate_iqm_over_frames,
+    metrics_utils.aggregate_run_means: aggregate_run_means,
+    metrics_utils.aggregate_optimality_gap: aggregate_optimality_gap,
+    metrics_utils.aggregate_all: aggregate_all,
+    metrics_utils.aggregate_all_over_metrics: aggregate_all_over_metrics,
+    metrics_utils.probability_of_improvement_matrix: (
+        probability_of_improvement_matrix
+    ),
+    metrics_utils.probability_of_improvement: probability_of_improvement,
+    metrics_utils.score_distribution: score_distribution,
+}
+
+
+def _split_partial(
+    aggregate_func: Callable,
+) -> Tuple[Optional[Callable], Tuple, Dict[str, Any]]:
+    """Returns the JAX aggregate and bound arguments of a NumPy aggregate."""
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = {}
+    if isinstance(aggregate_func, functools.partial):
+        args, kwargs = aggregate_func.args, aggregate_func.keywords
+        aggregate_func = aggregate_func.func
+    return _JAX_AGGREGATES.get(aggregate_func), args, kwargs
+
+
+def is_supported(aggregate_func: Callable) -> bool:
+    """Whether a NumPy aggregate has a JAX version."""
+    return _split_partial(aggregate_func)[0] is not None
+
+
+@functools.partial(jax.jit, static_argnums=0)
+def _resample_and_aggregate(
+    aggregate_func: Callable,
+    scores: Tuple[jax.Array, ...],
+    run_indices: Tuple[jax.Array, ...],
+    args: Tuple,
+    kwargs: Dict[str, Any],
+) -> jax.Array:
+    """Gathers the resampled runs of every task and aggregates them."""
+    resampled = [
+        score[indices, jnp.arange(score.shape[1])]
+        for score, indices in zip(scores, run_indices)
+    ]
+    return aggregate_func(*resampled, *args, **kwargs)
+
+
+def aggregate_chunk(
+    aggregate_func: Callable,
+    scores: Sequence[np.ndarray],
+    run_indices: Sequence[np.ndarray],
+) -> np.ndarray:
+    """Aggregates a chunk of bootstrap replications with the JAX aggregate.
+
+    Args:
+        aggregate_func: supported NumPy aggregate, or a `functools.partial` of
+            one, whose JAX version is used.
+        scores: (runs, tasks, ...) arrays of scores.
+        run_indices: (reps, runs, tasks) arrays of run indices, one per score
+            array.
+
+    Returns:
+        A (reps, ...) array.
+    """
+    jax_func, args, kwargs = _split_partial(aggregate_func)
+    return np.asarray(
+        _resample_and_aggregate(
+            jax_func, tuple(scores), tuple(run_indices), args, kwargs
+        )
+    )
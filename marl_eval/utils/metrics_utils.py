@@ -0,0 +1,300 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batched versions of the rliable aggregate metrics.
+
+Every aggregate takes an array of shape (..., runs, tasks) and reduces the last
+two axes, so that all bootstrap replications of a chunk are aggregated in a
+single call. For a single (runs, tasks) matrix the results match the
+corresponding functions of `rliable.metrics`.
+"""
+
+import functools
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# Number of bytes of a float64 or int64 value.
+_ITEMSIZE = 8
+# Bytes held by the probability of improvement per pooled run and task: the
+# pooled and sorted scores, the sort order, ranks and bounds of the groups of
+# tied scores, and the int32 counts and wins.
+_RANK_BYTES_PER_SCORE = 48
+
+
+def aggregate_mean(scores: np.ndarray) -> np.ndarray:
+    """Mean over tasks of the per task mean scores."""
+    return np.mean(np.mean(scores, axis=-2), axis=-1)
+
+
+def aggregate_median(scores: np.ndarray) -> np.ndarray:
+    """Median over tasks of the per task mean scores."""
+    return np.median(np.mean(scores, axis=-2), axis=-1)
+
+
+def aggregate_iqm(scores: np.ndarray) -> np.ndarray:
+    """Interquartile mean over all runs and tasks.
+
+    Like `scipy.stats.trim_mean` with a proportion of 0.25, the lowest and highest
+    quarter of the scores are found with a single `np.partition` instead of a
+    full sort.
+    """
+    flat_scores = scores.reshape(*scores.shape[:-2], -1)
+    num_scores = flat_scores.shape[-1]
+    lowercut = int(0.25 * num_scores)
+    uppercut = num_scores - lowercut
+    partitioned = np.partition(flat_scores, (lowercut, uppercut - 1), axis=-1)
+    return np.mean(partitioned[..., lowercut:uppercut], axis=-1)
+
+
+def aggregate_iqm_over_frames(scores: np.ndarray) -> np.ndarray:
+    """Interquartile mean over all runs and tasks of every frame.
+
+    The frames are moved in front of the run and task axes, so that the trimmed
+    means of all frames (and replications) come from a single `np.partition`
+    along the flattened run x task axis.
+
+    Args:
+        scores: (..., runs, tasks, frames) array of scores.
+
+    Returns:
+        A (..., frames) array.
+    """
+    return aggregate_iqm(np.moveaxis(scores, -1, -3))
+
+
+def aggregate_run_means(scores: np.ndarray) -> np.ndarray:
+    """Mean over runs of the scores of every task and frame.
+
+    Unlike the other aggregates, the tasks are not reduced, e.g. to bootstrap
+    the mean over runs of the curves of several tasks and algorithms at once.
+
+    Args:
+        scores: (..., runs, tasks, frames) array of scores.
+
+    Returns:
+        A (..., tasks, frames) array.
+    """
+    return np.mean(scores, axis=-3)
+
+
+def aggregate_optimality_gap(scores: np.ndarray, gamma: float = 1) -> np.ndarray:
+    """Average shortfall of the scores below a target score `gamma`."""
+    return gamma - np.mean(np.minimum(scores, gamma), axis=(-2, -1))
+
+
+def aggregate_all(scores: np.ndarray) -> np.ndarray:
+    """Median, IQM, mean and optimality gap stacked on a new last axis."""
+    return np.stack(
+        [
+            aggregate_median(scores),
+            aggregate_iqm(scores),
+            aggregate_mean(scores),
+            aggregate_optimality_gap(scores),
+        ],
+        axis=-1,
+    )
+
+
+def aggregate_all_over_metrics(scores: np.ndarray) -> np.ndarray:
+    """Median, IQM, mean and optimality gap of every metric.
+
+    Args:
+        scores: (..., runs, tasks, metrics) array of scores.
+
+    Returns:
+        A (..., metrics, 4) array.
+    """
+    return aggregate_all(np.moveaxis(scores, -1, -3))
+
+
+def probability_of_improvement_matrix(*scores: np.ndarray) -> np.ndarray:
+    """Probability of improvement of every algorithm over every other algorithm.
+
+    For every task, the Mann-Whitney U statistic of algorithm X against
+    algorithm Y counts the pairs of runs where X scores higher than Y, with
+    ties counting as half. Instead of comparing all pairs of runs, the runs of
+    all algorithms are sorted together once per task. For every algorithm Y,
+    the number of its runs scoring below (or tied with) each run is then read
+    from int32 cumulative counts along the sorted order, and summed over the
+    runs of every algorithm X. This gives the statistics of all algorithm
+    pairs in O(n log n) per task, while only holding arrays of the size of the
+    pooled runs.
+
+    Args:
+        *scores: one (..., runs, tasks) array of scores per algorithm. The
+            number of runs may differ between algorithms.
+
+    Returns:
+        A (..., algorithms, algorithms) array whose [x, y] entry is
+        P(X > Y) + 0.5 * P(X = Y) averaged over tasks.
+    """
+    num_algorithms = len(scores)
+    num_runs = np.array([score.shape[-2] for score in scores])
+    run_starts = np.cumsum(num_runs) - num_runs
+    labels = np.repeat(
+        np.arange(num_algorithms, dtype=np.min_scalar_type(num_algorithms)), num_runs
+    )
+
+    # (..., tasks, pooled runs) scores sorted per task.
+    pooled = np.swapaxes(np.concatenate(scores, axis=-2), -1, -2)
+    num_pooled = pooled.shape[-1]
+    order = np.argsort(pooled, axis=-1, kind="stable")
+    sorted_scores = np.take_along_axis(pooled, order, axis=-1)
+    del pooled
+    sorted_labels = labels[order]
+    positions = np.arange(num_pooled)
+    # ranks[..., i] is the sorted position of the i-th pooled run.
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, positions, axis=-1)
+    del order
+
+    # The runs below and the runs below or tied with every run lie before the
+    # first and after the last sorted position of its group of tied scores.
+    is_first = np.ones(sorted_scores.shape, dtype=bool)
+    is_first[..., 1:] = sorted_scores[..., 1:] != sorted_scores[..., :-1]
+    if is_first.all():
+        group_first, group_end = ranks, ranks + 1
+    else:
+        is_last = np.ones(sorted_scores.shape, dtype=bool)
+        is_last[..., :-1] = is_first[..., 1:]
+        group_first = np.maximum.accumulate(np.where(is_first, positions, 0), axis=-1)
+        group_last = np.flip(
+            np.minimum.accumulate(
+                np.flip(np.where(is_last, positions, num_pooled - 1), axis=-1),
+                axis=-1,
+            ),
+            axis=-1,
+        )
+        group_first = np.take_along_axis(group_first, ranks, axis=-1)
+        group_end = np.take_along_axis(group_last, ranks, axis=-1) + 1
+        del is_last, group_last
+    del sorted_scores, is_first, ranks
+
+    # counts[..., k] is the number of runs of an algorithm in the first k
+    # sorted positions, reused for every algorithm.
+    counts = np.zeros((*sorted_labels.shape[:-1], num_pooled + 1), dtype=np.int32)
+    twice_wins = np.empty((*sorted_labels.shape[:-1], num_algorithms, num_algorithms))
+    for algorithm in range(num_algorithms):
+        np.cumsum(sorted_labels == algorithm, axis=-1, out=counts[..., 1:])
+        # Twice the wins of every run against the algorithm, with ties counting
+        # as half, summed over the runs of every algorithm.
+        wins = np.take_along_axis(counts, group_first, axis=-1)
+        wins += np.take_along_axis(counts, group_end, axis=-1)
+        twice_wins[..., algorithm] = np.add.reduceat(
+            wins, run_starts, axis=-1, dtype=np.int64
+        )
+
+    task_probabilities = twice_wins / (2 * np.outer(num_runs, num_runs))
+    return np.mean(task_probabilities, axis=-3)
+
+
+def probability_of_improvement(
+    scores_x: np.ndarray, scores_y: np.ndarray
+) -> np.ndarray:
+    """Probability that algorithm X improves over algorithm Y, averaged over tasks.
+
+    Args:
+        scores_x: (..., runs_x, tasks) array of scores of algorithm X.
+        scores_y: (..., runs_y, tasks) array of scores of algorithm Y.
+    """
+    return probability_of_improvement_matrix(scores_x, scores_y)[..., 0, 1]
+
+
+def score_distribution(scores: np.ndarray, taus: np.ndarray) -> np.ndarray:
+    """Fraction of runs over all tasks with a score above every threshold.
+
+    Rather than comparing every score with every threshold, each score is
+    located in the sorted thresholds with `np.searchsorted`, which gives the
+    number of thresholds it exceeds. The number of scores above every threshold
+    then follows from a histogram of these positions, so the cost grows as
+    O(n log k + k) per replication for n scores and k thresholds.
+
+    Args:
+        scores: (..., runs, tasks) array of scores.
+        taus: 1D array of thresholds.
+
+    Returns:
+        A (..., thresholds) array.
+    """
+    taus = np.asarray(taus)
+    order = np.argsort(taus, kind="stable")
+    flat_scores = scores.reshape(-1, scores.shape[-2] * scores.shape[-1])
+    num_rows, num_scores = flat_scores.shape
+    num_taus = len(taus)
+
+    # positions[i, j] is the number of thresholds strictly below score j.
+    positions = np.searchsorted(taus[order], flat_scores, side="left")
+    offsets = np.arange(num_rows)[:, np.newaxis] * (num_taus + 1)
+    histogram = np.bincount(
+        (positions + offsets).ravel(), minlength=num_rows * (num_taus + 1)
+    ).reshape(num_rows, num_taus + 1)
+    # Scores above the k-th sorted threshold lie in positions k + 1 and higher.
+    num_above = np.cumsum(histogram[:, :0:-1], axis=-1)[:, ::-1]
+
+    distribution = np.empty((num_rows, num_taus))
+    distribution[:, order] = num_above / num_scores
+    return distribution.reshape(*scores.shape[:-2], num_taus)
+
+
+def working_set_nbytes(
+    aggregate_func: Callable[..., np.ndarray], *shapes: Tuple[int, ...]
+) -> Optional[int]:
+    """Estimated number of bytes an aggregate holds at once per replication.
+
+    The estimate covers the temporaries and the result of the aggregate, but
+    not the resampled scores it is given. It is an upper bound of the memory
+    measured with `tracemalloc`, up to fixed overheads.
+
+    Args:
+        aggregate_func: aggregate of this module, possibly with arguments bound
+            by `functools.partial`.
+        *shapes: (runs, tasks, ...) shape of every score array of a
+            replication.
+
+    Returns:
+        The estimate in bytes, or None if the aggregate is not of this module.
+    """
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = {}
+    if isinstance(aggregate_func, functools.partial):
+        args, kwargs = aggregate_func.args, aggregate_func.keywords
+        aggregate_func = aggregate_func.func
+    num_runs, num_tasks = shapes[0][:2]
+    size = int(np.prod(shapes[0]))
+
+    if aggregate_func in [aggregate_mean, aggregate_median, aggregate_run_means]:
+        return 2 * _ITEMSIZE * size // num_runs
+    if aggregate_func in [aggregate_iqm, aggregate_optimality_gap, aggregate_all]:
+        # A partitioned or clipped copy of the scores, and its reductions.
+        return 2 * _ITEMSIZE * size
+    if aggregate_func in [aggregate_iqm_over_frames, aggregate_all_over_metrics]:
+        # Transposed and partitioned copies of the scores.
+        return 2 * _ITEMSIZE * size
+    if aggregate_func in [
+        probability_of_improvement,
+        probability_of_improvement_matrix,
+    ]:
+        num_pooled = sum(shape[0] for shape in shapes)
+        num_algorithms = len(shapes)
+        return num_tasks * (
+            _RANK_BYTES_PER_SCORE * num_pooled + 2 * _ITEMSIZE * num_algorithms**2
+        )
+    if aggregate_func is score_distribution:
+        taus = kwargs["taus"] if "taus" in kwargs else args[0]
+        # The positions of the scores in the thresholds and their offsets, and
+        # the histogram, counts and fractions of every threshold.
+        return _ITEMSIZE * (2 * size + 4 * (len(taus) + 1))
+    return None
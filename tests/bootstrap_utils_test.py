@@ -0,0 +1,514 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the vectorized bootstrap and the batched aggregate metrics"""
+
+import functools
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+import numpy as np
+import pytest
+from rliable import library as rly
+from rliable import metrics
+
+from marl_eval.utils import metrics_utils
+from marl_eval.utils.bootstrap_utils import BootstrapContext, get_interval_estimates
+
+
+@pytest.fixture
+def score_dict() -> Dict[str, np.ndarray]:
+    """Fixture for (runs, tasks) score matrices of three algorithms."""
+    rng = np.random.default_rng(0)
+    return {f"algo_{i}": rng.random((10, 7)) for i in range(3)}
+
+
+@pytest.mark.parametrize(
+    "batched_func, rliable_func",
+    [
+        (metrics_utils.aggregate_mean, metrics.aggregate_mean),
+        (metrics_utils.aggregate_median, metrics.aggregate_median),
+        (metrics_utils.aggregate_iqm, metrics.aggregate_iqm),
+        (metrics_utils.aggregate_optimality_gap, metrics.aggregate_optimality_gap),
+        (
+            lambda x: metrics_utils.score_distribution(x, np.linspace(0, 1, 11)),
+            lambda x: rly.score_distributions(x, np.linspace(0, 1, 11)),
+        ),
+    ],
+)
+def test_batched_aggregates(
+    score_dict: Dict[str, np.ndarray], batched_func, rliable_func  # type: ignore
+) -> None:
+    """Tests that the batched aggregates match rliable for every batch element."""
+
+    batch = np.stack(list(score_dict.values()))
+    expected = [rliable_func(scores) for scores in score_dict.values()]
+
+    np.testing.assert_allclose(batched_func(batch), expected, rtol=1e-12)
+
+
+def test_interval_estimates_match_rliable(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests that point estimates match rliable and intervals agree within \
+        Monte Carlo error."""
+
+    rliable_func = lambda x: np.array(  # noqa: E731
+        [
+            metrics.aggregate_median(x),
+            metrics.aggregate_iqm(x),
+            metrics.aggregate_mean(x),
+            metrics.aggregate_optimality_gap(x),
+        ]
+    )
+    expected_points, expected_cis = rly.get_interval_estimates(
+        score_dict, rliable_func, reps=2000
+    )
+    points, cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=2000, seed=0
+    )
+
+    for algorithm in score_dict:
+        np.testing.assert_allclose(points[algorithm], expected_points[algorithm])
+        assert cis[algorithm].shape == (2, 4)
+        np.testing.assert_allclose(
+            cis[algorithm], expected_cis[algorithm], rtol=0.0, atol=0.02
+        )
+
+
+def test_interval_estimates_seed(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests that interval estimates are reproducible for a given seed."""
+
+    _, cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_iqm, reps=1200, seed=42
+    )
+    _, cis_same_seed = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_iqm, reps=1200, seed=42
+    )
+    _, cis_other_seed = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_iqm, reps=1200, seed=43
+    )
+
+    for algorithm in score_dict:
+        np.testing.assert_array_equal(cis[algorithm], cis_same_seed[algorithm])
+        assert not np.array_equal(cis[algorithm], cis_other_seed[algorithm])
+
+
+def test_probability_of_improvement(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests that the batched probability of improvement matches rliable."""
+
+    scores_x, scores_y = score_dict["algo_0"], score_dict["algo_1"][:8]
+    # Ties count as half an improvement.
+    scores_y[0] = scores_x[0]
+
+    np.testing.assert_allclose(
+        metrics_utils.probability_of_improvement(
+            scores_x[np.newaxis], scores_y[np.newaxis]
+        ),
+        [metrics.probability_of_improvement(scores_x, scores_y)],
+        rtol=1e-12,
+    )
+    np.testing.assert_allclose(
+        metrics_utils.probability_of_improvement(scores_x, scores_x), 0.5
+    )
+
+
+@pytest.mark.parametrize("memory_budget", [1, 50_000, 2**30])
+def test_interval_estimates_memory_budget(
+    score_dict: Dict[str, np.ndarray], memory_budget: int
+) -> None:
+    """Tests that the memory budget bounds the chunks without changing results."""
+
+    paired_scores = {"pair": (score_dict["algo_0"], score_dict["algo_1"])}
+    _, expected_cis = get_interval_estimates(
+        paired_scores, metrics_utils.probability_of_improvement, reps=1100, seed=0
+    )
+    _, cis, report = get_interval_estimates(
+        paired_scores,
+        metrics_utils.probability_of_improvement,
+        reps=1100,
+        seed=0,
+        memory_budget=memory_budget,
+        return_report=True,
+    )
+
+    np.testing.assert_array_equal(cis["pair"], expected_cis["pair"])
+    assert report["reps"] == {"pair": 1100}
+    assert report["peak_memory"] > 0
+    if memory_budget == 1:
+        assert report["chunk_reps"]["pair"] == 1
+
+
+@pytest.mark.parametrize(
+    "aggregate_func, num_algorithms, shape",
+    [
+        (metrics_utils.aggregate_all, 1, (30, 100)),
+        (metrics_utils.aggregate_iqm_over_frames, 1, (10, 20, 50)),
+        (
+            functools.partial(
+                metrics_utils.score_distribution, taus=np.linspace(0, 1, 2000)
+            ),
+            1,
+            (30, 100),
+        ),
+        (metrics_utils.probability_of_improvement, 2, (30, 100)),
+        (metrics_utils.probability_of_improvement_matrix, 15, (10, 50)),
+    ],
+)
+def test_interval_estimates_memory_budget_measured(
+    aggregate_func, num_algorithms: int, shape: Tuple[int, ...]  # type: ignore
+) -> None:
+    """Tests the memory budget against the memory allocated by the bootstrap."""
+
+    rng = np.random.default_rng(0)
+    # Rounded scores, so that the probability of improvement handles ties.
+    scores = tuple(np.round(rng.random(shape), 2) for _ in range(num_algorithms))
+    score_dict = {"scores": scores if num_algorithms > 1 else scores[0]}
+    memory_budget = 5 * 2**20
+
+    tracemalloc.start()
+    try:
+        _, _, report = get_interval_estimates(
+            score_dict,
+            aggregate_func,
+            reps=500,
+            seed=0,
+            memory_budget=memory_budget,
+            return_report=True,
+        )
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Besides the chunks, the bootstrap keeps the replications, which are
+    # concatenated and copied for the percentiles, and fixed overheads.
+    replications_nbytes = (
+        500 * aggregate_func(*(score[np.newaxis] for score in scores)).nbytes
+    )
+    assert 1 < report["chunk_reps"]["scores"] < 500
+    assert peak_memory <= memory_budget + 3 * replications_nbytes + 2**20
+
+
+@pytest.mark.parametrize(
+    "aggregate_func, num_algorithms, shape",
+    [
+        (metrics_utils.aggregate_mean, 1, (30, 100)),
+        (metrics_utils.aggregate_median, 1, (30, 100)),
+        (metrics_utils.aggregate_iqm, 1, (30, 100)),
+        (metrics_utils.aggregate_optimality_gap, 1, (30, 100)),
+        (metrics_utils.aggregate_all, 1, (30, 100)),
+        (metrics_utils.aggregate_iqm_over_frames, 1, (10, 20, 50)),
+        (metrics_utils.aggregate_run_means, 1, (10, 20, 50)),
+        (metrics_utils.aggregate_all_over_metrics, 1, (30, 100, 3)),
+        (
+            functools.partial(
+                metrics_utils.score_distribution, taus=np.linspace(0, 1, 2000)
+            ),
+            1,
+            (30, 100),
+        ),
+        (metrics_utils.probability_of_improvement, 2, (30, 100)),
+        (metrics_utils.probability_of_improvement_matrix, 15, (10, 50)),
+    ],
+)
+def test_working_set_nbytes(
+    aggregate_func, num_algorithms: int, shape: Tuple[int, ...]  # type: ignore
+) -> None:
+    """Tests the working set estimates against the memory used by the aggregates."""
+
+    rng = np.random.default_rng(0)
+    reps = 50
+    resampled = [np.round(rng.random((reps, *shape)), 2) for _ in range(num_algorithms)]
+
+    tracemalloc.start()
+    try:
+        aggregate_func(*resampled)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    working_set = metrics_utils.working_set_nbytes(
+        aggregate_func, *([shape] * num_algorithms)
+    )
+    # Up to fixed overheads, such as the buffers of the numpy reductions.
+    assert peak_memory <= reps * working_set + 2**16
+    assert metrics_utils.working_set_nbytes(lambda x: x, shape) is None
+
+
+def test_interval_estimates_memory_budget_threads(
+    score_dict: Dict[str, np.ndarray]
+) -> None:
+    """Tests that concurrent bootstraps with a memory budget use the same chunks."""
+
+    def bootstrap(seed: int) -> Dict[str, int]:
+        """Chunk sizes of a bootstrap with a memory budget."""
+        _, _, report = get_interval_estimates(
+            score_dict,
+            metrics_utils.aggregate_all,
+            reps=600,
+            seed=seed,
+            memory_budget=50_000,
+            return_report=True,
+        )
+        return report["chunk_reps"]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        chunk_reps = list(executor.map(bootstrap, range(8)))
+
+    assert all(reps == chunk_reps[0] for reps in chunk_reps)
+
+
+def test_interval_estimates_workers(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests that the results do not depend on the number of workers."""
+
+    _, expected_cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=1100, seed=0
+    )
+    _, cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=1100, seed=0, workers=2
+    )
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        _, executor_cis = get_interval_estimates(
+            score_dict,
+            metrics_utils.aggregate_all,
+            reps=1100,
+            seed=0,
+            memory_budget=100_000,
+            executor=executor,
+        )
+
+    for algorithm in score_dict:
+        np.testing.assert_array_equal(cis[algorithm], expected_cis[algorithm])
+        np.testing.assert_array_equal(executor_cis[algorithm], expected_cis[algorithm])
+
+
+def test_aggregate_iqm_over_frames() -> None:
+    """Tests that the IQM over frames matches rliable's IQM of every frame."""
+
+    scores = np.random.default_rng(0).random((2, 10, 7, 5))
+    expected = [
+        [metrics.aggregate_iqm(rep_scores[..., frame]) for frame in range(5)]
+        for rep_scores in scores
+    ]
+
+    np.testing.assert_allclose(
+        metrics_utils.aggregate_iqm_over_frames(scores), expected, rtol=1e-12
+    )
+
+
+def test_probability_of_improvement_matrix(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests that the all-pairs probability of improvement matches rliable."""
+
+    scores = list(score_dict.values())
+    scores[1] = np.round(scores[1][:6], 1)
+    # Ties within and between algorithms count as half an improvement.
+    scores[2] = np.round(scores[2], 1)
+    scores[2][:3] = scores[1][:3]
+
+    expected = [
+        [metrics.probability_of_improvement(scores_x, scores_y) for scores_y in scores]
+        for scores_x in scores
+    ]
+
+    np.testing.assert_allclose(
+        metrics_utils.probability_of_improvement_matrix(*scores), expected, rtol=1e-12
+    )
+
+
+def test_score_distribution_taus(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests the score distribution on unsorted and fine threshold grids."""
+
+    scores = np.round(score_dict["algo_0"], 1)
+    for taus in [np.random.default_rng(0).random(25), np.linspace(0, 1, 2001)]:
+        np.testing.assert_allclose(
+            metrics_utils.score_distribution(scores, taus),
+            rly.score_distributions(scores, taus),
+            rtol=1e-12,
+        )
+
+
+def test_bootstrap_context(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests that a bootstrap context shares its resamples between estimates."""
+
+    context = BootstrapContext(seed=0)
+    _, cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=700, context=context
+    )
+    nbytes = context.nbytes
+    _, mean_cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_mean, reps=700, context=context
+    )
+    _, worker_cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=700, context=context, workers=2
+    )
+    _, new_context_cis = get_interval_estimates(
+        score_dict,
+        metrics_utils.aggregate_all,
+        reps=700,
+        memory_budget=50_000,
+        context=BootstrapContext(seed=0),
+    )
+
+    # Later estimates reuse the cached indices, so metrics agree across calls.
+    assert context.nbytes == nbytes
+    for algorithm in score_dict:
+        np.testing.assert_array_equal(cis[algorithm][:, 2], mean_cis[algorithm])
+        np.testing.assert_array_equal(cis[algorithm], worker_cis[algorithm])
+        np.testing.assert_array_equal(cis[algorithm], new_context_cis[algorithm])
+
+    # Fewer reps use the first indices, and every score array of a tuple is
+    # resampled from its own stream.
+    indices = context.run_indices(10, 7, 0, 700)
+    np.testing.assert_array_equal(context.run_indices(10, 7, 0, 20)[0], indices[0][:20])
+    assert not np.array_equal(context.run_indices(10, 7, 1, 700)[0], indices[0])
+
+
+def test_interval_estimates_adaptive(score_dict: Dict[str, np.ndarray]) -> None:
+    """Tests that the adaptive bootstrap stops once within the tolerance."""
+
+    _, cis, report = get_interval_estimates(
+        score_dict,
+        metrics_utils.aggregate_iqm,
+        reps=1000,
+        seed=0,
+        return_report=True,
+        tolerance=2e-3,
+        max_reps=16000,
+    )
+
+    for algorithm in score_dict:
+        reps = report["reps"][algorithm]
+        assert reps in [2000, 4000, 8000, 16000]
+        assert reps == 16000 or np.all(report["standard_error"][algorithm] <= 2e-3)
+        # Adaptive runs only append replications to those of a fixed run.
+        _, expected_cis = get_interval_estimates(
+            score_dict,
+            metrics_utils.aggregate_iqm,
+            reps=reps,
+            seed=0,
+        )
+        np.testing.assert_array_equal(cis[algorithm], expected_cis[algorithm])
+
+    _, _, report = get_interval_estimates(
+        score_dict,
+        metrics_utils.aggregate_iqm,
+        reps=1000,
+        seed=0,
+        return_report=True,
+        tolerance=1.0,
+    )
+    assert report["reps"] == {algorithm: 2000 for algorithm in score_dict}
+
+
+def test_aggregate_all_over_metrics() -> None:
+    """Tests that every metric is aggregated as on its own."""
+
+    scores = np.random.default_rng(0).random((2, 10, 7, 3))
+    expected = np.stack(
+        [metrics_utils.aggregate_all(scores[..., metric]) for metric in range(3)],
+        axis=-2,
+    )
+
+    np.testing.assert_allclose(
+        metrics_utils.aggregate_all_over_metrics(scores), expected, rtol=1e-12
+    )
+
+
+def test_bootstrap_context_interval_estimates(
+    score_dict: Dict[str, np.ndarray], capsys: pytest.CaptureFixture
+) -> None:
+    """Tests that the interval estimates of a context apply its options."""
+
+    _, expected_cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=700, context=BootstrapContext(0)
+    )
+    _, cis = BootstrapContext(seed=0, workers=2).interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=700
+    )
+    _, expected_seed_cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=700, seed=0
+    )
+    context = BootstrapContext(seed=0, memory_budget=50_000, share_resamples=False)
+    _, seed_cis = context.interval_estimates(
+        score_dict, metrics_utils.aggregate_all, reps=700
+    )
+
+    for algorithm in score_dict:
+        np.testing.assert_array_equal(cis[algorithm], expected_cis[algorithm])
+        np.testing.assert_array_equal(seed_cis[algorithm], expected_seed_cis[algorithm])
+    # Without shared resamples, no indices are cached, and the memory used by
+    # the bootstrap is reported.
+    assert context.nbytes == 0
+    assert "Bootstrap with 700 replications" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "aggregate_func, paired",
+    [
+        (metrics_utils.aggregate_all, False),
+        (
+            functools.partial(
+                metrics_utils.score_distribution, taus=np.linspace(0, 1, 11)
+            ),
+            False,
+        ),
+        (metrics_utils.probability_of_improvement, True),
+        # Without a JAX version, the bootstrap falls back to numpy.
+        (
+            lambda x, y: metrics_utils.aggregate_mean(x)
+            - metrics_utils.aggregate_mean(y),
+            True,
+        ),
+    ],
+)
+def test_interval_estimates_jax_backend(
+    score_dict: Dict[str, np.ndarray], aggregate_func, paired: bool  # type: ignore
+) -> None:
+    """Tests that the jax backend matches the numpy backend."""
+
+    if paired:
+        # Different numbers of runs, with ties.
+        score_dict = {
+            "pair": (np.round(score_dict["algo_0"], 1), score_dict["algo_1"][:7])
+        }
+    _, expected_cis = get_interval_estimates(
+        score_dict, aggregate_func, reps=1000, seed=0
+    )
+    _, cis = get_interval_estimates(
+        score_dict, aggregate_func, reps=1000, seed=0, backend="jax"
+    )
+
+    for key in score_dict:
+        np.testing.assert_allclose(cis[key], expected_cis[key], rtol=0, atol=1e-5)
+
+
+def test_interval_estimates_jax_backend_workers(
+    score_dict: Dict[str, np.ndarray]
+) -> None:
+    """Tests that the spawned workers of the jax backend match the numpy backend."""
+
+    _, expected_cis = get_interval_estimates(
+        score_dict, metrics_utils.aggregate_mean, reps=1100, seed=0
+    )
+    _, cis = get_interval_estimates(
+        score_dict,
+        metrics_utils.aggregate_mean,
+        reps=1100,
+        seed=0,
+        workers=2,
+        backend="jax",
+    )
+
+    for key in score_dict:
+        np.testing.assert_allclose(cis[key], expected_cis[key], rtol=0, atol=1e-5)
@@ -0,0 +1,112 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the processed data cache"""
+
+import copy
+import json
+import os
+from typing import Any, Dict
+
+import jax
+import numpy as np
+import pytest
+from expected_test_data import expected_processed_data
+
+from marl_eval.utils.cache_utils import ProcessedDataCache
+from marl_eval.utils.data_processing_utils import (
+    create_matrices_for_rliable,
+    data_process_pipeline,
+)
+
+
+@pytest.fixture
+def raw_data() -> Dict[str, Dict[str, Any]]:
+    """Fixture for raw experiment data."""
+    with open("tests/mock_data_test.json") as f:
+        read_in_data = json.load(f)
+
+    return read_in_data
+
+
+@pytest.fixture
+def cache(tmp_path: Any) -> ProcessedDataCache:
+    """Fixture for an empty cache in a temporary directory."""
+    return ProcessedDataCache(cache_dir=str(tmp_path / "cache"))
+
+
+def test_cached_processed_data(cache: ProcessedDataCache) -> None:
+    """Tests that cold and warm loads match the data processing pipeline."""
+
+    for _ in range(2):
+        processed_data = cache.load_processed_data(
+            "tests/mock_data_test.json", metrics_to_normalize=["return"]
+        )
+        expected_data = copy.deepcopy(expected_processed_data)
+
+        assert processed_data.pop("extra") == expected_data.pop("extra")
+        jax.tree_util.tree_map(
+            lambda x, y: np.testing.assert_allclose(x, y, rtol=0.0, atol=0.0),
+            processed_data,
+            expected_data,
+        )
+    assert len(os.listdir(cache.cache_dir)) == 2  # Entry and file hashes.
+
+
+def test_cached_matrices_for_rliable(
+    cache: ProcessedDataCache, raw_data: Dict[str, Dict[str, Any]]
+) -> None:
+    """Tests that cached matrices match create_matrices_for_rliable."""
+
+    processed_data = data_process_pipeline(
+        raw_data=raw_data, metrics_to_normalize=["return"]
+    )
+    expected_matrices = create_matrices_for_rliable(
+        data_dictionary=processed_data,
+        environment_name="env_1",
+        metrics_to_normalize=["return"],
+    )
+
+    for _ in range(2):
+        matrices = cache.load_matrices_for_rliable(
+            "tests/mock_data_test.json",
+            environment_name="env_1",
+            metrics_to_normalize=["return"],
+        )
+        assert matrices[1]["extra"] == expected_matrices[1]["extra"]
+        jax.tree_util.tree_map(
+            np.testing.assert_array_equal,
+            (matrices[0], {k: v for k, v in matrices[1].items() if k != "extra"}),
+            (
+                expected_matrices[0],
+                {k: v for k, v in expected_matrices[1].items() if k != "extra"},
+            ),
+        )
+
+
+def test_cache_key_and_eviction(cache: ProcessedDataCache) -> None:
+    """Tests that entries depend on the inputs and that old entries are evicted."""
+
+    cache.load_experiment_tensors("tests/mock_data_test.json", ["return"])
+    cache.load_experiment_tensors("tests/mock_data_test.json", [])
+    assert len(cache._entry_paths()) == 2
+
+    entry_size = cache.size_bytes // 2
+    cache.max_size_bytes = entry_size
+    cache.load_matrices_for_rliable("tests/mock_data_test.json", "env_1", [])
+    assert cache.size_bytes <= entry_size
+
+    cache.clear()
+    assert cache.size_bytes == 0
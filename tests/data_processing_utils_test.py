@@ -15,6 +15,7 @@
 
 """Tests for data processing utils"""
 
+import copy
 import json
 from typing import Any, Dict
 
@@ -32,12 +33,17 @@ from expected_test_data import (
     sample_efficiency_matrix_expected_data_single_algorithm,
     sample_efficiency_matrix_expected_data_single_task,
 )
+from scipy import stats
 
+from marl_eval.utils.bootstrap_utils import BootstrapContext
 from marl_eval.utils.data_processing_utils import (
     check_comma_in_algo_names,
     create_matrices_for_rliable,
+    create_matrices_for_rliable_all_environments,
     data_process_pipeline,
+    get_and_aggregate_data_all_tasks,
     get_and_aggregate_data_single_task,
+    stream_data_process_pipeline,
 )
 
 
@@ -68,6 +74,92 @@ def test_data_processing_pipeline(processed_data: Dict[str, Dict[str, Any]]) ->
     assert processed_data == expected_processed_data
 
 
+def test_data_processing_pipeline_inplace(raw_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests that processing in place gives the same output without copies."""
+
+    processed_data = data_process_pipeline(
+        raw_data=raw_data, metrics_to_normalize=["return"], inplace=True
+    )
+
+    assert processed_data == expected_processed_data
+    # The raw dictionaries are annotated instead of being copied.
+    assert processed_data["env_1"]["task_1"] is raw_data["env_1"]["task_1"]
+
+
+def test_data_processing_pipeline_absolute_metrics_subset(
+    raw_data: Dict[str, Dict[str, Any]]
+) -> None:
+    """Tests that metrics missing from the absolute metrics step stay listed."""
+
+    for tasks in raw_data["env_1"].values():
+        for runs in tasks.values():
+            for steps in runs.values():
+                for step in steps.values():
+                    step["train_loss"] = [0.5]
+                steps["absolute_metrics"].pop("win_rate")
+                steps["absolute_metrics"].pop("train_loss")
+
+    processed_data = data_process_pipeline(
+        raw_data=raw_data, metrics_to_normalize=["return"]
+    )
+
+    assert processed_data["extra"]["metric_list"]["env_1"] == [
+        "return",
+        "win_rate",
+        "train_loss",
+        "mean_return",
+        "norm_return",
+        "mean_norm_return",
+        "mean_win_rate",
+        "mean_train_loss",
+    ]
+
+
+def test_data_processing_pipeline_summary_only(
+    raw_data: Dict[str, Dict[str, Any]]
+) -> None:
+    """Tests that summary only processing drops all per episode lists."""
+
+    processed_data = data_process_pipeline(
+        raw_data=raw_data, metrics_to_normalize=["return"], summary_only=True
+    )
+
+    step_data = processed_data["env_1"]["task_1"]["algo_1"]["43289"]["step_1"]
+    expected_step_data = expected_processed_data["env_1"]["task_1"]["algo_1"]["43289"][
+        "step_1"
+    ]
+    assert step_data == {
+        key: value
+        for key, value in expected_step_data.items()
+        if not isinstance(value, list)
+    }
+    # The raw data should not have been modified.
+    assert isinstance(
+        raw_data["env_1"]["task_1"]["algo_1"]["43289"]["STEP_1"]["return"], list
+    )
+
+
+def test_data_processing_pipeline_parallel(raw_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests that processing tasks in worker processes matches the serial output."""
+
+    processed_data = data_process_pipeline(
+        raw_data=raw_data, metrics_to_normalize=["return"], workers=2
+    )
+
+    assert processed_data == expected_processed_data
+
+
+def test_stream_data_processing_pipeline() -> None:
+    """Tests that processing a file one run at a time matches the \
+        in memory pipeline."""
+
+    processed_data = stream_data_process_pipeline(
+        file_path="tests/mock_data_test.json", metrics_to_normalize=["return"]
+    )
+
+    assert processed_data == expected_processed_data
+
+
 def test_matrices_for_rliable_full_environment_dataset(
     raw_data: Dict[str, Dict[str, Any]]
 ) -> None:
@@ -101,6 +193,34 @@ def test_matrices_for_rliable_full_environment_dataset(
     )
 
 
+@pytest.mark.parametrize("workers", [1, 2])
+def test_matrices_for_rliable_all_environments(
+    processed_data: Dict[str, Dict[str, Any]], workers: int
+) -> None:
+    """Tests that matrices for all environments match the single environment \
+        function and that the processed data is left untouched."""
+
+    processed_data_copy = copy.deepcopy(processed_data)
+    matrices = create_matrices_for_rliable_all_environments(
+        data_dictionary=processed_data,
+        metrics_to_normalize=["return"],
+        workers=workers,
+    )
+
+    assert list(matrices.keys()) == ["env_1"]
+    assert processed_data == processed_data_copy
+    for env, (m1, m2) in matrices.items():
+        expected_m1, expected_m2 = create_matrices_for_rliable(
+            data_dictionary=processed_data,
+            environment_name=env,
+            metrics_to_normalize=["return"],
+        )
+        assert m2.pop("extra") == expected_m2.pop("extra")
+        jax.tree_util.tree_map(
+            np.testing.assert_array_equal, (m1, m2), (expected_m1, expected_m2)
+        )
+
+
 def test_matrices_for_rliable_single_environment_task(
     raw_data: Dict[str, Dict[str, Any]]
 ) -> None:
@@ -264,3 +384,167 @@ def test_check_comma_in_algo_names(
 
     assert names_valid_output == names_valid
     assert names_output == returned_names
+
+
+def test_aggregate_data_all_tasks(processed_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests the aggregation of all tasks against a loop over the steps."""
+
+    all_tasks_data = get_and_aggregate_data_all_tasks(
+        processed_data=processed_data,
+        metric_names=["return", "win_rate"],
+        metrics_to_normalize=["return"],
+        environment_name="env_1",
+    )
+
+    assert list(all_tasks_data["return"]) == list(processed_data["env_1"])
+    metric_keys = {"return": "mean_norm_return", "win_rate": "mean_win_rate"}
+    expected_extra = {
+        **processed_data["extra"],
+        "evaluation_interval": processed_data["extra"]["evaluation_interval"]["env_1"],
+    }
+    for metric_name, tasks_data in all_tasks_data.items():
+        for task_name, task_data in tasks_data.items():
+            assert task_data.pop("extra") == expected_extra
+            assert list(task_data) == list(processed_data["env_1"][task_name])
+            for algorithm, runs in processed_data["env_1"][task_name].items():
+                means, cis = [], []
+                for step in ["step_1", "step_2", "step_3"]:
+                    values = [
+                        run_data[step][metric_keys[metric_name]]
+                        for run_data in runs.values()
+                    ]
+                    means.append(sum(values) / len(values))
+                    variance = sum((value - means[-1]) ** 2 for value in values) / (
+                        len(values) - 1
+                    )
+                    cis.append(1.959964 * (variance / len(values)) ** 0.5)
+
+                np.testing.assert_allclose(
+                    task_data[algorithm]["mean"], means, rtol=0.0, atol=1e-12
+                )
+                np.testing.assert_allclose(
+                    task_data[algorithm]["ci"], cis, rtol=1e-6, atol=1e-12
+                )
+
+
+def test_aggregate_data_all_tasks_own_runs(
+    processed_data: Dict[str, Dict[str, Any]]
+) -> None:
+    """Tests that every task and algorithm is aggregated over its own runs."""
+
+    # Other run labels in task_2, and an extra run of algo_1 in task_3.
+    task_2 = processed_data["env_1"]["task_2"]
+    for algorithm, runs in task_2.items():
+        task_2[algorithm] = {f"seed_{run}": data for run, data in runs.items()}
+    task_3_runs = processed_data["env_1"]["task_3"]["algo_1"]
+    extra_run = copy.deepcopy(next(iter(task_3_runs.values())))
+    extra_run["step_2"]["mean_win_rate"] = 1.0
+    task_3_runs["extra_seed"] = extra_run
+
+    all_tasks_data = get_and_aggregate_data_all_tasks(
+        processed_data=processed_data,
+        metric_names=["win_rate"],
+        metrics_to_normalize=["return"],
+        environment_name="env_1",
+    )
+
+    for task_name, task_data in processed_data["env_1"].items():
+        aggregated = all_tasks_data["win_rate"][task_name]
+        assert list(aggregated) == list(task_data) + ["extra"]
+        for algorithm, runs in task_data.items():
+            expected_means = [
+                np.mean([run[step]["mean_win_rate"] for run in runs.values()])
+                for step in ["step_1", "step_2", "step_3"]
+            ]
+            np.testing.assert_allclose(aggregated[algorithm]["mean"], expected_means)
+
+
+@pytest.mark.parametrize("ci_method", ["normal", "t", "bootstrap"])
+def test_single_task_ci_methods(
+    processed_data: Dict[str, Dict[str, Any]], ci_method: str
+) -> None:
+    """Tests the CI methods of the per task curves against per step references."""
+
+    all_tasks_data = get_and_aggregate_data_all_tasks(
+        processed_data=processed_data,
+        metric_names=["return"],
+        metrics_to_normalize=["return"],
+        environment_name="env_1",
+        ci_method=ci_method,
+        bootstrap_context=BootstrapContext(seed=0),
+    )
+
+    for task_name, task_data in all_tasks_data["return"].items():
+        for algorithm, runs in processed_data["env_1"][task_name].items():
+            first_run = next(iter(runs.values()))
+            steps = [step for step in first_run if "absolute" not in step]
+            run_values = np.array(
+                [
+                    [runs[run][step]["mean_norm_return"] for run in runs]
+                    for step in steps
+                ]
+            )
+            mean, ci = task_data[algorithm]["mean"], task_data[algorithm]["ci"]
+            np.testing.assert_allclose(mean, np.mean(run_values, axis=1))
+
+            if ci_method == "bootstrap":
+                lower, upper = (
+                    task_data[algorithm]["lower"],
+                    task_data[algorithm]["upper"],
+                )
+                assert np.all(lower <= mean + 1e-12) and np.all(mean <= upper + 1e-12)
+                assert np.all(lower >= np.min(run_values, axis=1))
+                np.testing.assert_allclose(ci, (upper - lower) / 2)
+            else:
+                interval = (stats.norm if ci_method == "normal" else stats.t).interval(
+                    0.95,
+                    *([len(runs) - 1] if ci_method == "t" else []),
+                    loc=np.mean(run_values, axis=1),
+                    scale=stats.sem(run_values, axis=1),
+                )
+                np.testing.assert_allclose(mean + ci, interval[1], atol=1e-12)
+
+
+@pytest.mark.parametrize("ci_method", ["normal", "t"])
+def test_single_task_ci_methods_single_run(
+    processed_data: Dict[str, Dict[str, Any]],
+    ci_method: str,
+    capsys: pytest.CaptureFixture,
+) -> None:
+    """Tests that the symmetric CIs of a single run have zero width."""
+
+    for task_data in processed_data["env_1"].values():
+        for algorithm, runs in task_data.items():
+            first_run = next(iter(runs))
+            task_data[algorithm] = {first_run: runs[first_run]}
+
+    task_data = get_and_aggregate_data_single_task(
+        processed_data=processed_data,
+        metric_name="return",
+        metrics_to_normalize=["return"],
+        environment_name="env_1",
+        task_name="task_1",
+        ci_method=ci_method,
+    )
+
+    for algorithm in processed_data["env_1"]["task_1"]:
+        np.testing.assert_array_equal(
+            task_data[algorithm]["ci"], np.zeros_like(task_data[algorithm]["mean"])
+        )
+    assert "zero width" in capsys.readouterr().out
+
+
+def test_single_task_unknown_ci_method(
+    processed_data: Dict[str, Dict[str, Any]]
+) -> None:
+    """Tests that an unknown CI method raises an error."""
+
+    with pytest.raises(ValueError):
+        get_and_aggregate_data_single_task(
+            processed_data=processed_data,
+            metric_name="return",
+            metrics_to_normalize=["return"],
+            environment_name="env_1",
+            task_name="task_1",
+            ci_method="wald",
+        )
@@ -1330,26 +1330,26 @@ expected_processed_data = {
 expected_single_task_ci_data_returns = {
     "algo_1": {
         "mean": [0.20833333333333334, 0.2222222222222222, 0.3472222222222222],
-        "ci": [0.04304211259673628, 0.03443369007738902, 0.025825267558041775],
+        "ci": [0.13610859491432656, 0.10888687593146121, 0.08166515694859587],
     },
     "algo_2": {
         "mean": [0.3194444444444445, 0.3194444444444444, 0.5138888888888888],
-        "ci": [0.14634318282890332, 0.04304211259673628, 0.008608422519347275],
+        "ci": [0.46276922270871024, 0.13610859491432648, 0.027221718982865333],
     },
     "algo_3": {
         "mean": [0.3888888888888889, 0.45833333333333337, 0.2222222222222222],
-        "ci": [0.20660214046433414, 0.21521056298368135, 0.017216845038694507],
+        "ci": [0.6533212555887674, 0.6805429745716326, 0.05444343796573063],
     },
 }
 
 expected_single_task_ci_data_win_rates = {
     "algo_1": {
         "mean": [0.30000000000000004, 0.44999999999999996, 0.5],
-        "ci": [0.061980642139300234, 0.09297096320895035, 0.18594192641790072],
+        "ci": [0.1959963984540054, 0.2939945976810081, 0.5879891953620162],
     },
     "algo_2": {
         "mean": [0.15000000000000002, 0.3, 0.3],
-        "ci": [0.030990321069650117, 0.0, 0.12396128427860047],
+        "ci": [0.0979981992270027, 0.0, 0.39199279690801075],
     },
-    "algo_3": {"mean": [0.3, 0.3, 0.25], "ci": [0.0, 0.0, 0.030990321069650106]},
+    "algo_3": {"mean": [0.3, 0.3, 0.25], "ci": [0.0, 0.0, 0.09799819922700267]},
 }
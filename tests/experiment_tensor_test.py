@@ -0,0 +1,221 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the ExperimentTensor data store"""
+
+import json
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from marl_eval.utils.data_processing_utils import data_process_pipeline
+from marl_eval.utils.experiment_tensor import (
+    BINARY_FORMAT_VERSION,
+    MISSING_LENGTH,
+    SCALAR_LENGTH,
+    ExperimentTensor,
+    convert_json_to_binary,
+    dict_to_experiment_tensors,
+    experiment_tensors_to_dict,
+    load_experiment_tensors,
+    save_experiment_tensors,
+)
+
+
+@pytest.fixture
+def raw_data() -> Dict[str, Dict[str, Any]]:
+    """Fixture for raw experiment data."""
+    with open("tests/mock_data_test.json") as f:
+        read_in_data = json.load(f)
+
+    return read_in_data
+
+
+def test_raw_data_round_trip(raw_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests that raw data survives a round trip through the tensor store."""
+
+    tensors = dict_to_experiment_tensors(raw_data)
+
+    assert experiment_tensors_to_dict(tensors) == raw_data
+
+
+def test_processed_data_round_trip(raw_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests that processed data survives a round trip through the tensor store."""
+
+    processed_data = data_process_pipeline(
+        raw_data=raw_data, metrics_to_normalize=["return"]
+    )
+    tensors = dict_to_experiment_tensors(processed_data)
+
+    assert (
+        experiment_tensors_to_dict(tensors, extra=processed_data["extra"])
+        == processed_data
+    )
+
+
+@pytest.fixture
+def irregular_data() -> Dict[str, Dict[str, Any]]:
+    """Fixture for environment data with booleans, empty steps and algorithms \
+        without runs, and runs with their own step order."""
+    return {
+        "task_1": {
+            "algo_1": {
+                "q": {
+                    "s2": {"solved": [True, False], "count": [1, 2], "return": [0.5]},
+                    "s1": {"solved": [True], "count": [3], "return": [1.5]},
+                    "empty": {},
+                },
+            },
+            "algo_2": {},
+        },
+        "task_2": {
+            "algo_1": {
+                "p": {"s1": {"solved": False, "count": 4, "return": 2.0}},
+            },
+        },
+    }
+
+
+def test_irregular_data_round_trip(
+    irregular_data: Dict[str, Dict[str, Any]], tmp_path: Any
+) -> None:
+    """Tests that value types, step order and empty entries survive round trips."""
+
+    tensor = ExperimentTensor.from_dict(irregular_data)
+    # Comparing the JSON strings also checks the value types and key order.
+    expected_json = json.dumps(irregular_data)
+
+    assert tensor["solved"].dtype == np.bool_
+    assert tensor["count"].dtype == np.int64
+    assert json.dumps(tensor.to_dict()) == expected_json
+
+    save_experiment_tensors({"env_1": tensor}, str(tmp_path))
+    loaded_tensors, _ = load_experiment_tensors(str(tmp_path))
+    assert json.dumps(loaded_tensors["env_1"].to_dict()) == expected_json
+
+
+def test_mixed_types_normalisation() -> None:
+    """Tests that a metric mixing integers and floats comes back as floats."""
+
+    environment_data = {"task_1": {"algo_1": {"r": {"s1": {"return": [1, 2.5]}}}}}
+
+    round_trip = ExperimentTensor.from_dict(environment_data).to_dict()
+
+    assert json.dumps(round_trip) == json.dumps(
+        {"task_1": {"algo_1": {"r": {"s1": {"return": [1.0, 2.5]}}}}}
+    )
+
+
+def test_tensor_layout(raw_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests the shapes, padding and lengths of the dense arrays."""
+
+    tensor = ExperimentTensor.from_dict(raw_data["env_1"])
+
+    assert tensor.tasks == ["task_1", "task_2", "task_3"]
+    assert tensor.algorithms == ["algo_1", "algo_2", "algo_3"]
+    assert tensor.steps == ["STEP_1", "STEP_2", "STEP_3", "absolute_metrics"]
+    assert tensor.run_labels("task_1", "algo_1") == ["43289", "42"]
+    # The absolute metrics hold 8 episodes while all other steps hold 4.
+    assert tensor["return"].shape == (3, 3, 2, 4, 8)
+    assert tensor["return"].dtype == np.int64
+    assert tensor["win_rate"].dtype == np.float64
+
+    absolute_idx = tensor.step_index["absolute_metrics"]
+    assert tensor.lengths["return"][0, 0, 0, 0] == 4
+    assert tensor.lengths["return"][0, 0, 0, absolute_idx] == 8
+    assert tensor.lengths["step_count"][0, 0, 0, 0] == SCALAR_LENGTH
+    assert tensor.lengths["step_count"][0, 0, 0, absolute_idx] == MISSING_LENGTH
+
+    np.testing.assert_allclose(tensor.mean("return")[0, 0, 0, 0], 2.5)
+    assert np.isnan(tensor.mean("step_count")[0, 0, 0, absolute_idx])
+
+
+def test_reduced_precision(raw_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests that a custom dtype is used for every metric."""
+
+    tensor = ExperimentTensor.from_dict(raw_data["env_1"], dtype=np.float32)
+
+    assert all(tensor[metric].dtype == np.float32 for metric in tensor.metric_names)
+    # Small integers are represented exactly in float32.
+    step_data = tensor.to_dict()["task_1"]["algo_1"]["43289"]["STEP_1"]
+    assert step_data["return"] == [1, 2, 3, 4]
+    assert step_data["step_count"] == 10006
+
+
+def test_binary_format_round_trip(
+    raw_data: Dict[str, Dict[str, Any]], tmp_path: Any
+) -> None:
+    """Tests that processed data survives a round trip through the binary format."""
+
+    processed_data = data_process_pipeline(
+        raw_data=raw_data, metrics_to_normalize=["return"]
+    )
+    tensors = dict_to_experiment_tensors(processed_data)
+    save_experiment_tensors(tensors, str(tmp_path), extra=processed_data["extra"])
+
+    loaded_tensors, extra = load_experiment_tensors(str(tmp_path))
+
+    assert isinstance(loaded_tensors["env_1"]["return"], np.memmap)
+    assert experiment_tensors_to_dict(loaded_tensors, extra=extra) == processed_data
+
+
+def test_binary_format_version(
+    raw_data: Dict[str, Dict[str, Any]], tmp_path: Any
+) -> None:
+    """Tests that archives of another format version are rejected."""
+
+    save_experiment_tensors(dict_to_experiment_tensors(raw_data), str(tmp_path))
+    with open(tmp_path / "index.json") as f:
+        index = json.load(f)
+    index["format_version"] = BINARY_FORMAT_VERSION + 1
+    with open(tmp_path / "index.json", "w") as f:
+        json.dump(index, f)
+
+    with pytest.raises(ValueError, match="format version"):
+        load_experiment_tensors(str(tmp_path))
+
+
+def test_tensor_slices(raw_data: Dict[str, Dict[str, Any]], tmp_path: Any) -> None:
+    """Tests that slices of a memory-mapped tensor are views of its arrays."""
+
+    save_experiment_tensors(dict_to_experiment_tensors(raw_data), str(tmp_path))
+    tensor = load_experiment_tensors(str(tmp_path))[0]["env_1"]
+
+    values, lengths = tensor.get("return", task="task_2", algorithm="algo_3")
+    assert isinstance(values, np.memmap) and isinstance(lengths, np.memmap)
+    np.testing.assert_array_equal(values, tensor["return"][1, 2])
+    np.testing.assert_array_equal(lengths, tensor.lengths["return"][1, 2])
+    assert tensor.get("return", algorithm="algo_3")[0].shape == (3, 2, 4, 8)
+
+    np.testing.assert_array_equal(
+        tensor.mean("return", task="task_2"), tensor.mean("return")[1]
+    )
+    np.testing.assert_array_equal(
+        tensor.mask("return", algorithm="algo_1"), tensor.mask("return")[:, 0]
+    )
+
+
+def test_convert_json_to_binary(
+    raw_data: Dict[str, Dict[str, Any]], tmp_path: Any
+) -> None:
+    """Tests the conversion of a raw JSON file to the binary format."""
+
+    convert_json_to_binary("tests/mock_data_test.json", str(tmp_path))
+
+    tensors, extra = load_experiment_tensors(str(tmp_path), mmap_mode=None)
+
+    assert extra is None
+    assert experiment_tensors_to_dict(tensors) == raw_data
@@ -0,0 +1,111 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests that importing marl_eval is fast and does not load heavy dependencies"""
+
+import json
+import subprocess
+import sys
+from typing import Tuple
+
+import pytest
+
+MODULES = [
+    "marl_eval",
+    "marl_eval.json_tools",
+    "marl_eval.utils.data_processing_utils",
+    "marl_eval.utils.cache_utils",
+    "marl_eval.plotting_tools.plotting",
+    "marl_eval.plotting_tools.report",
+]
+
+HEAVY_DEPENDENCIES = [
+    "colorcet",
+    "jax",
+    "matplotlib",
+    "neptune",
+    "pandas",
+    "rliable",
+    "scipy",
+    "seaborn",
+]
+
+# Bound on the import time of a module relative to the import time of numpy in
+# the same interpreter. Importing pandas, jax, matplotlib.pyplot or scipy.stats
+# alone takes from 2.5 to 9 times longer than numpy.
+IMPORT_TIME_RATIO = 2.0
+# Number of timed imports, of which the fastest is kept to ignore load spikes.
+IMPORT_TIME_ATTEMPTS = 3
+
+_IMPORT_SCRIPT = """
+import json
+import sys
+
+import {module}
+loaded = sorted({{name.split(".")[0] for name in sys.modules}})
+print(json.dumps(loaded))
+"""
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_is_lazy(module: str) -> None:
+    """Tests that a module imports without its heavy dependencies."""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SCRIPT.format(module=module)],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    loaded = json.loads(output.splitlines()[-1])
+
+    assert not set(HEAVY_DEPENDENCIES) & set(loaded)
+
+
+def _import_times(module: str) -> Tuple[int, int]:
+    """Import times in microseconds of numpy and then of a module.
+
+    The times come from `python -X importtime`, where the packages imported by
+    a statement are the top level entries that follow those of the previous
+    statements.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import numpy; import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nested imports are indented by more than the separating space.
+        if name[1:] == name.strip():
+            top_level.append((name.strip(), int(cumulative)))
+    names = [name for name, _ in top_level]
+    numpy_position = names.index("numpy")
+    module_time = sum(cumulative for _, cumulative in top_level[numpy_position + 1 :])
+    return top_level[numpy_position][1], module_time
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_time(module: str) -> None:
+    """Tests that a module imports in a time comparable to numpy."""
+    ratios = []
+    for _ in range(IMPORT_TIME_ATTEMPTS):
+        numpy_time, module_time = _import_times(module)
+        ratios.append(module_time / numpy_time)
+
+    assert min(ratios) < IMPORT_TIME_RATIO
@@ -0,0 +1,111 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for incremental data processing"""
+
+import copy
+import json
+from typing import Any, Dict
+
+import jax
+import numpy as np
+import pytest
+from expected_test_data import expected_processed_data
+
+from marl_eval.utils.incremental_processing import IncrementalDataProcessor
+
+
+@pytest.fixture
+def raw_data() -> Dict[str, Dict[str, Any]]:
+    """Fixture for raw experiment data."""
+    with open("tests/mock_data_test.json") as f:
+        read_in_data = json.load(f)
+
+    return read_in_data
+
+
+def _split_runs(raw_data: Dict[str, Dict[str, Any]], run_idx: int) -> Dict:
+    """Keep a single run of every algorithm and task."""
+    split_data = copy.deepcopy(raw_data)
+    for env, tasks in raw_data.items():
+        for task, algorithms in tasks.items():
+            for algorithm, runs in algorithms.items():
+                run = list(runs.keys())[run_idx]
+                split_data[env][task][algorithm] = {run: runs[run]}
+    return split_data
+
+
+def test_incremental_processing(raw_data: Dict[str, Dict[str, Any]]) -> None:
+    """Tests that adding runs one at a time matches processing all runs at once."""
+
+    processor = IncrementalDataProcessor(metrics_to_normalize=["return"])
+    processor.update(_split_runs(raw_data, 0))
+    processed_data = copy.deepcopy(processor.update(_split_runs(raw_data, 1)))
+    expected_data = copy.deepcopy(expected_processed_data)
+
+    assert processed_data.pop("extra") == expected_data.pop("extra")
+    jax.tree_util.tree_map(
+        lambda x, y: np.testing.assert_allclose(x, y, rtol=0.0, atol=1e-12),
+        processed_data,
+        expected_data,
+    )
+
+
+def test_incremental_processing_existing_run(
+    raw_data: Dict[str, Dict[str, Any]]
+) -> None:
+    """Tests that runs cannot be processed twice and that a failed update leaves \
+        the processor unchanged."""
+
+    processor = IncrementalDataProcessor(metrics_to_normalize=["return"])
+    processor.update(_split_runs(raw_data, 0))
+    expected_state = copy.deepcopy(processor.__dict__)
+
+    # Only the run of the last task has already been processed, so that the
+    # earlier tasks would be merged before the duplicate is found.
+    delta = _split_runs(raw_data, 1)
+    delta["env_1"]["task_3"] = _split_runs(raw_data, 0)["env_1"]["task_3"]
+    with pytest.raises(ValueError, match="already been processed"):
+        processor.update(delta)
+
+    state = processor.__dict__
+    assert state.keys() == expected_state.keys()
+    for key, value in state.items():
+        jax.tree_util.tree_map(
+            np.testing.assert_array_equal, value, expected_state[key]
+        )
+    assert "extra" in processor.processed_data
+
+
+def test_incremental_processing_missing_metric(
+    raw_data: Dict[str, Dict[str, Any]]
+) -> None:
+    """Tests that runs without a metric to normalise are rejected up front."""
+
+    processor = IncrementalDataProcessor(metrics_to_normalize=["return"])
+    processor.update(_split_runs(raw_data, 0))
+    expected_data = copy.deepcopy(processor.processed_data)
+
+    delta = _split_runs(raw_data, 1)
+    for run in delta["env_1"]["task_3"]["algo_1"].values():
+        run["absolute_metrics"].pop("return")
+    with pytest.raises(ValueError, match="missing"):
+        processor.update(delta)
+
+    jax.tree_util.tree_map(
+        np.testing.assert_array_equal,
+        processor.processed_data,
+        expected_data,
+    )
@@ -0,0 +1,78 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the incremental JSON reader"""
+
+import io
+import json
+from typing import Any, Dict
+
+import pytest
+
+from marl_eval.json_tools.json_stream import _JsonReader, iter_json_runs
+
+
+@pytest.fixture
+def raw_data() -> Dict[str, Dict[str, Any]]:
+    """Fixture for raw experiment data."""
+    with open("tests/mock_data_test.json", "r") as f:
+        read_in_data = json.load(f)
+
+    return read_in_data
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_iter_json_runs(
+    raw_data: Dict[str, Dict[str, Any]], tmp_path: Any, chunk_size: int
+) -> None:
+    """Tests that the runs read one at a time match the whole file, whatever \
+        the chunk size."""
+
+    # Escaped quotes and brackets in strings, and a scalar.
+    raw_data["env_1"]["task_1"]["algo_1"]['run "[1]" }\\'] = {"step_1": 1.5}
+    file_path = tmp_path / "data.json"
+    file_path.write_text(json.dumps(raw_data))
+
+    runs = list(iter_json_runs(str(file_path), chunk_size=chunk_size))
+
+    assert runs == [
+        (env, task, algorithm, run, steps)
+        for env, env_data in raw_data.items()
+        for task, task_data in env_data.items()
+        for algorithm, algorithm_data in task_data.items()
+        for run, steps in algorithm_data.items()
+    ]
+
+
+def test_read_value_long() -> None:
+    """Tests that a value spanning many chunks is read in few chunks."""
+
+    value = json.dumps({"return": list(range(100_000))})
+
+    class CountingFile(io.StringIO):
+        """File counting its reads."""
+
+        reads = 0
+
+        def read(self, size: Any = -1) -> str:
+            self.reads += 1
+            return super().read(size)
+
+    file = CountingFile(value)
+    reader = _JsonReader(file, chunk_size=16)
+
+    assert reader.read_value() == value
+    # The chunks grow geometrically, instead of len(value) / 16 reads.
+    assert file.reads < 20
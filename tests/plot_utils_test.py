@@ -0,0 +1,102 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for plot utils"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from marl_eval.plotting_tools.plot_utils import (
+    _lttb_indices,
+    decimate_curves,
+    plot_single_task_curve,
+)
+
+
+@pytest.fixture
+def curve() -> np.ndarray:
+    """Fixture for a noisy curve with a single spike."""
+    rng = np.random.default_rng(0)
+    values = np.cumsum(rng.normal(size=5000))
+    values[3141] += 1000
+    return values
+
+
+def test_lttb_indices(curve: np.ndarray) -> None:
+    """Tests that the decimation keeps the end points and the spike."""
+    x = np.arange(len(curve)) * 10.0
+    indices = _lttb_indices(x, curve, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == len(curve) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 3141 in indices
+    assert np.array_equal(_lttb_indices(x[:50], curve[:50], 100), np.arange(50))
+
+
+def test_decimate_curves(curve: np.ndarray) -> None:
+    """Tests that curves sharing their x-axis keep the points of every curve."""
+    x = np.arange(len(curve))
+    point_estimates = {"algo_1": curve, "algo_2": -curve[::-1]}
+    interval_estimates = {
+        algo: np.stack([values - 1, values + 1])
+        for algo, values in point_estimates.items()
+    }
+    plot_x, plot_points, plot_intervals = decimate_curves(
+        x, point_estimates, interval_estimates, max_points=100
+    )
+
+    assert len(plot_x) <= 100
+    assert {3141, len(curve) - 1 - 3141} <= set(plot_x)
+    for algo, values in point_estimates.items():
+        assert np.array_equal(plot_points[algo], values[plot_x])
+        assert np.array_equal(plot_intervals[algo], interval_estimates[algo][:, plot_x])
+    assert decimate_curves(x, point_estimates, interval_estimates, None)[0] is x
+
+
+def test_decimate_curves_keeps_interval_extremes(curve: np.ndarray) -> None:
+    """Tests that the extremes of a CI band are kept when the mean is flat."""
+    x = np.arange(len(curve))
+    lower = np.zeros_like(curve)
+    lower[2718] = -1000
+    point_estimates = {"algo_1": np.zeros_like(curve)}
+    interval_estimates = {"algo_1": np.stack([lower, np.ones_like(curve)])}
+    for max_points in [3, 50]:
+        plot_x, _, plot_intervals = decimate_curves(
+            x, point_estimates, interval_estimates, max_points
+        )
+
+        assert len(plot_x) <= max_points
+        assert plot_intervals["algo_1"].min() == -1000
+
+
+def test_plot_single_task_curve_max_points(curve: np.ndarray) -> None:
+    """Tests that every algorithm is plotted with at most max_points points."""
+    aggregated_data = {
+        "algo_1": {"mean": curve, "ci": np.ones_like(curve)},
+        "algo_2": {
+            "mean": curve,
+            "lower": curve - 1,
+            "upper": curve + 2,
+        },
+        "extra": {"evaluation_interval": 10},
+    }
+    ax = plot_single_task_curve(
+        aggregated_data, algorithms=["algo_1", "algo_2"], max_points=100
+    )
+
+    assert [len(line.get_xdata()) for line in ax.get_lines()] == [100, 100]
+    plt.close(ax.figure)
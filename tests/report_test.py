@@ -0,0 +1,99 @@
+# python3
+# Copyright 2022 InstaDeep Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the batch rendering of reports"""
+
+import json
+import os
+from typing import Any, Dict
+
+import matplotlib.pyplot as plt
+import pytest
+
+from marl_eval.plotting_tools import report
+from marl_eval.plotting_tools.report import render_report
+from marl_eval.utils.data_processing_utils import data_process_pipeline
+
+
+@pytest.fixture
+def spec() -> Dict[str, Any]:
+    """Fixture for a report of the mock experiment data."""
+    with open("tests/mock_data_test.json") as f:
+        raw_data = json.load(f)
+
+    return {
+        "processed_data": data_process_pipeline(
+            raw_data=raw_data, metrics_to_normalize=["return"]
+        ),
+        "metric_names": ["return", "win_rate"],
+        "metrics_to_normalize": ["return"],
+        "seed": 0,
+    }
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_render_report(spec: Dict[str, Any], tmp_path: Any, workers: int) -> None:
+    """Tests that every figure of the report is saved, serially or in parallel."""
+    file_paths = render_report(spec, str(tmp_path), workers=workers)
+
+    expected_names = [
+        f"env_1_{task}_agg_{metric}.png"
+        for task in ["task_1", "task_2", "task_3"]
+        for metric in ["return", "win_rate"]
+    ] + [
+        f"env_1_{metric}_{plot_type}.png"
+        for metric in ["return", "win_rate"]
+        for plot_type in [
+            "performance_profile",
+            "aggregate_scores",
+            "probability_of_improvement",
+            "sample_efficiency_curve",
+        ]
+    ]
+    assert file_paths == sorted(
+        os.path.join(str(tmp_path), name) for name in expected_names
+    )
+    assert all(os.path.getsize(file_path) > 0 for file_path in file_paths)
+    assert os.path.exists(tmp_path / "env_1_aggregated_score_return.csv")
+
+
+def test_render_report_inline_backend(
+    spec: Dict[str, Any], tmp_path: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests that inline rendering uses Agg and restores the caller's backend."""
+    render_backends = []
+
+    def render_figure(*args: Any) -> str:
+        render_backends.append(plt.get_backend().lower())
+        return str(tmp_path / args[0])
+
+    monkeypatch.setattr(report, "_render_figure", render_figure)
+    previous_backend = plt.get_backend()
+    plt.switch_backend("svg")
+    try:
+        render_report(spec, str(tmp_path), workers=1)
+        assert plt.get_backend() == "svg"
+    finally:
+        plt.switch_backend(previous_backend)
+
+    assert render_backends and set(render_backends) == {"agg"}
+
+
+def test_render_report_unknown_plot_type(spec: Dict[str, Any], tmp_path: Any) -> None:
+    """Tests that an unknown plot type is rejected before rendering."""
+    spec["plots"] = ["single_task", "histogram"]
+    with pytest.raises(ValueError, match="histogram"):
+        render_report(spec, str(tmp_path))
+    assert not os.listdir(tmp_path)